@@ -0,0 +1,97 @@
+"""
+Benchmark for `Context` with many variables and deeply chained contexts.
+
+A context is chained for every vars file and for every mapping rendered by `ObjectTemplate`, so a run ends up with
+contexts that are many levels deep and with parents that have many children. Chaining a context and overriding a
+variable should not get slower as the number of levels or children grows. Run it with:
+
+    python -m benchmarks.context
+"""
+
+import timeit
+
+from strong_opx.template import Context
+
+N_KEYS = 10_000
+N_LEVELS = 50
+
+
+def build_root() -> Context:
+    return Context({f"KEY_{i}": f"value-{i}" for i in range(N_KEYS)})
+
+
+def build_deep(root: Context) -> Context:
+    context = root
+    for level in range(N_LEVELS):
+        context = context.chain()
+        context[f"LEVEL_{level}"] = level
+
+    return context
+
+
+def build_wide(root: Context) -> list[Context]:
+    return [root.chain() for _ in range(N_LEVELS)]
+
+
+def override(context: Context) -> None:
+    for i in range(N_KEYS):
+        context[f"KEY_{i}"] = f"override-{i}"
+
+
+def lookup(context: Context) -> None:
+    for i in range(N_KEYS):
+        context[f"KEY_{i}"]
+
+
+def run(title: str, setup, statement) -> None:
+    def timed():
+        args = setup()
+        return timeit.timeit(lambda: statement(*args), number=1)
+
+    seconds = min(timed() for _ in range(5))
+    print(f"{title:<60} {seconds:>10.4f}")
+
+
+def main():
+    print(f"{N_KEYS} keys, {N_LEVELS} levels")
+    print(f"{'operation':<60} {'seconds':>10}")
+
+    run(f"chain {N_LEVELS} levels deep", lambda: (build_root(),), build_deep)
+    run(f"chain {N_LEVELS} children of one context", lambda: (build_root(),), build_wide)
+    run("override all keys of a context with no children", lambda: (build_root(),), override)
+
+    def with_children():
+        root = build_root()
+        return root, build_wide(root), build_deep(root)
+
+    run(
+        f"override all keys of a context with {N_LEVELS * 2} descendants",
+        with_children,
+        lambda root, *_: override(root),
+    )
+    run("look up all keys in the root context", lambda: (build_root(),), lookup)
+    run(f"look up all keys {N_LEVELS} levels deep", lambda: (build_deep(build_root()),), lookup)
+
+    def looked_up_deep():
+        context = build_deep(build_root())
+        lookup(context)
+        return (context,)
+
+    run(f"look up all keys {N_LEVELS} levels deep again", looked_up_deep, lookup)
+    run(
+        f"look up all keys in a context chained from {N_LEVELS} levels deep",
+        lambda: (looked_up_deep()[0].chain(),),
+        lookup,
+    )
+
+    def overridden_deep():
+        root = build_root()
+        context = build_deep(root)
+        override(root)
+        return (context,)
+
+    run(f"look up all overridden keys {N_LEVELS} levels deep", overridden_deep, lookup)
+
+
+if __name__ == "__main__":
+    main()
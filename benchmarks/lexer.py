@@ -0,0 +1,50 @@
+"""
+Benchmark for `TemplateLexer.tokenize` on large templates.
+
+Tokenization time should grow linearly with the size of the template, including templates that use only some kinds
+of delimiters (delimiters that do not occur in a template used to be searched till the end of the template for every
+token). Run it with:
+
+    python -m benchmarks.lexer
+"""
+
+import timeit
+
+from strong_opx.template.lexer import TemplateLexer
+
+CHUNK = (
+    "apiVersion: v1\n"
+    "kind: ConfigMap\n"
+    "metadata:\n"
+    "  name: {{ APP_NAME }}-config\n"
+    "  namespace: ${NAMESPACE}\n"
+    "data:\n"
+    "  {# rendered per host #}\n"
+    "  {% for host in HOSTS %}{{ host }}: {{ host|uppercase }}\n  {% endfor %}\n"
+    "  {% raw %}{{ kept as is }}{% endraw %}\n"
+)
+
+VARIABLES_ONLY_CHUNK = "  - name: {{ APP_NAME }}\n    value: {{ APP_VALUE }}\n"
+
+
+def benchmark(title: str, chunk: str) -> None:
+    print(title)
+    print(f"{'size':>10} {'tokens':>10} {'seconds':>10} {'us/KB':>10}")
+
+    for size_kb in (64, 128, 256, 512, 1024):
+        template = chunk * (size_kb * 1024 // len(chunk))
+        n_tokens = len(TemplateLexer(template).tokenize())
+
+        seconds = min(timeit.repeat(lambda: TemplateLexer(template).tokenize(), number=1, repeat=5))
+        print(f"{size_kb:>8}KB {n_tokens:>10} {seconds:>10.4f} {seconds * 1e6 / size_kb:>10.2f}")
+
+    print()
+
+
+def main():
+    benchmark("All delimiters", CHUNK)
+    benchmark("Variables only", VARIABLES_ONLY_CHUNK)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark for loading a large multi-document YAML file, such as a rendered Kubernetes manifest.
+
+Compares the libyaml-based loader with the pure-Python loader, both attaching the position of every value and in lean
+mode, which constructs plain Python types. Run it with:
+
+    python -m benchmarks.yaml_loader
+"""
+
+import os
+import tempfile
+import timeit
+import tracemalloc
+
+from strong_opx.yaml.loader import LEAN_LOADERS, LOADERS
+
+SIZE_MB = 5
+
+DOCUMENT = """---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: app-{i}
+  namespace: default
+  labels:
+    app: app-{i}
+    tier: backend
+spec:
+  replicas: 3
+  selector:
+    matchLabels:
+      app: app-{i}
+  template:
+    metadata:
+      labels:
+        app: app-{i}
+    spec:
+      containers:
+        - name: app
+          image: "registry.example.com/app:1.2.{i}"
+          args: ["--port", "8080", "--verbose"]
+          ports:
+            - containerPort: 8080
+          resources:
+            limits:
+              cpu: 0.5
+              memory: 512Mi
+          env:
+            - name: DATABASE_URL
+              value: postgres://db-{i}.example.com:5432/app
+            - name: DESCRIPTION
+              value: |
+                Multi line description
+                of app {i}
+"""
+
+
+def load_all(loader_cls: type, file_path: str) -> list:
+    with open(file_path) as f:
+        loader = loader_cls(stream=f, file_path=file_path)
+        try:
+            documents = []
+            while loader.check_data():
+                documents.append(loader.get_data())
+
+            return documents
+        finally:
+            loader.dispose()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "manifest.yml")
+        with open(file_path, "w") as f:
+            n_documents = 0
+            while f.tell() < SIZE_MB * 1024 * 1024:
+                f.write(DOCUMENT.format(i=n_documents))
+                n_documents += 1
+
+        print(f"{SIZE_MB}MB, {n_documents} documents")
+        print(f"{'loader':<20} {'seconds':>10} {'peak MB':>10}")
+
+        for loader_cls in LOADERS + LEAN_LOADERS:
+            seconds = min(timeit.repeat(lambda: load_all(loader_cls, file_path), number=1, repeat=3))
+
+            tracemalloc.start()
+            load_all(loader_cls, file_path)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+
+            print(f"{loader_cls.__name__:<20} {seconds:>10.4f} {peak_mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,104 @@
 import argparse
+import json
+import os
 import sys
-from typing import Any
+from typing import Any, Generator
 
 from strong_opx import yaml
 from strong_opx.exceptions import CommandError
 from strong_opx.management.command import ProjectCommand
 from strong_opx.project import Environment
+from strong_opx.utils.files import atomic_write
+from strong_opx.utils.tracking import Position, get_position
 from strong_opx.vault import VaultCipher
 
 
+def find_ciphers(value: Any) -> Generator[VaultCipher, None, None]:
+    if isinstance(value, VaultCipher):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from find_ciphers(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from find_ciphers(v)
+
+
+def reuse_master_key_salt(file_paths: list[str], secret: str) -> None:
+    """
+    Encrypt values using the master key salt of the existing values of the files, so that an environment's values share
+    a single key derivation (see `VaultCipher.reuse_master_key_salt`).
+    """
+    VaultCipher.reuse_master_key_salt(
+        (
+            cipher
+            for file_path in file_paths
+            if os.path.exists(file_path)
+            for cipher in find_ciphers(yaml.load(file_path))
+        ),
+        secret,
+    )
+
+
+def reencrypt_file(file_path: str, secret: str) -> int:
+    """
+    Re-encrypt values of a YAML file that are not encrypted the way they would be encrypted now (see
+    `VaultCipher.is_latest`). Values are replaced in the file, leaving the rest of the file as is.
+
+    :param file_path: Path of the file
+    :param secret: Secret the values are encrypted with
+    :return: Number of values re-encrypted
+    """
+    file_path = os.path.abspath(file_path)
+    all_ciphers = list(find_ciphers(yaml.load(file_path)))
+    VaultCipher.reuse_master_key_salt(all_ciphers, secret)
+
+    ciphers = [
+        cipher
+        for cipher in all_ciphers
+        if get_position(cipher)[0] == file_path and not cipher.is_latest(secret)  # Not included
+    ]
+    if not ciphers:
+        return 0
+
+    new_ciphers = VaultCipher.encrypt_many(VaultCipher.decrypt_many(ciphers, secret), secret)
+
+    with open(file_path) as f:
+        content = f.read()
+
+    line_offsets = [0]
+    for line in content.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def offset(position: Position) -> int:
+        return min(line_offsets[min(position.line, len(line_offsets)) - 1] + position.column - 1, len(content))
+
+    # Replaced from the end, so that offsets of the values yet to be replaced remain valid
+    replacements = sorted(
+        ((offset(get_position(c)[1]), offset(get_position(c)[2]), n) for c, n in zip(ciphers, new_ciphers)),
+        reverse=True,
+    )
+    for start, end, cipher in replacements:
+        text = content[start:end]
+        trailing = text[len(text.rstrip()) :]
+        lines = text.rstrip().splitlines()
+
+        if len(lines) > 1:
+            # Block scalar, lines of the value are indented same as before
+            indent = lines[1][: len(lines[1]) - len(lines[1].lstrip())]
+            replacement = "\n".join(["!vault |"] + [indent + line for line in str(cipher).splitlines()])
+        else:
+            replacement = f"!vault {json.dumps(str(cipher))}"
+
+        content = content[:start] + replacement + trailing + content[end:]
+
+    # Written to a temporary file first, so that an interrupt leaves the encrypted values in place
+    with atomic_write(file_path) as f:
+        f.write(content)
+
+    return len(ciphers)
+
+
 class Command(ProjectCommand):
     help_text = "Environment variables management"
 
@@ -25,6 +115,14 @@ class Command(ProjectCommand):
         decrypt.add_argument("--vars", nargs="*", help="If specified, decrypt only these variables.")
         decrypt.set_defaults(operation="decrypt")
 
+        reencrypt = subparsers.add_parser(
+            "reencrypt", help="Re-encrypt encrypted values of environment variables files using the latest vault format"
+        )
+        reencrypt.add_argument(
+            "files", nargs="*", help="Files to re-encrypt. Defaults to variables files of environment"
+        )
+        reencrypt.set_defaults(operation="reencrypt")
+
     def handle(self, operation=None, **options: Any) -> None:
         if operation is None:
             raise CommandError("Specify operation to execute. See --help for more info")
@@ -33,13 +131,28 @@ class Command(ProjectCommand):
             self.handle_encrypt(**options)
         elif operation == "decrypt":
             self.handle_decrypt(**options)
+        elif operation == "reencrypt":
+            self.handle_reencrypt(**options)
+
+    @staticmethod
+    def vars_file_paths(environment: Environment) -> list[str]:
+        return [
+            os.path.join(environment.project.path, file_path)
+            for file_path in environment.project.vars_config.get_paths(environment)
+        ]
 
     def handle_encrypt(self, environment: Environment, **options: Any):
+        if options["vars"] or options["value"]:
+            reuse_master_key_salt(self.vars_file_paths(environment), environment.vault_secret)
+
         if options["vars"]:
             context = environment.context
+            context.prefetch(options["vars"])
+
+            values = [context[v] for v in options["vars"]]
+            ciphers = VaultCipher.encrypt_many(values, environment.vault_secret)
 
-            for v in options["vars"]:
-                cipher = VaultCipher.encrypt(context[v], environment.vault_secret)
+            for v, cipher in zip(options["vars"], ciphers):
                 print(f"{v}: !vault |")
                 for line in str(cipher).split():
                     print(" ", line)
@@ -54,7 +167,22 @@ class Command(ProjectCommand):
     def handle_decrypt(self, environment: Environment, **options: Any):
         context = environment.context
         if options.get("vars"):
+            context.prefetch(options["vars"])
             for var_name in options["vars"]:
                 print(f"{var_name}: {context[var_name]}")
         else:
             yaml.dump(context.as_dict(exclude_initial=True), sys.stdout)
+
+    def handle_reencrypt(self, environment: Environment, **options: Any):
+        file_paths = options.get("files") or self.vars_file_paths(environment)
+
+        # Values of all the files of the environment share the salt, even if only some of them are re-encrypted
+        reuse_master_key_salt(self.vars_file_paths(environment) + file_paths, environment.vault_secret)
+
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                print(f"Unable to locate {file_path}", file=sys.stderr)
+                continue
+
+            count = reencrypt_file(file_path, environment.vault_secret)
+            print(f"{file_path}: re-encrypted {count} value(s)")
@@ -73,6 +73,21 @@ def _print_main_help(parser: argparse.ArgumentParser):
         print(f"    {command_name}")
 
 
+def _enable_caches():
+    if os.environ.get("STRONG_OPX_NO_CACHE"):
+        return
+
+    from strong_opx.config import system_config
+    from strong_opx.template.template import TEMPLATE_DISK_CACHE
+    from strong_opx.yaml.cache import YAML_DISK_CACHE
+
+    TEMPLATE_DISK_CACHE.enable()
+
+    # Parsed YAML files are cached only if enabled using `strong-opx config cache.yaml true`
+    if system_config.getboolean("cache", "yaml", fallback=False):
+        YAML_DISK_CACHE.enable()
+
+
 def main():
     parser = argparse.ArgumentParser(usage="%(prog)s [--help] subcommand [options] [args]", add_help=False)
     parser.add_argument("-h", "--help", action="store_true", help="show this help message and exit")
@@ -118,6 +133,7 @@ def main():
 
     path_env = os.environ.get("PATH", "")
     os.environ["PATH"] = f"{os.path.dirname(sys.executable)}:{path_env}"
+    _enable_caches()
 
     command_name = _command_name_from_module_name(args.command.name)
     command_module = args.command.loader.load_module()
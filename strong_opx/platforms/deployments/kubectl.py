@@ -3,7 +3,7 @@ import subprocess
 import sys
 from dataclasses import dataclass
 from functools import cached_property
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 import tabulate
 from colorama import Style
@@ -63,11 +63,21 @@ class DeploymentSummary:
         return summary
 
 
-def preprocess_config_file(node: NodeConfig, manifest_directory: str, manifest_file: str) -> list[dict]:
+# Fields of a manifest needed to wait for its rollout. Only these are read from rendered manifests, so that large
+# resources (e.g. ConfigMaps) are parsed without being loaded into memory.
+KIND = ("kind",)
+NAME = ("metadata", "name")
+NAMESPACE = ("metadata", "namespace")
+HEADER_FIELDS = (KIND, NAME, NAMESPACE)
+
+
+def preprocess_config_file(
+    node: NodeConfig, manifest_directory: str, manifest_file: str
+) -> list[dict[tuple[str, ...], Any]]:
     full_path = os.path.join(manifest_directory, manifest_file)
 
     try:
-        documents = list(yaml.load_all(full_path))
+        documents = yaml.load_all_fields(full_path, HEADER_FIELDS)
     except YAMLError as e:
         if not sys.stdin.isatty():
             raise
@@ -107,12 +117,11 @@ class KubeCtlDeploymentProvider(ConfigDeploymentProvider):
             documents = preprocess_config_file(node, manifest_directory, manifest_file)
 
             for document in documents:
-                kind = document.get("kind", "").lower()
+                kind = (document.get(KIND) or "").lower()
 
                 if kind in self.rollout_status_supported_kinds:
-                    metadata = document.get("metadata") or {}
-                    name = metadata.get("name")
-                    namespace = metadata.get("namespace", "default")
+                    name = document.get(NAME)
+                    namespace = document.get(NAMESPACE, "default")
 
                     rollout_supported_kinds.append((kind, name, namespace))
 
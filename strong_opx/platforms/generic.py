@@ -1,6 +1,7 @@
 import itertools
 import logging
 import os
+import re
 import tempfile
 from contextlib import contextmanager
 from typing import TYPE_CHECKING, Annotated, Generator, Optional
@@ -19,6 +20,7 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 SUPPORTED_SSH_METHODS = ("direct", "bastion", "aws_ssm")
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 
 
 def validate_ssh_method(value: str) -> str:
@@ -31,6 +33,7 @@ def validate_ssh_method(value: str) -> str:
 class GenericPlatformConfig(BaseModel):
     ssh_method: Annotated[str, AfterValidator(validate_ssh_method)] = None
     hosts: dict[str, list[ComputeInstance]]
+    ansible_vars: list[str] = []
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -63,6 +66,7 @@ class GenericPlatform(Platform):
     if TYPE_CHECKING:
         ssh_method: str
         hosts: dict[str, list[ComputeInstance]]
+        ansible_vars: list[str]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -92,7 +96,7 @@ class GenericPlatform(Platform):
         host_groups: list[str] = None,
         additional_args: tuple[str, ...] = None,
     ):
-        with self.ansible_host_inventory(host_groups) as inventory, self.ansible_extra_vars() as extras:
+        with self.ansible_host_inventory(host_groups) as inventory, self.ansible_extra_vars(playbook) as extras:
             args = (
                 self.project.config.ansible_playbook_executable,
                 playbook,
@@ -226,9 +230,38 @@ class GenericPlatform(Platform):
         yield stream.name
         t.__exit__(None, None, None)
 
+    def ansible_referenced_vars(self, playbook: str) -> set[str]:
+        """
+        Names that may be variables referenced by `playbook`. Ansible resolves tasks, roles and templates relative to
+        the playbook and the project, so every file in the playbook directory and in the `roles` directory of the
+        project is scanned. Scan is textual, every identifier found is considered a variable.
+        """
+        names = set()
+        for directory in (os.path.dirname(playbook), os.path.join(self.project.path, "roles")):
+            for dir_path, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    try:
+                        with open(os.path.join(dir_path, filename), errors="ignore") as f:
+                            names.update(IDENTIFIER_RE.findall(f.read()))
+                    except OSError:
+                        continue
+
+        return names
+
     @contextmanager
-    def ansible_extra_vars(self) -> Generator[str, None, None]:
+    def ansible_extra_vars(self, playbook: str) -> Generator[str, None, None]:
+        """
+        Write variables referenced by `playbook` and variables listed in `ansible_vars` to a file, which is passed to
+        Ansible using `--extra-vars`. Variables referenced indirectly (e.g. `lookup('vars', ...)`) can't be found by
+        scanning the playbook, these must be listed in `ansible_vars`. If `ansible_vars` contains `*`, all variables
+        are passed.
+        """
+        if "*" in self.ansible_vars:
+            names = None
+        else:
+            names = self.ansible_referenced_vars(playbook).union(self.ansible_vars)
+
         with tempfile.NamedTemporaryFile(mode="w+", suffix=".yml") as t:
-            context = self.environment.context.as_dict()
+            context = self.environment.context.as_dict(names=names)
             yaml.dump(context, t)
             yield t.name
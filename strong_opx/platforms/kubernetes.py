@@ -156,7 +156,7 @@ class KubernetesPlatform(Platform):
         # Remove environment variables, those will be set again automatically by strong-opx when executing
         # kubectl commands.
 
-        kube_config = yaml.load(self.kube_config_path)
+        kube_config = yaml.load(self.kube_config_path, track_positions=False)
         for user in kube_config["users"]:
             user_exec = user["user"]["exec"]
             user_exec.pop("env", None)
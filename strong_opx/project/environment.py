@@ -11,6 +11,7 @@ from strong_opx.platforms import ALL_PLATFORMS, TPlatform
 from strong_opx.project.context_hooks import EnvironHook, ProjectContextHook
 from strong_opx.providers import current_docker_registry
 from strong_opx.template import Context
+from strong_opx.utils.mapping import LazyValue
 from strong_opx.utils.validation import translate_pydantic_errors
 
 if TYPE_CHECKING:
@@ -31,6 +32,9 @@ class Environment:
         self.path = os.path.join(project.environments_dir, self.name)
         self.base_context = self.create_context()
 
+        # Secret is needed to decrypt each of the encrypted values, which may be decrypted concurrently
+        self._vault_secret = LazyValue(lambda: self.project.secret_provider.get_secret(self))
+
     def register_platform(self, platform: TPlatform):
         self.platforms.append(platform)
         platform.init_context(self.base_context)
@@ -62,9 +66,9 @@ class Environment:
 
         return context
 
-    @cached_property
+    @property
     def vault_secret(self):
-        return self.project.secret_provider.get_secret(self)
+        return self._vault_secret.resolve()
 
     @cached_property
     def context(self) -> Context:
@@ -76,7 +80,7 @@ class Environment:
             abs_path = os.path.join(self.project.path, file_path)
             if os.path.exists(abs_path):
                 logger.debug(f"Loading vars from {file_path}")
-                context.load_from_file(abs_path)
+                context.load_from_file(abs_path, lazy=True)
             else:
                 logger.warning(f"Unable to locate {file_path}")
 
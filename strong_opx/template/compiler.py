@@ -1,12 +1,13 @@
 import ast
-import functools
+import copy
 import re
-from typing import Union
+from functools import cached_property
+from typing import Optional, Union
 
 from strong_opx.exceptions import TemplateError
 from strong_opx.template.registry import TEMPLATE_FILTERS
 from strong_opx.template.variable import VariableRef, VariableStore
-from strong_opx.utils.tracking import Position, get_position
+from strong_opx.utils.tracking import LineIndex, Position, get_position
 
 CTX_LOAD = ast.Load()
 CTX_STORE = ast.Store()
@@ -15,6 +16,9 @@ VAR_NAME_RE = re.compile(r"^[a-zA-Z_][a-zA-Z_0-9]*$")
 OUTPUT_VAR_NAME = "_opx_out_"
 CONTEXT_VAR_NAME = "_opx_ctx_"
 INCLUDE_VAR_NAME = "_opx_include_"
+RENDER_FUNC_NAME = "_opx_render_"
+STREAM_FUNC_NAME = "_opx_stream_"
+FILTER_VAR_PREFIX = "_p_"
 
 
 class TemplateCompiler:
@@ -53,8 +57,6 @@ class TemplateCompiler:
         else:
             self.initial_line_no, self.initial_col_offset = 1, 1
 
-        # LRU cache should be local to instance
-        self.offset_to_position = functools.lru_cache(maxsize=32)(self.offset_to_position)
         self.code_modules: list[Union[ast.Module, ast.stmt]] = [ast.Module(body=[], type_ignores=[])]
         self.selected_body: list[ast.stmt] = self.code_modules[0].body
 
@@ -76,7 +78,11 @@ class TemplateCompiler:
         :param offset: 0-based index in template
         :return: [1-based index of line, 1-based index in that line]
         """
-        return Position.from_offset(self.value, offset, self.initial_line_no, self.initial_col_offset)
+        return self.line_index.position(offset)
+
+    @cached_property
+    def line_index(self) -> LineIndex:
+        return LineIndex(self.value, self.initial_line_no, self.initial_col_offset)
 
     def set_location(self, node: ast.AST, start_offset: int, end_offset: int) -> None:
         """
@@ -136,7 +142,7 @@ class TemplateCompiler:
         self.add_statement(value, start_offset, end_offset)
 
     def append_as_str(self, value, start_offset: int, end_offset: int) -> None:
-        if not isinstance(value, ast.Constant):
+        if not is_str_node(value):
             value: ast.Call = ast.Call(ast.Name(id="str", ctx=CTX_LOAD), args=[value], keywords=[])
 
         n_lines_append = ast.Attribute(value=ast.Name(id="lines", ctx=CTX_LOAD), attr="append", ctx=CTX_LOAD)
@@ -185,7 +191,16 @@ class TemplateCompiler:
 
         self.selected_body = self.code_modules[-1].orelse
 
-    def finalize(self) -> ast.Module:
+    def finalize(self, optimize: bool = False, fix_locations: bool = True) -> ast.Module:
+        """
+        Halt parsing and return the built AST.
+
+        :param optimize: When True and output is rendered as string, adjacent constants are merged into one. Further,
+            if there isn't any block, all the `lines.append()` statements are replaced by a single f-string assigned
+            to the output variable.
+        :param fix_locations: When False, nodes without a location are left as-is. Useful when the AST is embedded into
+            another one, which is fixed as a whole.
+        """
         assertion_error_message = (
             "There is more than one active block being parsed. "
             'Did you start compiling a block (e.g. "if", "for", etc.) '
@@ -193,6 +208,61 @@ class TemplateCompiler:
         )
         assert len(self.code_modules) == 1, assertion_error_message
         module = self.code_modules[0]
+
+        if optimize and self.as_string:
+            fold_constants(module.body)
+            join_output(module)
+
+        if fix_locations:
+            ast.fix_missing_locations(module)
+
+        return module
+
+    def finalize_function(self) -> ast.Module:
+        """
+        Halt parsing and return an AST of module that defines the render functions. Both functions take the context
+        and the include function as arguments:
+        * `RENDER_FUNC_NAME` returns the rendered output.
+        * `STREAM_FUNC_NAME` is a generator that yields the rendered output as string chunks, as they are produced.
+
+        Unlike the module returned by `finalize()`, that can be executed once and functions can be called for every
+        render.
+        """
+        body = self.finalize(optimize=True).body
+
+        if len(body) == 1 and isinstance(body[0], ast.Assign) and body[0].targets[0].id == OUTPUT_VAR_NAME:
+            value = body[0].value
+            if not is_str_node(value):
+                value = ast.Call(ast.Name(id="str", ctx=CTX_LOAD), args=[value], keywords=[])
+
+            render_body = [ast.copy_location(ast.Return(value=body[0].value), body[0])]
+            stream_body = [ast.copy_location(ast.Expr(value=ast.Yield(value=value)), body[0])]
+        elif not body:
+            render_body = [ast.Return(value=ast.Constant(value="", kind=None))]
+            stream_body = [ast.Expr(value=ast.YieldFrom(value=ast.Tuple(elts=[], ctx=CTX_LOAD)))]
+        else:
+            n_lines = ast.Assign(targets=[ast.Name(id="lines", ctx=CTX_STORE)], value=ast.List(elts=[], ctx=CTX_LOAD))
+            n_join = ast.Call(
+                ast.Attribute(value=ast.Constant(value="", kind=None), attr="join", ctx=CTX_LOAD),
+                args=[ast.Name(id="lines", ctx=CTX_LOAD)],
+                keywords=[],
+            )
+
+            stream_body = [AppendToYieldTransformer().visit(copy.deepcopy(node)) for node in body]
+            if not any(isinstance(n, (ast.Yield, ast.YieldFrom)) for node in stream_body for n in ast.walk(node)):
+                # Blocks without output (e.g. "{% if X %}{% endif %}"), the function must still be a generator
+                stream_body.append(ast.Expr(value=ast.YieldFrom(value=ast.Tuple(elts=[], ctx=CTX_LOAD))))
+
+            render_body = [n_lines, *body, ast.Return(value=n_join)]
+
+        # Parsing the function signature keeps it independent of the changes to ast.FunctionDef across Python versions
+        module = ast.parse(
+            f"def {RENDER_FUNC_NAME}({CONTEXT_VAR_NAME}, {INCLUDE_VAR_NAME}): pass\n"
+            f"def {STREAM_FUNC_NAME}({CONTEXT_VAR_NAME}, {INCLUDE_VAR_NAME}): pass"
+        )
+        module.body[0].body = render_body
+        module.body[1].body = stream_body
+
         ast.fix_missing_locations(module)
         return module
 
@@ -248,7 +318,7 @@ class TemplateCompiler:
         if filter_name not in TEMPLATE_FILTERS:
             raise self.syntax_error(f"Unknown filter: {filter_name}", start_offset, start_offset + len(filter_name))
 
-        pipe_name = f"_p_{filter_name}"
+        pipe_name = f"{FILTER_VAR_PREFIX}{filter_name}"
         self.variables.define(pipe_name, TEMPLATE_FILTERS[filter_name])
 
         args.insert(0, expr)
@@ -372,6 +442,118 @@ class TemplateCompiler:
         )
 
 
+def is_str_node(node: ast.expr) -> bool:
+    """
+    Check whether the node is known to evaluate to a string, so it doesn't need to be converted using `str()`.
+    """
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+
+    if isinstance(node, ast.Call):  # Output of an include tag
+        return isinstance(node.func, ast.Name) and node.func.id == INCLUDE_VAR_NAME
+
+    return isinstance(node, ast.JoinedStr)
+
+
+def appended_value(node: ast.stmt) -> Optional[ast.expr]:
+    """
+    If the node is a `lines.append(<value>)` statement generated by `TemplateCompiler.append_as_str()`, return the
+    appended value. Otherwise, None.
+    """
+    if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+        return None
+
+    func = node.value.func
+    if isinstance(func, ast.Attribute) and func.attr == "append":
+        if isinstance(func.value, ast.Name) and func.value.id == "lines":
+            return node.value.args[0]
+
+    return None
+
+
+def fold_constants(body: list[ast.stmt]) -> None:
+    """
+    Merge adjacent `lines.append(<constant>)` statements into one, in the body and all nested blocks.
+    """
+    i = 0
+    while i < len(body):
+        node = body[i]
+
+        if isinstance(node, (ast.If, ast.For)):
+            fold_constants(node.body)
+            fold_constants(node.orelse)
+
+        value = appended_value(node)
+        if i > 0 and isinstance(value, ast.Constant):
+            previous_value = appended_value(body[i - 1])
+            if isinstance(previous_value, ast.Constant):
+                previous_value.value += value.value
+
+                previous_node = body[i - 1]
+                previous_node.end_lineno = previous_value.end_lineno = node.end_lineno
+                previous_node.end_col_offset = previous_value.end_col_offset = node.end_col_offset
+
+                body.pop(i)
+                continue
+
+        i += 1
+
+
+def join_output(module: ast.Module) -> None:
+    """
+    When the module consists of only `lines.append()` statements, replace them with one statement that assigns the
+    output variable an f-string (or a constant if that's all there is). That avoids building a list of lines and
+    joining it on every render.
+    """
+    values = []
+    for node in module.body:
+        value = appended_value(node)
+        if value is None:  # Contains a block
+            return
+
+        if isinstance(value, ast.Constant):
+            values.append(value)
+            continue
+
+        conversion = -1
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == "str":
+            value = value.args[0]
+            conversion = ord("s")
+
+        formatted_value = ast.FormattedValue(value=value, conversion=conversion, format_spec=None)
+        values.append(ast.copy_location(formatted_value, value))
+
+    if not values:
+        output = ast.Constant(value="", kind=None)
+    elif len(values) == 1 and isinstance(values[0], ast.Constant):
+        output = values[0]
+    else:
+        output = ast.JoinedStr(values=values)
+
+    statement = ast.Assign(targets=[ast.Name(id=OUTPUT_VAR_NAME, ctx=CTX_STORE)], value=output)
+    if module.body:
+        for node in (output, statement):
+            node.lineno = module.body[0].lineno
+            node.col_offset = module.body[0].col_offset
+            node.end_lineno = module.body[-1].end_lineno
+            node.end_col_offset = module.body[-1].end_col_offset
+
+    module.body = [statement]
+
+
+class AppendToYieldTransformer(ast.NodeTransformer):
+    """
+    Replaces `lines.append(<value>)` statements with `yield <value>`.
+    """
+
+    def visit_Expr(self, node: ast.Expr) -> ast.Expr:
+        value = appended_value(node)
+        if value is None:
+            return node
+
+        return ast.copy_location(ast.Expr(value=ast.copy_location(ast.Yield(value=value), node.value)), node)
+
+
 class TemplateNodeTransformer(ast.NodeTransformer):
     def __init__(self, compiler: TemplateCompiler, initial_lineno: int, initial_offset: int):
         """
@@ -429,7 +611,10 @@ class TemplateNodeTransformer(ast.NodeTransformer):
 
         ref = VariableRef.from_ast_node(node)
         if ref:
-            self.variable_refs[ref.name] = ref
+            # Local variables (e.g. of a loop) and builtins are not looked up in the context
+            if ref.nodes[0] not in self.compiler.variables:
+                self.variable_refs[ref.name] = ref
+
             return True
 
         return False
@@ -1,58 +1,128 @@
-import weakref
-from collections import ChainMap
-from typing import Any
+import functools
+import itertools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Collection, Generator, Optional
 
 from strong_opx import yaml
 from strong_opx.exceptions import UndefinedVariableError, VariableError
-from strong_opx.template.object_template import ObjectTemplate
-from strong_opx.utils.mapping import LazyDict
+from strong_opx.template.document_template import DocumentTemplate
+from strong_opx.utils.mapping import LazyDict, LazyValue
+from strong_opx.vault import VaultCipher, selected_vault_secret
+
+logger = logging.getLogger(__name__)
+
+# Variables loaded by `Context.load_from_file(lazy=True)` that are being rendered, outermost first
+RENDERING_VARS: ContextVar[tuple[tuple["Context", str], ...]] = ContextVar("RENDERING_VARS", default=())
+
+# Versions of variables set in any `Context`, used to find values that a chained context can see
+VERSIONS = itertools.count()
+
+# Maximum number of lazy values resolved at the same time by `Context.prefetch()`
+PREFETCH_WORKERS = 8
+
+# Held while setting a variable or chaining a context, as lazy values may be resolved in background threads
+LOCK = threading.Lock()
+
+# Value of a variable, as seen by a chained context, that is to be looked up in the parent context
+INHERITED = object()
+
+
+class Revision:
+    """
+    A value of a variable in a `Context`, along with the version in which it was set.
+    """
+
+    __slots__ = ("version", "value")
+
+    def __init__(self, version: int, value: Any):
+        self.version = version
+        self.value = value
+
+
+class LazyFileValue(LazyValue):
+    """
+    Value of a variable loaded by `Context.load_from_file(lazy=True)`, rendered using `context` when first accessed.
+    """
+
+    def __init__(self, context: "Context", key: str, source: Any):
+        super().__init__(self.render)
+        self.context = context
+        self.key = key
+        self.source = source
+
+    @functools.cached_property
+    def template(self) -> DocumentTemplate:
+        # Rendered along with its key, so that the value can refer to its own nested values
+        return DocumentTemplate({self.key: self.source})
+
+    def render(self) -> Any:
+        return self.context.render_lazy_var(self.key, self.template)
+
+
+@functools.lru_cache()
+def prefetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="opx-prefetch")
+
+
+def log_prefetch_error(future: Future) -> None:
+    # Failures aren't cached by `LazyValue`, so the error is raised again to the template reading the value
+    e = future.exception()
+    if e is not None:
+        logger.debug(f"Unable to prefetch value: {e!r}")
 
 
 class Context(LazyDict):
+    """
+    A mapping of variables used to render templates.
+
+    A chained context (see `chain()`) sees variables of its parent as they were when it was chained. Variables added to
+    the parent afterwards are visible as well, but overriding a variable in the parent does not affect the chained
+    context. Rather than copying variables to the chained context, every context keeps the values each of its
+    variables had over time, tagged with a global version. A chained context records the version at which it was
+    created and looks up the values of its ancestors as of that version.
+
+    A snapshot (see `chain(snapshot=True)`) doesn't see variables added to its ancestors after it was chained either.
+    """
+
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        version = next(VERSIONS)
+
+        self._revisions: dict[str, list[Revision]] = {}
+        self._parent: Optional[Context] = None
+        self._version = version
+        self._chained_version = -1  # Version when this context was last chained
+        self._snapshot = False  # Whether variables added to ancestors after chaining are hidden
 
-        for k, v in self._data.items():
+        # Revisions this context sees, keyed by variable name. A revision a context sees never changes, other than by
+        # setting the variable in that same context, because chained contexts see their ancestors as they were when
+        # chained. Thus, the only entry to invalidate on writes is the one for the variable being set.
+        self._cache: dict[str, Revision] = {}
+
+        for k, v in dict(*args, **kwargs).items():
             if callable(v):
-                self.set_lazy(k, v)
+                v = LazyValue(v)
 
-        self._children: list[weakref.ref] = []
+            self._revisions[k] = [Revision(version, v)]
 
     def __missing__(self, key):
         raise UndefinedVariableError(key)
 
     def __setitem__(self, key: str, value: Any) -> None:
-        if key in self:
-            # If the key already exists in the current context, we need to update all
-            # children contexts to have old value. Otherwise, they will get the new value
-            # from the parent context
-
-            current_value = self._data[key]
-            i = len(self._children) - 1
-
-            while i >= 0:
-                child_ref = self._children[i]
-                child = child_ref()
-                if child is None:
-                    # Child has been garbage collected. Remove it from the list
-                    self._children.pop(i)
-                else:
-                    child._data[key] = current_value
-
-                i -= 1
-
         if callable(value):
             self.set_lazy(key, value)
         else:
-            super().__setitem__(key, value)
+            self._set(key, value)
 
     def __delitem__(self, key) -> None:
         """
         Deleting variables is not supported for two reasons:
         1. As of now, there is no known use case for deleting variables from a Context
-        2. A Context may use a ChainMap to store data, and deleting a variable from a ChainMap would require some
-           extra thought on how we would want to handle that. Should we delete the variable from "parent" and/or "child"
-           chains? Should we just set the value to None in the first map of the ChainMap? If we set to None, then how
+        2. A Context may be chained from another Context, and deleting a variable from a chained Context would require
+           some extra thought on how we would want to handle that. Should we delete the variable from "parent" and/or
+           "child" chains? Should we just set the value to None in the chained Context? If we set to None, then how
            should the 'in' operator behave; should "deleted_key in context" return False or True? There are a lot of
            questions that need to be answered before we can implement this feature (a feature that is not needed now).
 
@@ -62,39 +132,172 @@ class Context(LazyDict):
         """
         raise NotImplementedError("Deleting variables is not supported")
 
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __iter__(self) -> Generator[str, None, None]:
+        contexts = []
+        context = self
+        while context is not None:
+            contexts.append(context)
+            context = context._parent
+
+        # Variables of the root context first, same as a ChainMap
+        keys = dict.fromkeys(k for context in reversed(contexts) for k in context._revisions)
+        if any(context._snapshot for context in contexts):
+            yield from (k for k in keys if self._lookup(k) is not None)
+        else:
+            yield from keys
+
+    def __contains__(self, key: str) -> bool:
+        context = self
+        while context is not None:
+            if key in context._revisions:
+                return context is self or self._lookup(key) is not None
+
+            context = context._parent
+
+        return False
+
+    def _set(self, key: str, value: Any) -> None:
+        with LOCK:
+            revisions = self._revisions.get(key)
+            revision = Revision(next(VERSIONS), value)
+
+            if revisions is None:
+                if self._chained_version >= 0 and self._parent is not None and key in self._parent:
+                    # Chained contexts keep seeing the value inherited from the parent
+                    self._revisions[key] = [Revision(-1, INHERITED), revision]
+                else:
+                    self._revisions[key] = [revision]
+            elif revisions[-1].version > self._chained_version and (len(revisions) > 1 or self._chained_version < 0):
+                # No chained context can see the current value, so there is no need to retain it
+                revisions[-1] = revision
+            else:
+                revisions.append(revision)
+
+            # Updated after the revisions, so that it replaces a revision cached by a lookup running concurrently
+            self._cache[key] = revision
+
+    def _lookup(self, key: str) -> Optional[Revision]:
+        revision = self._cache.get(key)
+        if revision is None:
+            revision = self._find(key)
+            if revision is not None:
+                revision = self._cache.setdefault(key, revision)
+
+        return revision
+
+    def _find(self, key: str) -> Optional[Revision]:
+        revisions = self._revisions.get(key)
+        if revisions is not None:
+            return revisions[-1]
+
+        as_of = self._version
+        hidden_after = self._version if self._snapshot else None  # Variables added afterwards are hidden, if set
+        context = self._parent
+
+        while context is not None:
+            # Revision an ancestor sees was also seen by this context, if it was set before this context was chained
+            revision = context._cache.get(key)
+            if revision is not None and revision.version <= as_of:
+                return revision
+
+            revisions = context._revisions.get(key)
+            if revisions is not None:
+                for revision in reversed(revisions):
+                    if revision.version <= as_of:
+                        break
+                else:
+                    # Variable was added after chaining, chained context sees the value it was added with, unless a
+                    # snapshot in between was chained before that
+                    revision = revisions[0]
+                    if hidden_after is not None and revision.version > hidden_after:
+                        revision = None
+
+                if revision is not None and revision.value is not INHERITED:
+                    return revision
+
+            as_of = min(as_of, context._version)
+            if context._snapshot:
+                hidden_after = context._version if hidden_after is None else min(hidden_after, context._version)
+
+            context = context._parent
+
+        return None
+
+    def set_lazy(self, key: str, resolver: Callable[[], Any]) -> None:
+        self._set(key, LazyValue(resolver))
+
+    def get(self, key: str, default=None, resolve: bool = True) -> Any:
+        revision = self._lookup(key)
+        if revision is None:
+            return default
+
+        value = revision.value
+        if resolve and isinstance(value, LazyValue):
+            value = value.resolve()
+
+            # Resolved value is shared with every context that sees this revision
+            revision.value = value
+
+        return value
+
     @property
     def initial_vars(self) -> set[str]:
         """
         Returns the set of "initial variables" in the current Context. Initial variables are the system variables
         that are defined in the first Context, and are not inherited/chained from any other Context.
 
-        This method returns an empty set when this Context does not use a ChainMap for self._data. The Context used
-        to represent the system variables is expected to use a dict for self._data, and will therefore return an empty
-        set from this method.
+        This method returns an empty set when this Context is not chained from another Context. The Context used to
+        represent the system variables is expected to be the root Context, and will therefore return an empty set from
+        this method.
 
         :return: Set of initial variables
         """
-        if isinstance(self._data, ChainMap):
-            return set(self._data.maps[-1])
+        if self._parent is None:
+            return set()
 
-        return set()
+        context = self._parent
+        while context._parent is not None:
+            context = context._parent
 
-    def chain(self) -> "Context":
-        context = type(self)()
-        self._children.append(weakref.ref(context))
+        return set(context._revisions)
+
+    def chain(self, snapshot: bool = False) -> "Context":
+        """
+        Create a context that sees the variables of this context, and keeps the variables set in it to itself.
+
+        :param snapshot: If set, the chained context doesn't see variables added to this context (or its ancestors)
+                         afterwards, i.e. it sees this context exactly as it is now
+        """
+        with LOCK:
+            context = type(self)()
+            context._parent = self
+            context._snapshot = snapshot
+            self._chained_version = context._version
 
-        if isinstance(self._data, ChainMap):
-            context._data = self._data.new_child(context._data)
-        else:
-            context._data = ChainMap(context._data, self._data)
         return context
 
-    def as_dict(self, exclude_initial: bool = False) -> dict[str, Any]:
+    def as_dict(self, exclude_initial: bool = False, names: Optional[Collection[str]] = None) -> dict[str, Any]:
+        """
+        Resolve variables of context into a dictionary.
+
+        :param exclude_initial: Exclude variables of the root context
+        :param names: If given, only these variables are included. Names not in context are ignored.
+        :return: Dictionary of variables
+        """
+        if names is None:
+            names = list(self)
+        else:
+            names = [k for k in self if k in names]
+
         if exclude_initial:
             initial_vars = self.initial_vars
-            return {k: self[k] for k in self if k not in initial_vars}
+            names = [k for k in names if k not in initial_vars]
 
-        return dict(self)
+        self.prefetch(names)
+        return {k: self[k] for k in names}
 
     def require(self, *names) -> dict[str, Any]:
         unknowns = []
@@ -111,13 +314,119 @@ class Context(LazyDict):
 
         return resolved
 
-    def load_from_file(self, file_path: str) -> None:
+    def prefetch(self, names: Collection[str]) -> None:
+        """
+        Start resolving the lazy values of `names` in background threads, so that values which are slow to resolve
+        (e.g. need a network call) are resolved concurrently, rather than one at a time as a template reads them.
+        Each value is still resolved only once; reading a value being resolved in background waits for it.
+
+        Values loaded by `load_from_file(lazy=True)` are not rendered in background, since rendering reads other
+        variables of the context. Instead, lazy values read by their templates are resolved in background.
+        Encrypted values are decrypted by the calling thread meanwhile.
+
+        :param names: Names of the variables to resolve
+        """
+        cache = self._cache
+        for name in names:
+            revision = cache.get(name) or self._lookup(name)
+            if revision is not None and isinstance(revision.value, LazyValue) and not revision.value.resolved:
+                break
+        else:
+            return  # Nothing to resolve, which is the case for most of the renders
+
+        pending = []
+        seen = set()
+        stack = [(self, name) for name in reversed(list(names))]
+
+        while stack:
+            context, name = stack.pop()
+            if (id(context), name) in seen:
+                continue
+
+            seen.add((id(context), name))
+            revision = context._lookup(name)
+            if revision is None:
+                continue
+
+            value = revision.value
+            if not isinstance(value, LazyValue) or value.resolved:
+                continue
+
+            if isinstance(value, LazyFileValue):
+                compiled = value.template.compiled
+                if compiled is not None:
+                    stack.extend((value.context, n) for n in reversed(compiled.names))
+            else:
+                pending.append(value)
+
+        # Encrypted values are decrypted together, so that they are decrypted in parallel by a pool of processes. That
+        # is done by this thread rather than a background one, which must not start processes.
+        ciphers = [value.resolver for value in pending if isinstance(value.resolver, VaultCipher)]
+        secret = None
+        if ciphers:
+            # Resolved before any background work starts, since getting the secret may create a boto3 client (e.g.
+            # `SSMSecretProvider`), which isn't safe while another thread creates one (e.g. to resolve `ACCOUNT_ID`)
+            try:
+                secret = selected_vault_secret()
+            except Exception as e:
+                logger.debug(f"Unable to prefetch encrypted values: {e!r}")
+                ciphers = []
+
+        for value in pending:
+            if not isinstance(value.resolver, VaultCipher):
+                prefetch_executor().submit(value.resolve).add_done_callback(log_prefetch_error)
+
+        if ciphers:
+            try:
+                VaultCipher.decrypt_many(ciphers, secret)
+            except Exception as e:
+                logger.debug(f"Unable to prefetch encrypted values: {e!r}")
+
+    def load_from_file(self, file_path: str, lazy: bool = False) -> None:
+        """
+        Load variables from a YAML file. Values are rendered using this context and the other values of the file.
+
+        :param file_path: Path of the file to load
+        :param lazy: If set, each top-level value is rendered when it is first accessed rather than on load. Variables
+                     it depends on are rendered the same way, so values that are never accessed are never rendered.
+        """
         vars_ = yaml.load(file_path)
-        if vars_:
-            vars_ = ObjectTemplate(self).render(vars_)
-            initial_vars = self.initial_vars
-            for k, v in vars_.items():
-                if k in initial_vars:
-                    raise VariableError(f"{k} is protected variable and cannot be altered.", var_name=k)
+        if not vars_:
+            return
+
+        initial_vars = self.initial_vars
+        for k in vars_:
+            if k in initial_vars:
+                raise VariableError(f"{k} is protected variable and cannot be altered.", var_name=k)
 
+        if not lazy:
+            vars_ = DocumentTemplate(vars_).render(self)
+            for k, v in vars_.items():
                 self[k] = v
+
+            return
+
+        # Values are rendered in a snapshot holding the values of this file, so that they see the values of this context
+        # as they are now, same as if rendered on load, even if a variable is added or overridden afterwards (e.g. by a
+        # file loaded later)
+        context = self.chain(snapshot=True)
+        for k, v in vars_.items():
+            # Encrypted values (i.e. `!vault`) are decrypted when accessed, same as values set directly
+            value = LazyValue(v) if callable(v) else LazyFileValue(context, k, v)
+
+            # Both contexts share the value, so that it is resolved once
+            self._set(k, value)
+            context._set(k, value)
+
+    def render_lazy_var(self, key: str, template: DocumentTemplate) -> Any:
+        rendering = RENDERING_VARS.get()
+        for i, (context, name) in enumerate(rendering):
+            if context is self and name == key:
+                cycle = [name for _, name in rendering[i:]] + [key]
+                raise VariableError("Found circular dependency: {}".format(" -> ".join(cycle)), var_name=key)
+
+        token = RENDERING_VARS.set(rendering + ((self, key),))
+        try:
+            return template.render(self)[key]
+        finally:
+            RENDERING_VARS.reset(token)
@@ -0,0 +1,449 @@
+import ast
+import hashlib
+import importlib.util
+import logging
+import marshal
+import traceback
+from collections import deque
+from types import CodeType
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Optional
+
+from strong_opx import __version__
+from strong_opx.template.compiler import (
+    CONTEXT_VAR_NAME,
+    CTX_LOAD,
+    CTX_STORE,
+    FILTER_VAR_PREFIX,
+    INCLUDE_VAR_NAME,
+    OUTPUT_VAR_NAME,
+)
+from strong_opx.template.lexer import has_delimiters
+from strong_opx.template.object_template import ObjectTemplate, leaf_ref
+from strong_opx.template.registry import SAFE_BUILTINS, TEMPLATE_FILTERS
+from strong_opx.template.template import CODE_FORMAT_VERSION, TEMPLATE_DISK_CACHE, Template
+from strong_opx.template.variable import REF_SEP
+from strong_opx.utils.cache import LRUCache
+from strong_opx.utils.tracking import OpxMapping, OpxSequence, OpxString, get_position, set_position
+
+if TYPE_CHECKING:
+    from strong_opx.template import Context
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_FUNC_NAME = "_opx_render_doc_"
+DOCUMENT_VAR_NAME = "_opx_doc_"
+SOURCES_VAR_NAME = "_opx_src_"
+POSITION_FUNC_NAME = "_opx_pos_"
+LINES_VAR_NAME = "_opx_lines_"
+LEAF_VAR_NAME = "_opx_leaf_"  # Index of the template being rendered, to report an error raised by it
+
+NOT_RENDERED = object()
+
+
+class NotCompilable(Exception):
+    """
+    Raised when a document can't be compiled into a single function, and `ObjectTemplate` must be used instead.
+    """
+
+
+class Leaf(NamedTuple):
+    path: tuple[Any, ...]
+    ref: str
+    source: str
+
+
+def with_position(value: Any, source: str) -> Any:
+    """
+    Set position of the template `source` on its rendered `value`, same as `Substitution.resolve()`.
+    """
+    if isinstance(value, str):
+        value = OpxString(value)
+        set_position(value, *get_position(source))
+
+    return value
+
+
+def constant_key(key: Any) -> Any:
+    """
+    Return `key` as a value of builtin type, so that it can be used as an `ast.Constant`.
+    """
+    for key_type in (bool, str, int, float):
+        if isinstance(key, key_type):
+            return key_type(key)
+
+    if key is None:
+        return None
+
+    raise NotCompilable(f"Unsupported key: {key!r}")
+
+
+class CompiledDocument(NamedTuple):
+    code: CodeType
+    filters: tuple[str, ...]
+    names: tuple[str, ...]  # Names of the variables looked up in the context
+    function: Callable[["Context", dict, list[str]], None]
+
+    @classmethod
+    def from_code(cls, code: CodeType, filters: tuple[str, ...], names: tuple[str, ...]) -> "CompiledDocument":
+        namespace = {}
+        globals_ = {"__builtins__": SAFE_BUILTINS, POSITION_FUNC_NAME: with_position}
+        for pipe_name in filters:
+            globals_[pipe_name] = TEMPLATE_FILTERS[pipe_name[len(FILTER_VAR_PREFIX) :]]
+
+        exec(code, globals_, namespace)
+        return cls(code=code, filters=filters, names=names, function=namespace[DOCUMENT_FUNC_NAME])
+
+    def dumps(self) -> bytes:
+        return marshal.dumps((self.code, self.filters, self.names))
+
+    @classmethod
+    def loads(cls, data: bytes) -> Optional["CompiledDocument"]:
+        """
+        Load a compiled document serialized by `dumps()`. Returns None if data is corrupted or document uses a filter
+        that is not registered in the current process.
+        """
+        try:
+            code, filters, names = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        if any(pipe_name[len(FILTER_VAR_PREFIX) :] not in TEMPLATE_FILTERS for pipe_name in filters):
+            return None
+
+        return cls.from_code(code, filters, names)
+
+
+# Compiled documents, keyed by `DocumentTemplate.digest`. None marks a document that can't be compiled.
+DOCUMENT_CACHE: LRUCache[Optional[CompiledDocument]] = LRUCache(maxsize=256)
+
+
+class DocumentTemplate:
+    """
+    Renders a mapping of values (e.g. a vars file) like `ObjectTemplate`, but the templates of the whole document are
+    compiled into a single function. The function renders every value in dependency order, and values referring to
+    other values of the document read them from local variables instead of looking them up in the context.
+
+    Position of each rendered value is retained from its template. If the document can't be compiled (e.g. it has a
+    circular dependency) or refers to a variable that is not defined, the document is rendered with `ObjectTemplate`,
+    which reports errors along with their position in the file. An error raised while rendering a template is reported
+    the same way `ObjectTemplate` reports it.
+    """
+
+    def __init__(self, document: dict[str, Any]):
+        self.document = document
+        self.file_path = get_position(document)[0]
+
+        self.leaves: list[Leaf] = []
+        self.literal_refs: set[str] = set()
+        self.callable_refs: set[str] = set()  # Values resolved when read, e.g. `!vault` ciphers
+        self.container_leaves: dict[str, list[int]] = {}  # Indexes of the templates nested in each container
+
+        # Generated code depends on the structure of the document and its templates, but not the literal values
+        digest = hashlib.sha256()
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(f"document\0{__version__}\0{CODE_FORMAT_VERSION}\0{self.file_path}\0".encode("utf-8"))
+
+        try:
+            for key, value in document.items():
+                self.walk(digest, value, (constant_key(key),), str(key), ())
+        except NotCompilable:
+            self.digest = None
+        else:
+            self.digest = digest.hexdigest()
+
+    def walk(self, digest, value: Any, path: tuple[Any, ...], ref: str, container_refs: tuple[str, ...]) -> None:
+        if isinstance(value, (list, dict)):
+            self.container_leaves[ref] = []
+            digest.update(f"{path!r}\0{type(value).__name__}\0".encode("utf-8"))
+
+            items = value.items() if isinstance(value, dict) else enumerate(value)
+            for k, v in items:
+                self.walk(digest, v, path + (constant_key(k),), f"{ref}{REF_SEP}{k}", container_refs + (ref,))
+
+        elif isinstance(value, str) and has_delimiters(value):
+            for container_ref in container_refs:
+                self.container_leaves[container_ref].append(len(self.leaves))
+
+            self.leaves.append(Leaf(path=path, ref=ref, source=value))
+
+            _, start_pos, _ = get_position(value)
+            digest.update(f"{path!r}\0template\0{start_pos}\0".encode("utf-8"))
+            digest.update(str(value).encode("utf-8", errors="surrogatepass"))
+
+        elif callable(value):
+            # Same as `ObjectTemplate`, these are resolved when assigned to a context variable, so only a top-level one
+            # can be referred to
+            self.callable_refs.add(ref)
+            digest.update(f"{path!r}\0callable\0".encode("utf-8"))
+
+        else:
+            self.literal_refs.add(ref)
+            digest.update(f"{path!r}\0literal\0".encode("utf-8"))
+
+    def build_output(self) -> dict[str, Any]:
+        """
+        Copy the document, where templates are replaced by a placeholder to be filled by the compiled function.
+        """
+
+        def copy(value: Any) -> Any:
+            if isinstance(value, list):
+                obj = OpxSequence(copy(v) for v in value)
+            elif isinstance(value, dict):
+                obj = OpxMapping((k, copy(v)) for k, v in value.items())
+            elif isinstance(value, str) and has_delimiters(value):
+                return NOT_RENDERED
+            else:
+                return value
+
+            set_position(obj, *get_position(value))
+            return obj
+
+        return {k: copy(v) for k, v in self.document.items()}
+
+    @property
+    def compiled(self) -> Optional[CompiledDocument]:
+        if self.digest is None:
+            return None
+
+        return DOCUMENT_CACHE.get_or_create(self.digest, self.compile)
+
+    def render(self, context: "Context") -> dict[str, Any]:
+        compiled = self.compiled
+        if compiled is None or not all(name in context for name in compiled.names):
+            # Nothing is rendered yet, so `ObjectTemplate` reports undefined variables without rendering twice
+            return ObjectTemplate(context).render(self.document)
+
+        context.prefetch(compiled.names)
+
+        output = self.build_output()
+        try:
+            compiled.function(context, output, [leaf.source for leaf in self.leaves])
+        except Exception as e:
+            handled_e = self.handle_exception(compiled, e)
+            if handled_e is None:
+                raise
+
+            raise handled_e from e
+
+        return output
+
+    def handle_exception(self, compiled: CompiledDocument, e: Exception) -> Optional[Exception]:
+        """
+        Handle an exception raised by the compiled function, the same way `Template` handles an exception raised while
+        rendering the template that raised it.
+        """
+        for frame, _ in traceback.walk_tb(e.__traceback__):
+            if frame.f_code is compiled.function.__code__:
+                index = frame.f_locals.get(LEAF_VAR_NAME)
+                break
+        else:
+            return None
+
+        if index is None:
+            return None
+
+        # Code of the document is compiled with the actual position of each template in the file
+        template = Template(self.leaves[index].source)
+        return template.handle_exception(self.file_path or "<document>", e, line_offset=0)
+
+    def compile(self) -> Optional[CompiledDocument]:
+        if TEMPLATE_DISK_CACHE.enabled:
+            data = TEMPLATE_DISK_CACHE.get(self.digest)
+            if data is not None:
+                compiled = CompiledDocument.loads(data)
+                if compiled is not None:
+                    return compiled
+
+        try:
+            module, filters, names = self.compile_document()
+        except NotCompilable as e:
+            logger.debug(f"Unable to compile document {self.file_path}: {e}")
+            return None
+
+        code = compile(module, self.file_path or "<document>", "exec")
+        compiled = CompiledDocument.from_code(code, filters, names)
+        TEMPLATE_DISK_CACHE.set(self.digest, compiled.dumps())
+        return compiled
+
+    def compile_document(self) -> tuple[ast.Module, tuple[str, ...], tuple[str, ...]]:
+        """
+        Compile templates of the document into a module defining `DOCUMENT_FUNC_NAME`. The function takes the
+        context, the output built by `build_output()` and the sources of templates, and fills in the output.
+
+        :return: The module, names of the filters and names of the context variables used by the templates
+        """
+        top_keys = {str(key): constant_key(key) for key in self.document}
+        leaf_index = {leaf.ref: i for i, leaf in enumerate(self.leaves)}
+
+        # Same as `ObjectTemplate`, a ref within a value that isn't a container requires that value
+        leaf_refs = self.literal_refs.union(leaf_index, (ref for ref in self.callable_refs if ref in top_keys))
+        defined_refs = leaf_refs.union(self.container_leaves)
+
+        filters = set()
+        names = {}
+        bodies: list[list[ast.stmt]] = []
+        dependents: list[list[int]] = [[] for _ in self.leaves]
+        pending = [0] * len(self.leaves)
+        local_names: dict[str, str] = {}
+        used_locals: list[list[str]] = []  # Top-level values each template refers to
+
+        for i, leaf in enumerate(self.leaves):
+            compiler = Template.compile_tokens(leaf.source)
+            body = compiler.finalize(optimize=True, fix_locations=False).body
+            filters.update(name for name in compiler.variables.globals if name.startswith(FILTER_VAR_PREFIX))
+
+            requires = set()
+            used = {}
+            for ref in compiler.variables.refs:
+                top_ref = ref.split(REF_SEP)[0]
+                if top_ref not in top_keys:
+                    names[top_ref] = None  # Looked up in the context
+                    continue
+
+                ref = leaf_ref(ref, defined_refs, leaf_refs)
+                if ref in leaf_index:
+                    requires.add(leaf_index[ref])
+                elif ref in self.container_leaves:
+                    requires.update(self.container_leaves[ref])
+                elif ref not in leaf_refs:
+                    raise NotCompilable(f"{ref} is undefined")
+
+                local_names.setdefault(top_ref, f"_opx_v{len(local_names)}_")
+                used[top_ref] = None
+
+            used_locals.append(list(used))
+
+            for j in requires:
+                dependents[j].append(i)
+
+            pending[i] = len(requires)
+            bodies.append(DocumentNodeTransformer(top_keys, local_names).visit_body(body))
+
+        # Order templates so that each is rendered after the values it refers to (Kahn's algorithm)
+        order = []
+        ready = deque(i for i, count in enumerate(pending) if count == 0)
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+
+            for j in dependents[i]:
+                pending[j] -= 1
+                if pending[j] == 0:
+                    ready.append(j)
+
+        if len(order) < len(self.leaves):
+            raise NotCompilable("Found circular dependency")
+
+        statements = []
+        assigned = set(leaf_index)
+        for i in order:
+            statements.append(ast.Assign(targets=[ast.Name(id=LEAF_VAR_NAME, ctx=CTX_STORE)], value=ast.Constant(i)))
+
+            # Top-level templates assign their local variable when rendered. Other values are in the output already,
+            # and are assigned before the first template referring to them, where callables are resolved as a context
+            # would resolve them.
+            for ref in used_locals[i]:
+                if ref in assigned:
+                    continue
+
+                assigned.add(ref)
+                value = output_subscript((top_keys[ref],), CTX_LOAD)
+                if ref in self.callable_refs:
+                    value = ast.Call(value, args=[], keywords=[])
+
+                statements.append(ast.Assign(targets=[ast.Name(id=local_names[ref], ctx=CTX_STORE)], value=value))
+
+            leaf = self.leaves[i]
+            statements.extend(self.compile_leaf(i, leaf, bodies[i], local_names.get(leaf.ref)))
+
+        module = ast.parse(
+            f"def {DOCUMENT_FUNC_NAME}({CONTEXT_VAR_NAME}, {DOCUMENT_VAR_NAME}, {SOURCES_VAR_NAME}): pass"
+        )
+        if statements:
+            module.body[0].body = statements
+
+        ast.fix_missing_locations(module)
+        return module, tuple(sorted(filters)), tuple(names)
+
+    @staticmethod
+    def compile_leaf(index: int, leaf: Leaf, body: list[ast.stmt], local_name: Optional[str]) -> list[ast.stmt]:
+        """
+        Compile statements assigning the output of a template to its position in the output.
+        """
+        if len(body) == 1 and isinstance(body[0], ast.Assign) and body[0].targets[0].id == OUTPUT_VAR_NAME:
+            value = body[0].value
+            statements = []
+        elif not body:
+            value = ast.Constant(value="", kind=None)
+            statements = []
+        else:
+            value = ast.Call(
+                ast.Attribute(value=ast.Constant(value="", kind=None), attr="join", ctx=CTX_LOAD),
+                args=[ast.Name(id=LINES_VAR_NAME, ctx=CTX_LOAD)],
+                keywords=[],
+            )
+            statements = [
+                ast.Assign(targets=[ast.Name(id=LINES_VAR_NAME, ctx=CTX_STORE)], value=ast.List(elts=[], ctx=CTX_LOAD)),
+                *body,
+            ]
+
+        value = ast.Call(
+            ast.Name(id=POSITION_FUNC_NAME, ctx=CTX_LOAD),
+            args=[value, ast.Subscript(ast.Name(id=SOURCES_VAR_NAME, ctx=CTX_LOAD), ast.Constant(index), CTX_LOAD)],
+            keywords=[],
+        )
+
+        targets = [output_subscript(leaf.path, CTX_STORE)]
+        if local_name is not None:
+            targets.insert(0, ast.Name(id=local_name, ctx=CTX_STORE))
+
+        statement = ast.Assign(targets=targets, value=value)
+        if body:
+            ast.copy_location(statement, body[-1])
+
+        statements.append(statement)
+        return statements
+
+
+def output_subscript(path: tuple[Any, ...], ctx: ast.expr_context) -> ast.Subscript:
+    node = ast.Name(id=DOCUMENT_VAR_NAME, ctx=CTX_LOAD)
+    for i, key in enumerate(path, 1):
+        node = ast.Subscript(value=node, slice=ast.Constant(key), ctx=ctx if i == len(path) else CTX_LOAD)
+
+    return node
+
+
+class DocumentNodeTransformer(ast.NodeTransformer):
+    """
+    Replaces context lookups of values defined in the document with local variables, and renames the list of output
+    lines so that it doesn't clash with loop variables.
+    """
+
+    def __init__(self, top_keys: dict[str, Any], local_names: dict[str, str]):
+        self.top_keys = top_keys
+        self.local_names = local_names
+
+    def visit_body(self, body: list[ast.stmt]) -> list[ast.stmt]:
+        return [self.visit(node) for node in body]
+
+    def visit_Name(self, node: ast.Name) -> ast.Name:
+        if node.id == INCLUDE_VAR_NAME:
+            # Included templates are rendered with the context, where values of the document are not available
+            raise NotCompilable("Template includes another template")
+
+        if node.id == "lines":
+            return ast.copy_location(ast.Name(id=LINES_VAR_NAME, ctx=node.ctx), node)
+
+        return node
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:
+        value = node.value
+        if (
+            isinstance(value, ast.Name)
+            and value.id == CONTEXT_VAR_NAME
+            and isinstance(node.slice, ast.Constant)
+            and node.slice.value in self.top_keys
+        ):
+            return ast.copy_location(ast.Name(id=self.local_names[node.slice.value], ctx=CTX_LOAD), node)
+
+        return self.generic_visit(node)
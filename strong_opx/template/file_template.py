@@ -1,10 +1,13 @@
 import os
+from typing import Iterator, Optional
 
 import jinja2
+import jinja2.meta
 
 from strong_opx.config import opx_config
 from strong_opx.template.context import Context
 from strong_opx.template.template import Template
+from strong_opx.utils.files import atomic_write
 from strong_opx.utils.tracking import OpxString, Position, set_position
 
 
@@ -23,18 +26,70 @@ class FileTemplate:
 
         return self._default_renderer(context)
 
-    def _default_renderer(self, context: Context) -> str:
+    def stream(self, context: Context) -> Iterator[str]:
+        """
+        Render the file as string chunks, yielding each chunk as soon as it is produced.
+        """
+        if opx_config.templating_engine == "jinja2":
+            template = self._jinja2_template()
+            return template.generate(**self._jinja2_context(template, context))
+
+        return self._default_template().stream(context)
+
+    def _default_template(self) -> Template:
         content = OpxString(self.content)
         set_position(content, self.file_path, Position(1, 1), None)
-        return Template(content).render(context)
+        return Template(content)
 
-    def _render_with_jinja2(self, context: Context) -> str:
+    def _default_renderer(self, context: Context) -> str:
+        return self._default_template().render(context)
+
+    def _jinja2_template(self) -> jinja2.Template:
         loader = jinja2.FileSystemLoader(os.path.dirname(self.file_path))
         environment = jinja2.Environment(loader=loader)
-        template = environment.from_string(self.content)
-        return template.render(**context.as_dict())
+        return environment.from_string(self.content)
+
+    def _jinja2_names(self, environment: jinja2.Environment) -> Optional[set[str]]:
+        """
+        Names of variables referenced by the template and by templates it includes, imports or extends. Returns None
+        if a referenced template can't be determined without rendering e.g. `{% include name %}`.
+        """
+        names = set()
+        sources = [self.content]
+        referenced_templates = set()
+
+        while sources:
+            ast = environment.parse(sources.pop())
+            names.update(jinja2.meta.find_undeclared_variables(ast))
+
+            for template_name in jinja2.meta.find_referenced_templates(ast):
+                if template_name is None:
+                    return None
+
+                if template_name in referenced_templates:
+                    continue
+
+                referenced_templates.add(template_name)
+                try:
+                    sources.append(environment.loader.get_source(environment, template_name)[0])
+                except jinja2.TemplateNotFound:
+                    pass  # Reported by jinja2 while rendering
+
+        return names
+
+    def _jinja2_context(self, template: jinja2.Template, context: Context) -> dict:
+        # Only variables referenced by the template are resolved, so that e.g. unused secrets aren't decrypted
+        return context.as_dict(names=self._jinja2_names(template.environment))
+
+    def _render_with_jinja2(self, context: Context) -> str:
+        template = self._jinja2_template()
+        return template.render(**self._jinja2_context(template, context))
 
     def render_to_file(self, target_path: str, context: Context) -> None:
+        """
+        Render the file into `target_path`. Output is streamed into a temporary file next to the target, which then
+        replaces the target, so that an error while rendering leaves no partially rendered file behind.
+        """
         os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        with open(target_path, "w") as f:
-            f.write(self.render(context))
+        with atomic_write(target_path) as f:
+            f.writelines(self.stream(context))
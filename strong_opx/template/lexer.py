@@ -17,6 +17,30 @@ RE_BLOCK_END = re.compile(r"%}")
 RE_LEGACY_VARIABLE_START = re.compile(r"\${{?")
 RE_LEGACY_VARIABLE_END = re.compile(r"}?}")
 
+# All start delimiters combined into a single pattern, so that next delimiter of any kind is found in a single scan.
+# Alternatives are ordered by precedence for when multiple delimiters start at the same position e.g. `{% raw %}`
+# must be preferred over `{%`.
+RE_DELIMITER_START = re.compile(
+    "|".join(
+        f"(?P<{name}>{pattern.pattern})"
+        for name, pattern in (
+            ("raw", RE_RAW_START),
+            ("comment", RE_COMMENT_START),
+            ("variable", RE_VARIABLE_START),
+            ("block", RE_BLOCK_START),
+            ("legacy", RE_LEGACY_VARIABLE_START),
+        )
+    )
+)
+
+
+def has_delimiters(value: str) -> bool:
+    """
+    Check whether the value contains the start of any tag. A value without any is rendered as-is, so it doesn't need
+    to be tokenized at all. Substring checks are used as they are considerably cheaper than `RE_DELIMITER_START`.
+    """
+    return "{{" in value or "{%" in value or "{#" in value or "${" in value
+
 
 class LexerError(Exception):
     def __init__(self, message: str, start_pos: int, end_pos: Optional[int] = None):
@@ -44,39 +68,23 @@ class TemplateLexer:
         length = len(self.template)
         position = 0
 
-        pattern_handlers = (
-            # Check for {% raw %} first
-            (RE_RAW_START, self._handle_raw_block),
-            (RE_COMMENT_START, self._skip_comment),  # Check for comments
-            (RE_VARIABLE_START, functools.partial(self._handle_tag, RE_VARIABLE_END)),
-            (RE_BLOCK_START, functools.partial(self._handle_tag, RE_BLOCK_END)),
-            (
-                RE_LEGACY_VARIABLE_START,
-                functools.partial(self._handle_tag, RE_LEGACY_VARIABLE_END, strip_whitespaces=False),
-            ),
-        )
+        delimiter_handlers = {
+            "raw": self._handle_raw_block,
+            "comment": self._skip_comment,
+            "variable": functools.partial(self._handle_tag, RE_VARIABLE_END),
+            "block": functools.partial(self._handle_tag, RE_BLOCK_END),
+            "legacy": functools.partial(self._handle_tag, RE_LEGACY_VARIABLE_END, strip_whitespaces=False),
+        }
 
         while position < length:
-            text_start = position
-            next_delim_pos = length
-
-            next_delim_match = None
-            next_delim_handler = None
-
-            for pattern, handler in pattern_handlers:
-                match = pattern.search(self.template, position)
-                if match and match.start() < next_delim_pos:
-                    next_delim_pos = match.start()
-
-                    next_delim_match = match
-                    next_delim_handler = handler
+            match = RE_DELIMITER_START.search(self.template, position)
+            next_delim_pos = match.start() if match else length
 
-            if next_delim_pos > text_start:
-                text = self.template[text_start:next_delim_pos]
-                self._tokens.append(Token(text, text_start))
+            if next_delim_pos > position:
+                self._tokens.append(Token(self.template[position:next_delim_pos], position))
 
-            if next_delim_handler:
-                position = next_delim_handler(next_delim_match.end(), next_delim_match)
+            if match:
+                position = delimiter_handlers[match.lastgroup](match.end(), match)
             else:
                 position = next_delim_pos
 
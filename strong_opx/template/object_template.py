@@ -1,6 +1,8 @@
-from typing import TYPE_CHECKING, Any, Optional, TypeVar, Union
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING, Any, Iterator, Optional, TypeVar, Union
 
-from strong_opx.exceptions import UndefinedVariableError, VariableError
+from strong_opx.exceptions import ConfigurationError, ErrorDetail, UndefinedVariableError, VariableError
+from strong_opx.template.lexer import has_delimiters
 from strong_opx.template.template import Template
 from strong_opx.template.variable import REF_SEP
 from strong_opx.utils.tracking import OpxMapping, OpxSequence, OpxString, get_position, set_position
@@ -14,44 +16,102 @@ T_CONTAINER_INDEXER = Union[str, int]
 NOT_RENDERED = object()
 
 
-class TreeNode:
-    __slots__ = ("value", "children")
+def strongly_connected_components(graph: dict[str, list[str]]) -> list[list[str]]:
+    """
+    Find strongly connected components of a directed graph using an iterative version of Tarjan's algorithm, so that
+    long dependency chains don't hit the recursion limit.
+
+    :param graph: Mapping of each node to the nodes it has an edge to
+    :return: Components in reverse topological order
+    """
+    index: dict[str, int] = {}
+    low_link: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    components: list[list[str]] = []
+
+    def visit(node: str) -> Iterator[str]:
+        index[node] = low_link[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        return iter(graph.get(node, ()))
+
+    for root in graph:
+        if root in index:
+            continue
+
+        work = [(root, visit(root))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    work.append((child, visit(child)))
+                    break
+
+                if child in on_stack:
+                    low_link[node] = min(low_link[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
 
-    def __init__(self, value: Any):
-        self.value = value
-        self.children: list[TreeNode] = []
+                if low_link[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member == node:
+                            break
 
-    def __hash__(self):
-        # Note this does NOT account for self.children. So, two TreeNodes with the same 'value' will have the same hash.
-        # This behavior is utilized by the check_cycle() method.
-        return hash(self.value)
+                    components.append(component)
 
-    def __repr__(self):
-        return f"{self.__class__.__name__}({self.value})"
+    return components
+
+
+def find_cycle(graph: dict[str, list[str]], start: str) -> Optional[list[str]]:
+    """
+    Find the shortest cycle passing through `start`, e.g. `[a, b, a]`. Returns None if there is no such cycle.
+    """
+    parents: dict[str, str] = {}
+    queue = deque([start])
+
+    while queue:
+        node = queue.popleft()
+        for child in graph.get(node, ()):
+            if child == start:
+                path = [node]
+                while node != start:
+                    node = parents[node]
+                    path.append(node)
+
+                path.reverse()
+                path.append(start)
+                return path
+
+            if child not in parents:
+                parents[child] = node
+                queue.append(child)
 
-    def check_cycle(self, visited: dict["TreeNode", bool], in_stack: dict["TreeNode", bool]) -> Optional[list[str]]:
-        # Check if node exists in the recursive stack
-        if in_stack.get(self):
-            return [self.value]
+    return None
 
-        # Check if node is already visited
-        if visited.get(self):
-            return None
 
-        # Marking node as visited and present in recursive stack
-        visited[self] = True
-        in_stack[self] = True
+def leaf_ref(ref: str, defined_refs: set[str], leaf_refs: set[str]) -> str:
+    """
+    Return the ref of the value `ref` is within, if `ref` is not defined itself and the value is not a container.
+    Otherwise, `ref` is returned as-is.
+    """
+    if ref in defined_refs:
+        return ref
 
-        # Iterate for all children of node.
-        for node in self.children:
-            cycle_path = node.check_cycle(visited, in_stack)
-            if cycle_path:
-                cycle_path.append(self.value)
-                return cycle_path
+    nodes = ref.split(REF_SEP)
+    for i in range(len(nodes) - 1, 0, -1):
+        prefix = REF_SEP.join(nodes[:i])
+        if prefix in defined_refs:
+            return prefix if prefix in leaf_refs else ref
 
-        # Mark 'node' to be removed from the recursive stack.
-        in_stack.pop(self)
-        return None
+    return ref
 
 
 class SubstitutionBase:
@@ -61,9 +121,6 @@ class SubstitutionBase:
     def update_required_refs(self, context_refs: set) -> None:
         pass  # Does nothing by default
 
-    def can_resolve(self, resolved_refs: set) -> bool:
-        raise NotImplementedError
-
     def resolve(self, context: "Context") -> None:
         raise NotImplementedError
 
@@ -86,9 +143,6 @@ class Substitution(SubstitutionBase):
     def update_required_refs(self, context_refs: set) -> None:
         self.required_refs = {ref for ref in self.required_refs if ref.split(REF_SEP)[0] not in context_refs}
 
-    def can_resolve(self, resolved_refs: set) -> bool:
-        return self.required_refs.issubset(resolved_refs)
-
     def resolve(self, context: "Context") -> None:
         rendered = self.template.render(context)
         if isinstance(rendered, str):
@@ -112,19 +166,12 @@ class ContainerSubstitution(SubstitutionBase):
     def required_refs(self):
         return set()
 
-    def can_resolve(self, resolved_refs: set) -> bool:
-        values = self.obj
-        if isinstance(self.obj, dict):
-            values = self.obj.values()
-
-        return not any(v == NOT_RENDERED for v in values)
-
     def resolve(self, context: "Context") -> None:
         self.parent[self.index] = self.obj
 
 
 class ObjectTemplate:
-    __slots__ = ("context", "substitutions")
+    __slots__ = ("context", "substitutions", "literal_refs")
 
     def __init__(self, context: "Context"):
         """
@@ -133,6 +180,9 @@ class ObjectTemplate:
         self.context = context
         self.substitutions: list[Union[Substitution, ContainerSubstitution]] = []
 
+        # Refs of the values that are assigned as-is without any substitution. These are resolved from the start.
+        self.literal_refs: set[str] = set()
+
     def render(self, value: T) -> T:
         """
         Renders the given value, substituting any variables with values from the context and/or from sub-values defined
@@ -190,12 +240,16 @@ class ObjectTemplate:
             parent[index] = obj
             substitution = ContainerSubstitution(ref, obj, parent, index)
 
-        elif isinstance(value, str):
+        elif isinstance(value, str) and has_delimiters(value):
             template = Template(value)
             substitution = Substitution(ref=ref, template=template, parent=parent, index=index)
 
         else:  # No need to render the value
             parent[index] = value
+            if not callable(value):
+                # Callables (e.g. vault ciphers) are only resolved when they are assigned to a context variable, so a
+                # nested one isn't a value a template can refer to
+                self.literal_refs.add(ref)
             return
 
         # Don't render the substitution yet. We need to resolve all substitutions first.
@@ -223,7 +277,7 @@ class ObjectTemplate:
         return parent
 
     def resolve_substitutions(self, context: "Context", update_context_on_render: bool) -> None:
-        resolved_refs = set()
+        resolved_refs = set(self.literal_refs)
         context_refs = set(context)
         substitutions = self.substitutions
 
@@ -239,72 +293,107 @@ class ObjectTemplate:
             for substitution in self.substitutions:
                 substitution.update_required_refs(context_refs)
 
-        # Repeatedly iterates over the substitutions, gradually resolving values. If we end up with substitutions that
-        # cannot be resolved, call handle_deadlock() which will raise the appropriate error.
-        while substitutions:
-            resolved = False
-
-            i = len(substitutions) - 1
-            while i >= 0:
-                substitution = substitutions[i]
-                if substitution.can_resolve(resolved_refs):
-                    resolved_refs.add(substitution.ref)
-
-                    substitutions.pop(i)
-                    substitution.resolve(context)
-
-                    resolved = True
-                    if update_context_on_render and "." not in substitution.ref:
-                        context[substitution.index] = substitution.parent[substitution.index]
-
-                i -= 1
-
-            if not resolved:
-                # Reached deadlock while resolving substitutions. This can be either presence of a
-                # circular dependency or some variable is undefined.
-                self.handle_deadlock(resolved_refs)
-                break
+        # A ref within a value that isn't a container, e.g. `{{ V1[0] }}` where V1 is a string, requires that value
+        leaf_refs = self.literal_refs.union(s.ref for s in substitutions if not isinstance(s, ContainerSubstitution))
+        defined_refs = leaf_refs.union(s.ref for s in substitutions)
+        for substitution in substitutions:
+            if not isinstance(substitution, ContainerSubstitution):
+                substitution.required_refs = {
+                    leaf_ref(ref, defined_refs, leaf_refs) for ref in substitution.required_refs
+                }
+
+        # Build the dependency graph once: each substitution counts the refs and the nested substitutions it is
+        # waiting for, and becomes ready when that count drops to zero (Kahn's algorithm). A container is waiting for
+        # each substitution whose parent is the container.
+        containers = {id(s.obj): i for i, s in enumerate(substitutions) if isinstance(s, ContainerSubstitution)}
+        dependents: dict[str, list[int]] = defaultdict(list)
+        pending = [0] * len(substitutions)
+
+        for i, substitution in enumerate(substitutions):
+            for ref in substitution.required_refs:
+                if ref not in resolved_refs:
+                    dependents[ref].append(i)
+                    pending[i] += 1
+
+            container = containers.get(id(substitution.parent))
+            if container is not None:
+                pending[container] += 1
+
+        ready = deque(i for i, count in enumerate(pending) if count == 0)
+        while ready:
+            substitution = substitutions[ready.popleft()]
+            substitution.resolve(context)
+            resolved_refs.add(substitution.ref)
+
+            if update_context_on_render and "." not in substitution.ref:
+                context[substitution.index] = substitution.parent[substitution.index]
+
+            waiting = dependents.pop(substitution.ref, [])
+            container = containers.get(id(substitution.parent))
+            if container is not None:
+                waiting.append(container)
+
+            for i in waiting:
+                pending[i] -= 1
+                if pending[i] == 0:
+                    ready.append(i)
+
+        self.substitutions = [substitution for i, substitution in enumerate(substitutions) if pending[i]]
+        if self.substitutions:
+            # Reached deadlock while resolving substitutions. This can be either presence of a
+            # circular dependency or some variable is undefined.
+            self.handle_deadlock(resolved_refs)
 
     def handle_deadlock(self, resolved_refs: set) -> None:
         """
-        Compiles the unresolved variables from each substitution. If a variable does not exist, an error is raised.
-        If one or more variables create a circular dependency, an error is raised.
+        Compiles the unresolved variables from each substitution and raises a single error reporting every undefined
+        variable and every circular dependency.
         """
-        all_nodes: dict[str, TreeNode] = {}
-        defined_refs = {s.ref for s in self.substitutions} | resolved_refs
-
+        # Maps each ref to the ref of its substitution, which retains the position of the key it is defined with
+        defined_refs = {s.ref: s.ref for s in self.substitutions}
         unknowns = set()
 
-        # loop builds trees with each tree's root being one of the string keys from load(), and each leaf of a tree
-        # being a variable that root key requires for its value to be compiled/resolved.
+        # Graph of each unresolved ref to the unresolved refs it requires. Required refs which are resolved can't be
+        # part of a cycle, so they are left out. A container requires each of its unresolved items.
+        containers = {id(s.obj): s.ref for s in self.substitutions if isinstance(s, ContainerSubstitution)}
+        graph: dict[str, list[str]] = {}
         for substitution in self.substitutions:
-            unknowns.update(substitution.required_refs - defined_refs)
-
-            if substitution.ref in all_nodes:
-                root_node = all_nodes[substitution.ref]
-            else:
-                root_node = TreeNode(substitution.ref)
-                all_nodes[substitution.ref] = root_node
+            requires = graph.setdefault(substitution.ref, [])
+            container_ref = containers.get(id(substitution.parent))
+            if container_ref is not None:
+                graph.setdefault(container_ref, []).append(substitution.ref)
 
             for require in substitution.required_refs:
-                if require in all_nodes:
-                    node = all_nodes[require]
-                else:
-                    node = TreeNode(require)
-                    all_nodes[require] = node
-
-                root_node.children.append(node)
-
-        if unknowns:
+                if require in defined_refs:
+                    requires.append(require)
+                elif require not in resolved_refs:
+                    unknowns.add(require)
+
+        order = {ref: i for i, ref in enumerate(graph)}
+        cycles = []
+
+        for component in strongly_connected_components(graph):
+            # Every ref in a component lies on a cycle, unless it's a single ref which doesn't require itself. Cycle is
+            # reported from the outermost ref, which is the one having the position of its key.
+            start = min(component, key=lambda ref: (ref.count(REF_SEP), order[ref]))
+            cycle = find_cycle(graph, start)
+            if cycle:
+                cycles.append(cycle)
+
+        if not cycles:
             raise UndefinedVariableError(*unknowns)
 
-        # With the dependency trees built, walk through and find the cyclical dependencies preventing us
-        # from resolving all substitutions.
-        visited = {}
-        in_stack = {}
+        cycles.sort(key=lambda cycle: order[cycle[0]])
+        if not unknowns and len(cycles) == 1:
+            cycle = cycles[0]
+            raise VariableError("Found circular dependency: {}".format(" -> ".join(cycle)), defined_refs[cycle[0]])
+
+        errors = UndefinedVariableError(*unknowns).errors if unknowns else []
+        for cycle in cycles:
+            errors.append(
+                ErrorDetail(
+                    "Found circular dependency: {}".format(" -> ".join(cycle)), *get_position(defined_refs[cycle[0]])
+                )
+            )
 
-        for node in all_nodes.values():
-            cycle_path = node.check_cycle(visited, in_stack)
-            if cycle_path:
-                cycle_path.reverse()
-                raise VariableError("Found circular dependency: {}".format(" -> ".join(cycle_path)), node.value)
+        raise ConfigurationError(errors)
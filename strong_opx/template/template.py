@@ -1,79 +1,210 @@
 import ast
+import hashlib
+import importlib.util
+import marshal
 import os
 import sys
 import traceback
-from typing import TYPE_CHECKING, Any, Callable, Optional
+from contextvars import ContextVar
+from types import CodeType
+from typing import TYPE_CHECKING, Any, Callable, Iterator, NamedTuple, Optional
 
+from strong_opx import __version__
+from strong_opx.config import CACHE_DIR
 from strong_opx.exceptions import CommandError, ConfigurationError, TemplateError, UndefinedVariableError, VariableError
-from strong_opx.template.compiler import CONTEXT_VAR_NAME, INCLUDE_VAR_NAME, OUTPUT_VAR_NAME, TemplateCompiler
-from strong_opx.template.lexer import LexerError, TemplateLexer, Token
+from strong_opx.template.compiler import FILTER_VAR_PREFIX, RENDER_FUNC_NAME, STREAM_FUNC_NAME, TemplateCompiler
+from strong_opx.template.lexer import LexerError, TemplateLexer, Token, has_delimiters
 from strong_opx.template.registry import TEMPLATE_FILTERS
-from strong_opx.template.variable import VariableStore
-from strong_opx.utils.tracking import Position, get_position
+from strong_opx.template.variable import VariableRef, VariableStore
+from strong_opx.utils.cache import DiskCache, LRUCache
+from strong_opx.utils.tracking import OpxString, Position, get_position, set_position
 
 if TYPE_CHECKING:
     from strong_opx.template import Context
 
 
+# Identifies the shape of the generated code in `TEMPLATE_DISK_CACHE` keys. Bump when the generated code changes.
+CODE_FORMAT_VERSION = 4
+
+
+class CompiledTemplate(NamedTuple):
+    code: CodeType
+    variables: VariableStore
+    names: tuple[str, ...]  # Names of the variables looked up in the context
+    function: Callable[["Context", Callable[..., str]], Any]
+    stream_function: Callable[["Context", Callable[..., str]], Iterator[str]]
+
+    @classmethod
+    def from_code(cls, code: CodeType, variables: VariableStore) -> "CompiledTemplate":
+        """
+        Execute the module code generated by `TemplateCompiler.finalize_function()` to create the render functions.
+        """
+        namespace = {}
+        exec(code, variables.globals, namespace)
+        return cls(
+            code=code,
+            variables=variables,
+            names=tuple(dict.fromkeys(ref.nodes[0] for ref in variables.refs.values())),
+            function=namespace[RENDER_FUNC_NAME],
+            stream_function=namespace[STREAM_FUNC_NAME],
+        )
+
+    def dumps(self) -> bytes:
+        filters = tuple(name for name in self.variables.globals if name.startswith(FILTER_VAR_PREFIX))
+        refs = tuple(
+            (ref.name, ref.nodes, tuple(ref.start_pos), tuple(ref.end_pos)) for ref in self.variables.refs.values()
+        )
+
+        return marshal.dumps((self.code, filters, refs))
+
+    @classmethod
+    def loads(cls, data: bytes) -> Optional["CompiledTemplate"]:
+        """
+        Load a compiled template serialized by `dumps()`. Returns None if data is corrupted or template uses a filter
+        that is not registered in the current process.
+        """
+        try:
+            code, filters, refs = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        variables = VariableStore()
+        for pipe_name in filters:
+            filter_name = pipe_name[len(FILTER_VAR_PREFIX) :]
+            if filter_name not in TEMPLATE_FILTERS:
+                return None
+
+            variables.define(pipe_name, TEMPLATE_FILTERS[filter_name])
+
+        for name, nodes, start_pos, end_pos in refs:
+            variables.refs[name] = VariableRef(
+                name=name, nodes=nodes, start_pos=Position(*start_pos), end_pos=Position(*end_pos)
+            )
+
+        return cls.from_code(code, variables)
+
+
+# Compiled templates are shared by every `Template` in the process. Entries are compiled as if the template started on
+# the first line of its file, so identical values on different lines of the same file share an entry. Positions are
+# shifted back to the actual line by `Template.to_file_position()` when an error is reported.
+TEMPLATE_CACHE: LRUCache[CompiledTemplate] = LRUCache(maxsize=4096)
+
+# Templates larger than this are not kept in `TEMPLATE_CACHE`, since the code of a template holds its text. These are
+# whole files (e.g. manifests), which a process rarely renders more than once.
+MAX_CACHED_TEMPLATE_SIZE = 16 * 1024
+
+# Persists compiled templates across processes. It is enabled by the CLI entrypoint.
+TEMPLATE_DISK_CACHE = DiskCache(os.path.join(CACHE_DIR, "templates"))
+
+# Templates loaded by `Template.include()`, keyed by path, modification time and size of the file. An edited file gets
+# a new entry, thus a stale template is never rendered.
+INCLUDE_CACHE: LRUCache["Template"] = LRUCache(maxsize=256)
+
+# Paths of the templates being rendered by `Template.include()`, outermost first
+INCLUDE_STACK: ContextVar[tuple[str, ...]] = ContextVar("INCLUDE_STACK", default=())
+
+
 class Template:
-    module: ast.Module
+    names: tuple[str, ...]
+    function: Callable[["Context", Callable[..., str]], Any]
+    stream_function: Callable[["Context", Callable[..., str]], Iterator[str]]
     variables: VariableStore
 
     def __init__(self, value: str):
         self.value = value
-        self.file_path = get_position(value)[0]
+        self.file_path, start_pos, _ = get_position(value)
 
-        self.compile()
+        if start_pos:
+            self.line_offset = start_pos.line - 1
+            self.column_offset = start_pos.column
+        else:
+            self.line_offset = 0
+            self.column_offset = 1
+
+        # Values without any tag are rendered as-is, retaining their position (if any)
+        self.is_literal = not has_delimiters(value)
+        if self.is_literal:
+            self.variables = VariableStore()
+        else:
+            self.compile()
 
     def render(self, context: "Context") -> str:
-        filename = self.file_path or "<template>"
-        local_context: dict[str, Any] = {
-            "lines": [],
-            INCLUDE_VAR_NAME: self.include,
-            CONTEXT_VAR_NAME: context,
-        }
+        if self.is_literal:
+            return self.value
 
+        context.prefetch(self.names)
         try:
-            exec(
-                compile(self.module, filename, "exec"),
-                self.variables.globals,
-                local_context,
-            )
+            return self.function(context, self.include)
         except Exception as e:
-            handled_e = self.handle_exception(filename, e)
+            handled_e = self.handle_exception(self.file_path or "<template>", e)
             if handled_e is None:
                 raise
 
             raise handled_e from e
 
-        if OUTPUT_VAR_NAME in local_context:
-            return local_context[OUTPUT_VAR_NAME]
+    def stream(self, context: "Context") -> Iterator[str]:
+        """
+        Render the template as string chunks, yielding each chunk as soon as it is produced, so that the complete
+        output never needs to be held in memory.
+        """
+        if self.is_literal:
+            yield self.value
+            return
 
-        return "".join(local_context["lines"])
+        context.prefetch(self.names)
+        try:
+            yield from self.stream_function(context, self.include)
+        except Exception as e:
+            handled_e = self.handle_exception(self.file_path or "<template>", e)
+            if handled_e is None:
+                raise
+
+            raise handled_e from e
 
-    def handle_exception(self, filename: str, e: Exception) -> Optional[CommandError]:
+    def to_file_position(self, position: Position) -> Position:
+        """
+        Translate a position reported by the compiled template to its position in the template's file.
+
+        :param position: Position relative to the compiled template
+        :return: Position in the file the template was loaded from
+        """
+        return Position(position.line + self.line_offset, position.column)
+
+    def handle_exception(
+        self, filename: str, e: Exception, line_offset: Optional[int] = None
+    ) -> Optional[CommandError]:
         """
         Handle an exception raised during template rendering. If the exception is a known template error, it is
         handled and returned. Otherwise, a generic TemplateError is returned.
 
         :param filename: The filename of the template
         :param e: The exception raised
+        :param line_offset: Offset of the line numbers of the code that raised the exception from the lines of the file.
+                            Defaults to the offset of this template's own compiled code.
         :return: The handled exception or None if the exception is not a template error
         """
+        if line_offset is None:
+            line_offset = self.line_offset
 
-        for frame, _ in traceback.walk_tb(sys.exc_info()[-1]):
+        frames = traceback.walk_tb(sys.exc_info()[-1])
+        for frame, _ in frames:
             if frame.f_code.co_filename == filename:
                 break
         else:
             return None
 
+        if isinstance(e, CommandError):
+            nested_codes = (Template.render.__code__, Template.stream.__code__)
+            if any(nested_frame.f_code in nested_codes for nested_frame, _ in frames):
+                return e  # Raised by an included template, which has already reported it with its own position
+
         if isinstance(e, VariableError):
             e.errors[0].file_path = self.file_path
 
             ref = self.variables.get_ref(e.var_name)
             if ref is not None:
-                e.errors[0].start_pos = ref.start_pos
-                e.errors[0].end_pos = ref.end_pos
+                e.errors[0].start_pos = self.to_file_position(ref.start_pos)
+                e.errors[0].end_pos = self.to_file_position(ref.end_pos)
 
                 return e
 
@@ -83,15 +214,15 @@ class Template:
 
                 ref = self.variables.get_ref(name)
                 if ref is not None:
-                    e.errors[i].start_pos = ref.start_pos
-                    e.errors[i].end_pos = ref.end_pos
+                    e.errors[i].start_pos = self.to_file_position(ref.start_pos)
+                    e.errors[i].end_pos = self.to_file_position(ref.end_pos)
 
             return e
 
         if isinstance(e, ConfigurationError):
             for error in e.errors:
                 error.file_path = self.file_path
-                error.start_pos = Position(line=frame.f_lineno, column=None)
+                error.start_pos = Position(line=frame.f_lineno + line_offset, column=None)
 
             return e
 
@@ -107,17 +238,83 @@ class Template:
         return TemplateError(
             f"({e.__class__.__name__}) {e}",
             file_name=get_position(self.value)[0],
-            start_pos=Position(line=frame.f_lineno, column=None),
+            start_pos=Position(line=frame.f_lineno + line_offset, column=None),
         )
 
     def compile(self):
+        value = str(self.value)
+        if len(value) > MAX_CACHED_TEMPLATE_SIZE:
+            compiled = self._compile()
+        else:
+            # Keyed by digest, so that the cache doesn't hold the text of each template on top of its code
+            digest = hashlib.sha256(value.encode("utf-8", errors="surrogatepass")).digest()
+            compiled = TEMPLATE_CACHE.get_or_create((digest, self.file_path, self.column_offset), self._compile)
+
+        self.variables = compiled.variables
+        self.names = compiled.names
+        self.function = compiled.function
+        self.stream_function = compiled.stream_function
+
+    def _compile(self) -> CompiledTemplate:
+        cache_key = None
+        if TEMPLATE_DISK_CACHE.enabled:
+            cache_key = self.disk_cache_key()
+            data = TEMPLATE_DISK_CACHE.get(cache_key)
+            if data is not None:
+                compiled = CompiledTemplate.loads(data)
+                if compiled is not None:
+                    return compiled
+
+        # Compile as if the template starts on the first line, so that the result can be shared by identical
+        # templates on other lines of the same file. Only the column is kept since it affects `include` indentation.
+        source = OpxString(self.value)
+        set_position(source, self.file_path, Position(1, self.column_offset), None)
+
+        try:
+            module, variables = self.compile_source(source)
+        except TemplateError:
+            if not self.line_offset:
+                raise
+
+            # Compile again using the actual position, so that error is reported with positions in the file
+            self.compile_source(self.value)
+            raise
+
+        compiled = CompiledTemplate.from_code(compile(module, self.file_path or "<template>", "exec"), variables)
+        if cache_key is not None:
+            TEMPLATE_DISK_CACHE.set(cache_key, compiled.dumps())
+
+        return compiled
+
+    def disk_cache_key(self) -> str:
+        """
+        Key of the compiled template in `TEMPLATE_DISK_CACHE`. Besides the template itself, it depends on the
+        strong-opx version and `CODE_FORMAT_VERSION`, which determine the generated code, and the bytecode version of
+        the Python interpreter.
+        """
+        digest = hashlib.sha256()
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(f"{__version__}\0{CODE_FORMAT_VERSION}\0{self.file_path}\0{self.column_offset}\0".encode("utf-8"))
+        digest.update(str(self.value).encode("utf-8", errors="surrogatepass"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def compile_source(value: str) -> tuple[ast.Module, VariableStore]:
+        compiler = Template.compile_tokens(value)
+        return compiler.finalize_function(), compiler.variables
+
+    @staticmethod
+    def compile_tokens(value: str) -> TemplateCompiler:
+        """
+        Compile the tokens of the template and return the compiler, which is yet to be finalized.
+        """
         try:
-            tokens = TemplateLexer(self.value).tokenize()
+            tokens = TemplateLexer(value).tokenize()
         except LexerError as e:
-            raise TemplateCompiler(self.value).syntax_error(e.message, e.start_pos, e.end_pos)
+            raise TemplateCompiler(value).syntax_error(e.message, e.start_pos, e.end_pos)
 
         # If there are multiple tokens, render as string otherwise keep the original datatype
-        compiler = TemplateCompiler(self.value, as_string=len(tokens) > 1)
+        compiler = TemplateCompiler(value, as_string=len(tokens) > 1)
         ops_stack = []
 
         for token in tokens:
@@ -195,27 +392,55 @@ class Template:
             value, start_pos, end_pos = ops_stack.pop()
             raise compiler.syntax_error(f"Unclosed tag: {value}", start_pos, end_pos)
 
-        self.module = compiler.finalize()
-        self.variables = compiler.variables
+        return compiler
 
     def include(self, template_name: str, *, context: "Context", indent=0) -> str:
         template_dir = "."
         if self.file_path:
             template_dir = os.path.dirname(self.file_path)
 
-        template_path = os.path.join(template_dir, template_name)
+        template_path = os.path.abspath(os.path.join(template_dir, template_name))
         if not os.path.isfile(template_path):
             raise FileNotFoundError(f"Included template '{template_name}' not found in '{template_dir}'")
 
-        with open(template_path, "r") as f:
-            content = f.read()
+        include_stack = INCLUDE_STACK.get()
+        if not include_stack and self.file_path:
+            include_stack = (os.path.abspath(self.file_path),)
+
+        # An included template is rendered with the same context as its parent, so including a template which is
+        # already being rendered can never terminate
+        if template_path in include_stack:
+            cycle = include_stack[include_stack.index(template_path) :] + (template_path,)
+            raise TemplateError(f"Circular include: {' -> '.join(cycle)}", file_name=self.file_path)
+
+        template = self.load_included(template_path)
+        token = INCLUDE_STACK.set(include_stack + (template_path,))
+        try:
+            rendered_content = template.render(context)
+        finally:
+            INCLUDE_STACK.reset(token)
 
-        rendered_content = Template(content).render(context)
         if indent > 0:
             rendered_content = rendered_content.replace("\n", "\n" + (" " * indent))
 
         return rendered_content
 
+    @staticmethod
+    def load_included(template_path: str) -> "Template":
+        """
+        Load the template at `template_path`. Template is reused from `INCLUDE_CACHE` until the file is modified.
+        """
+        stat = os.stat(template_path)
+
+        def load() -> Template:
+            with open(template_path, "r") as f:
+                content = OpxString(f.read())
+
+            set_position(content, template_path, Position(1, 1), None)
+            return Template(content)
+
+        return INCLUDE_CACHE.get_or_create((template_path, stat.st_mtime_ns, stat.st_size), load)
+
     @classmethod
     def register_filter(cls, name: str, func: Callable = None):
         if name in TEMPLATE_FILTERS:
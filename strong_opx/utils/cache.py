@@ -0,0 +1,178 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+logger = logging.getLogger(__name__)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache(Generic[T]):
+    """
+    A size-bounded, in-process cache which evicts the least recently used entry once `maxsize` is exceeded.
+    Unlike `functools.lru_cache`, the cache is shared by every caller holding the instance and the value is built
+    lazily by a factory passed at lookup time.
+
+    Cache is safe to use from multiple threads. The factory is called without holding the lock, so concurrent misses
+    for the same key may each call it, in which case the value cached first is returned to all of them.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._data: OrderedDict[Hashable, T] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], T]) -> T:
+        """
+        Return the value cached against `key`. If there is no such value, `factory` is called to create it and the
+        result is cached. Exceptions raised by `factory` are propagated and nothing is cached.
+
+        :param key: Key to look up
+        :param factory: Callable to create the value on a cache miss
+        :return: Cached or newly created value
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return value
+
+        value = factory()
+
+        with self._lock:
+            try:
+                # Created by another thread in the meantime
+                value = self._data[key]
+            except KeyError:
+                self._data[key] = value
+                if len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+
+        return value
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(hits=self.hits, misses=self.misses, maxsize=self.maxsize, currsize=len(self._data))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class DiskCache:
+    """
+    A cache of binary blobs persisted in `cache_dir`, similar to `__pycache__`. Cache is shared by concurrent
+    processes, so entries are written to a temporary file and atomically moved in place. Once the cache holds more
+    than `max_entries`, least recently used entries are removed.
+
+    Cache is disabled until `enable()` is called. Failure to read or write an entry is never an error, a failed read
+    is treated as a cache miss.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 10000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.enabled = False
+
+        self._evicted = False
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+
+            # Reading doesn't reliably update atime, thus mtime is used to track the last access for eviction
+            os.utime(path)
+        except OSError:
+            return None
+
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        if not self.enabled:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+
+                os.replace(tmp_path, self.entry_path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.debug(f"Unable to write cache entry {key}: {e}")
+            return
+
+        if not self._evicted:
+            # Checking size of cache requires listing the directory, so that is done once per process
+            self._evicted = True
+            self.evict()
+
+    def evict(self) -> None:
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if not entry.name.startswith(".")]
+        except OSError:
+            return
+
+        if len(entries) <= self.max_entries:
+            return
+
+        def last_access(entry: os.DirEntry) -> float:
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        entries.sort(key=last_access)
+        for entry in entries[: len(entries) - self.max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass  # Already removed by another process
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
@@ -0,0 +1,33 @@
+import contextlib
+import os
+import secrets
+import shutil
+from typing import IO, Generator
+
+
+@contextlib.contextmanager
+def atomic_write(target_path: str) -> Generator[IO[str], None, None]:
+    """
+    Open a temporary file next to `target_path` for writing, which replaces the target once the block exits. If the
+    block raises, the temporary file is removed and the target is left as is, so that an error or interrupt while
+    writing leaves no partially written file behind.
+    """
+    target_dir, target_name = os.path.split(os.path.abspath(target_path))
+
+    # Unlike `tempfile.mkstemp`, file is created with the default permissions, as the target would be
+    tmp_path = os.path.join(target_dir, f".{target_name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with open(tmp_path, "x") as f:
+            yield f
+
+        if os.path.exists(target_path):
+            shutil.copymode(target_path, tmp_path)
+
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+
+        raise
@@ -1,3 +1,4 @@
+import threading
 from collections import UserDict
 from typing import Any, Callable, Generator, MutableMapping
 
@@ -9,9 +10,26 @@ NOT_SPECIFIED = object()
 class LazyValue:
     def __init__(self, resolver: Callable[[], Any]):
         self.resolver = resolver
+        self.resolved = False
+
+        self._value = None
+        self._lock = threading.RLock()
 
     def resolve(self) -> Any:
-        return self.resolver()
+        """
+        Resolve the value. `resolver` is only called once, even if the value is resolved by multiple threads at the
+        same time; other threads wait for the value being resolved. If `resolver` raises an exception, it is called
+        again the next time the value is resolved.
+
+        :return: The resolved value
+        """
+        if not self.resolved:
+            with self._lock:
+                if not self.resolved:
+                    self._value = self.resolver()
+                    self.resolved = True
+
+        return self._value
 
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self.resolver}>"
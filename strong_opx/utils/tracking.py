@@ -1,3 +1,4 @@
+import bisect
 from dataclasses import dataclass
 from typing import Any, Optional
 
@@ -67,6 +68,44 @@ class Position:
         return cls(line + initial_line, col_offset)
 
 
+class LineIndex:
+    """
+    Maps offsets in a value to `Position`s. Offsets at which each line starts are computed once, so that every lookup
+    is a binary search instead of scanning the value from the start as `Position.from_offset()` does.
+
+    :param value: source value
+    :param initial_line: Line of the value in the larger value. See `Position.from_offset()`
+    :param initial_col: Column of the value in the larger value. See `Position.from_offset()`
+    """
+
+    __slots__ = ("line_starts", "initial_line", "initial_col")
+
+    def __init__(self, value: str, initial_line: int = 1, initial_col: int = 1):
+        self.initial_line = initial_line
+        self.initial_col = initial_col
+
+        self.line_starts = [0]
+        i = value.find("\n")
+        while i != -1:
+            self.line_starts.append(i + 1)
+            i = value.find("\n", i + 1)
+
+    def position(self, offset: int) -> Position:
+        """
+        Same as `Position.from_offset()` for the indexed value.
+
+        :param offset: 0-based index in value
+        :return: Position(1-based index of line, 1-based index in that line)
+        """
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        col_offset = offset - self.line_starts[line] + 1
+
+        if not line:
+            col_offset += self.initial_col - 1
+
+        return Position(line + self.initial_line, col_offset)
+
+
 class OpxObjectBase:
     _file_path: str = None
     _start_pos: Position = None
@@ -103,6 +142,23 @@ def set_position(value: Any, file_path: str, start_pos: Optional[Position], end_
     value._end_pos = end_pos
 
 
+def copy_tree(value: Any) -> Any:
+    """
+    Copy mappings and sequences of `value`, keeping their positions. Other values are immutable, thus are shared.
+    """
+    if isinstance(value, dict):
+        copy = type(value)((k, copy_tree(v)) for k, v in value.items())
+    elif isinstance(value, list):
+        copy = type(value)(copy_tree(v) for v in value)
+    else:
+        return value
+
+    if isinstance(copy, OpxObjectBase):
+        set_position(copy, *get_position(value))
+
+    return copy
+
+
 def set_position_from_yaml_mark(value: Any, start_mark: yaml.Mark, end_mark: yaml.Mark) -> None:
     value._file_path = start_mark.name
     value._start_pos = Position.from_yaml_mark(start_mark)
@@ -0,0 +1,241 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from strong_opx.exceptions import VaultError
+
+DEFAULT_CIPHER_NAME = "AES256GCM"
+
+# Minimum number of values encrypted or decrypted at once to use a pool of processes. Key derivation of each value
+# takes a few milliseconds, so fewer values are processed faster than the processes are started.
+PARALLEL_THRESHOLD = 16
+
+# Values decrypted by this process, keyed by `VaultCipher.cache_key()`. Each value is decrypted once, a thread
+# needing a value being decrypted by another thread waits for its future.
+DECRYPTED: dict[str, Future] = {}
+DECRYPTED_LOCK = threading.Lock()
+
+
+def run_parallel(func: Callable[..., Any], args: Sequence[tuple]) -> list[Any]:
+    """
+    Call `func` with each of `args`, using a pool of processes if there are enough calls to make and CPUs to use.
+
+    :return: Return values of `func`, in the order of `args`
+    """
+    workers = min(os.cpu_count() or 1, len(args))
+    if len(args) < PARALLEL_THRESHOLD or workers < 2:
+        return [func(*a) for a in args]
+
+    # Forking a process which has other threads running (e.g. resolving values of a context) may deadlock the forked
+    # process, thus workers are started by a fresh server process instead, where available
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method)) as executor:
+        return list(executor.map(func, *zip(*args), chunksize=math.ceil(len(args) / workers)))
+
+
+def get_cipher(cipher_name: str) -> type:
+    # Imported here, so that loading files having encrypted values doesn't import `cryptography`
+    from strong_opx.vault.ciphers import CIPHERS
+
+    try:
+        return CIPHERS[cipher_name]
+    except KeyError:
+        raise VaultError(f"Unsupported cipher: {cipher_name}")
+
+
+def decrypt_ciphertext(cipher_name: str, ciphertext: str, secret: str) -> Optional[str]:
+    """
+    Decrypt `ciphertext`. Returns None if it can't be decrypted using `secret`.
+    """
+    b_ciphertext = ciphertext.encode("utf8", errors="surrogate_or_strict")
+    b_secret = secret.encode("utf8", errors="surrogate_or_strict")
+
+    try:
+        return get_cipher(cipher_name).decrypt(b_ciphertext, b_secret).decode("utf8")
+    except VaultError:
+        return None
+
+
+def encrypt_plaintext(cipher_name: str, value: str, secret: str) -> str:
+    b_value = value.encode("utf8", errors="surrogate_or_strict")
+    b_secret = secret.encode("utf8", errors="surrogate_or_strict")
+
+    return get_cipher(cipher_name).encrypt(b_value, b_secret).decode("utf8")
+
+
+def selected_vault_secret() -> str:
+    from strong_opx.project import Project
+
+    return Project.current().selected_environment.vault_secret
+
+
+class VaultCipher:
+    def __init__(self, ciphertext: str, cipher_name: str = DEFAULT_CIPHER_NAME, version: Optional[str] = None):
+        self.version = version or get_cipher(cipher_name).version
+        self.ciphertext = ciphertext
+        self.cipher_name = cipher_name
+
+    def __str__(self):
+        header_parts = ["$STRONG_OPX_VAULT", self.version, self.cipher_name]
+        header = ";".join(header_parts)
+
+        vault_text = [header]
+        vault_text += [self.ciphertext[i : i + 80] for i in range(0, len(self.ciphertext), 80)]
+
+        return "\n".join(vault_text)
+
+    def __call__(self) -> str:
+        return self.decrypt(selected_vault_secret())
+
+    def cache_key(self, secret: str) -> str:
+        digest = hashlib.sha256()
+        for part in (secret, self.cipher_name, self.ciphertext):
+            digest.update(part.encode("utf8", errors="surrogatepass"))
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def is_latest(self, secret: str) -> bool:
+        """
+        Whether the value is encrypted the way it would be encrypted now, i.e. using the default cipher and the master
+        key salt shared by values encrypted using `secret` (see `reuse_master_key_salt()`).
+        """
+        if self.cipher_name != DEFAULT_CIPHER_NAME:
+            return False
+
+        b_ciphertext = self.ciphertext.encode("utf8", errors="surrogate_or_strict")
+        b_secret = secret.encode("utf8", errors="surrogate_or_strict")
+        return get_cipher(self.cipher_name).shares_master_key_salt(b_ciphertext, b_secret)
+
+    @staticmethod
+    def reuse_master_key_salt(ciphers: Iterable["VaultCipher"], secret: str) -> None:
+        """
+        Encrypt values using the master key salt of the first of `ciphers` that is encrypted using the default cipher
+        and `secret`, so that values added to an environment are decrypted along with its existing values using a single
+        key derivation. Does nothing if values encrypted using `secret` already share a salt.
+
+        :param ciphers: Existing values of the environment
+        :param secret: Secret of the environment
+        """
+        cipher = get_cipher(DEFAULT_CIPHER_NAME)
+        b_secret = secret.encode("utf8", errors="surrogate_or_strict")
+        if b_secret in cipher.master_key_salts:
+            return
+
+        for c in ciphers:
+            if c.cipher_name != DEFAULT_CIPHER_NAME:
+                continue
+
+            try:
+                cipher.use_master_key_salt_of(c.ciphertext.encode("utf8", errors="surrogate_or_strict"), b_secret)
+                return
+            except VaultError:
+                continue  # e.g. copied from another environment
+
+    def decrypt(self, secret: str) -> str:
+        return self.decrypt_many([self], secret)[0]
+
+    @classmethod
+    def decrypt_many(cls, ciphers: Sequence["VaultCipher"], secret: Optional[str] = None) -> list[str]:
+        """
+        Decrypt values using a pool of processes, so that key derivation of each value runs in parallel. Values
+        decrypted earlier by this process are not decrypted again.
+
+        :param ciphers: Values to decrypt
+        :param secret: Secret to decrypt values with. Defaults to the secret of the selected environment.
+        :return: Decrypted values, in the order of `ciphers`
+        """
+        if secret is None:
+            secret = selected_vault_secret()
+
+        futures = []
+        pending: dict[str, tuple[VaultCipher, Future]] = {}
+
+        with DECRYPTED_LOCK:
+            for cipher in ciphers:
+                key = cipher.cache_key(secret)
+                future = DECRYPTED.get(key)
+                if future is None:
+                    future = DECRYPTED[key] = Future()
+                    pending[key] = (cipher, future)
+
+                futures.append(future)
+
+        if pending:
+            args = [(c.cipher_name, c.ciphertext, secret) for c, _ in pending.values()]
+            plaintexts: list[Optional[str]] = [None] * len(args)
+
+            try:
+                # Values of ciphers sharing the key derivation are decrypted faster than a pool of processes is started
+                slow = [i for i, (cipher_name, _, _) in enumerate(args) if get_cipher(cipher_name).parallel]
+                fast = [i for i, (cipher_name, _, _) in enumerate(args) if not get_cipher(cipher_name).parallel]
+
+                for i, plaintext in zip(slow, run_parallel(decrypt_ciphertext, [args[i] for i in slow])):
+                    plaintexts[i] = plaintext
+
+                for i in fast:
+                    plaintexts[i] = decrypt_ciphertext(*args[i])
+            except BaseException as e:
+                cls._discard(pending, e)
+                raise
+
+            failed = {}
+            for (key, (_, future)), plaintext in zip(pending.items(), plaintexts):
+                if plaintext is None:
+                    failed[key] = pending[key]
+                else:
+                    future.set_result(plaintext)
+
+            if failed:
+                cls._discard(failed, VaultError("Decryption failed. Did you copied from other environment?"))
+
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _discard(pending: dict[str, tuple["VaultCipher", Future]], e: BaseException) -> None:
+        # Failures are not cached, so that decrypting a value again is attempted again
+        with DECRYPTED_LOCK:
+            for key in pending:
+                del DECRYPTED[key]
+
+        for _, future in pending.values():
+            future.set_exception(e)
+
+    @classmethod
+    def encrypt(cls, value: str, secret: str, cipher_name: str = DEFAULT_CIPHER_NAME) -> "VaultCipher":
+        return cls.encrypt_many([value], secret, cipher_name)[0]
+
+    @classmethod
+    def encrypt_many(
+        cls, values: Sequence[str], secret: str, cipher_name: str = DEFAULT_CIPHER_NAME
+    ) -> list["VaultCipher"]:
+        """
+        Encrypt values using a pool of processes, so that key derivation of each value runs in parallel.
+
+        :param values: Values to encrypt
+        :param secret: Secret to encrypt values with
+        :param cipher_name: Name of the cipher to use
+        :return: Encrypted values, in the order of `values`
+        """
+        args = [(cipher_name, value, secret) for value in values]
+        if get_cipher(cipher_name).parallel:
+            ciphertexts = run_parallel(encrypt_plaintext, args)
+        else:
+            ciphertexts = [encrypt_plaintext(*a) for a in args]
+
+        return [VaultCipher(ciphertext=ciphertext, cipher_name=cipher_name) for ciphertext in ciphertexts]
+
+    @classmethod
+    def parse(cls, envelope: str) -> "VaultCipher":
+        lines = envelope.splitlines()
+        header = lines[0].strip().split(";")
+
+        version = header[1].strip()
+        cipher_name = header[2].strip()
+
+        ciphertext = "".join(lines[1:])
+        return cls(ciphertext=ciphertext, cipher_name=cipher_name, version=version)
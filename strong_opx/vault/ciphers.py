@@ -0,0 +1,184 @@
+"""
+Ciphers of vault values. These depend on `cryptography`, which is slow to import, thus this module is imported only
+once a value is encrypted or decrypted.
+"""
+
+import binascii
+import functools
+import hashlib
+import hmac
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from strong_opx.exceptions import VaultError
+
+
+class VaultAES256:
+    """
+    Cipher of version 1.0 values, compatible with `AES256` cipher of Ansible Vault.
+
+    Secret and a random salt of each value are stretched into an encryption key, an HMAC key and a counter nonce using
+    PBKDF2. Value is padded and encrypted using AES-CTR and is authenticated using HMAC-SHA256.
+
+    Ciphertext is hex encoded `<hex encoded salt>\\n<hex encoded HMAC>\\n<hex encoded encrypted value>`.
+    """
+
+    version = "1.0"
+
+    # Key derivation is done for each value, so values are worth decrypting in parallel
+    parallel = True
+
+    kdf_iterations = 10_000
+    key_length = 32
+    iv_length = 16
+    salt_length = 32
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def derive_keys(secret: bytes, salt: bytes) -> tuple[bytes, bytes, bytes]:
+        cls = VaultAES256
+        derived_key = hashlib.pbkdf2_hmac(
+            "sha256", secret, salt, cls.kdf_iterations, dklen=2 * cls.key_length + cls.iv_length
+        )
+
+        return (
+            derived_key[: cls.key_length],
+            derived_key[cls.key_length : 2 * cls.key_length],
+            derived_key[2 * cls.key_length :],
+        )
+
+    @classmethod
+    def encrypt(cls, plaintext: bytes, secret: bytes) -> bytes:
+        salt = os.urandom(cls.salt_length)
+        key, hmac_key, iv = cls.derive_keys(secret, salt)
+
+        padder = padding.PKCS7(algorithms.AES.block_size).padder()
+        encryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).encryptor()
+        encrypted = encryptor.update(padder.update(plaintext) + padder.finalize()) + encryptor.finalize()
+
+        digest = hmac.new(hmac_key, encrypted, hashlib.sha256).hexdigest().encode("ascii")
+        return binascii.hexlify(b"\n".join([binascii.hexlify(salt), digest, binascii.hexlify(encrypted)]))
+
+    @classmethod
+    def decrypt(cls, ciphertext: bytes, secret: bytes) -> bytes:
+        try:
+            salt, digest, encrypted = binascii.unhexlify(ciphertext).split(b"\n", 2)
+            salt = binascii.unhexlify(salt)
+            digest = binascii.unhexlify(digest)
+            encrypted = binascii.unhexlify(encrypted)
+        except (binascii.Error, ValueError):
+            raise VaultError("Malformed ciphertext")
+
+        key, hmac_key, iv = cls.derive_keys(secret, salt)
+        if not hmac.compare_digest(hmac.new(hmac_key, encrypted, hashlib.sha256).digest(), digest):
+            raise VaultError("HMAC verification failed")
+
+        unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+        decryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).decryptor()
+        try:
+            return unpadder.update(decryptor.update(encrypted) + decryptor.finalize()) + unpadder.finalize()
+        except ValueError:
+            raise VaultError("Invalid padding")
+
+
+class VaultAES256GCM:
+    """
+    Cipher of version 2.0 values.
+
+    Secret is stretched into a master key using PBKDF2, which is done once per salt. The salt is random, and is shared
+    by the values of an environment: values encrypted by a process share the salt, which is the salt of an existing
+    value of the environment where one is known (see `use_master_key_salt_of()`), so the values of an environment are
+    decrypted using a single key derivation. Each value is then encrypted by AES-GCM, using a key derived from the master
+    key and a salt of its own with HKDF.
+
+    Ciphertext is hex encoded `<master key salt><value salt><nonce><encrypted value and tag>`.
+    """
+
+    version = "2.0"
+
+    # Key derivation is shared by values, so values are decrypted faster than a pool of processes is started
+    parallel = False
+
+    kdf_iterations = 100_000
+    salt_length = 16
+    nonce_length = 12
+    info = b"strong-opx-vault-2.0"
+
+    # Master key salt of values encrypted by this process, keyed by secret
+    master_key_salts: dict[bytes, bytes] = {}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def master_key(secret: bytes, salt: bytes) -> bytes:
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, VaultAES256GCM.kdf_iterations)
+
+    @classmethod
+    def master_key_salt(cls, secret: bytes) -> bytes:
+        salt = cls.master_key_salts.get(secret)
+        if salt is None:
+            salt = cls.master_key_salts.setdefault(secret, os.urandom(cls.salt_length))
+
+        return salt
+
+    @classmethod
+    def use_master_key_salt_of(cls, ciphertext: bytes, secret: bytes) -> None:
+        """
+        Encrypt values using the master key salt of `ciphertext`, so that values added to an environment share the key
+        derivation of its existing values. Raises `VaultError` if `ciphertext` can't be decrypted using `secret`.
+        """
+        cls.decrypt(ciphertext, secret)
+        cls.master_key_salts[secret] = binascii.unhexlify(ciphertext)[: cls.salt_length]
+
+    @classmethod
+    def shares_master_key_salt(cls, ciphertext: bytes, secret: bytes) -> bool:
+        """
+        Whether `ciphertext` is encrypted using the master key salt which values encrypted using `secret` share.
+        """
+        try:
+            return binascii.unhexlify(ciphertext)[: cls.salt_length] == cls.master_key_salt(secret)
+        except binascii.Error:
+            return False
+
+    @classmethod
+    def value_cipher(cls, secret: bytes, master_key_salt: bytes, value_salt: bytes) -> AESGCM:
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=value_salt, info=cls.info).derive(
+            cls.master_key(secret, master_key_salt)
+        )
+        return AESGCM(key)
+
+    @classmethod
+    def encrypt(cls, plaintext: bytes, secret: bytes) -> bytes:
+        master_key_salt = cls.master_key_salt(secret)
+        value_salt = os.urandom(cls.salt_length)
+        nonce = os.urandom(cls.nonce_length)
+
+        encrypted = cls.value_cipher(secret, master_key_salt, value_salt).encrypt(nonce, plaintext, cls.info)
+        return binascii.hexlify(master_key_salt + value_salt + nonce + encrypted)
+
+    @classmethod
+    def decrypt(cls, ciphertext: bytes, secret: bytes) -> bytes:
+        try:
+            data = binascii.unhexlify(ciphertext)
+        except binascii.Error:
+            raise VaultError("Malformed ciphertext")
+
+        master_key_salt = data[: cls.salt_length]
+        value_salt = data[cls.salt_length : 2 * cls.salt_length]
+        nonce = data[2 * cls.salt_length : 2 * cls.salt_length + cls.nonce_length]
+        encrypted = data[2 * cls.salt_length + cls.nonce_length :]
+
+        try:
+            return cls.value_cipher(secret, master_key_salt, value_salt).decrypt(nonce, encrypted, cls.info)
+        except (InvalidTag, ValueError):
+            raise VaultError("Authentication failed")
+
+
+CIPHERS = {
+    "AES256": VaultAES256,
+    "AES256GCM": VaultAES256GCM,
+}
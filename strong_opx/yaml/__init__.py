@@ -1,2 +1,2 @@
 from strong_opx.yaml.dumper import dump, dump_all
-from strong_opx.yaml.loader import load, load_all
+from strong_opx.yaml.loader import load, load_all, load_all_fields
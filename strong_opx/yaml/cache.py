@@ -0,0 +1,267 @@
+"""
+Cache of parsed YAML files, so that files which rarely change (e.g. project config, environment config and vars files)
+are deserialized instead of parsed on every run.
+
+Parsed values are serialized with `marshal` as nested tuples, keeping the position of each value. An entry is keyed by
+path, mtime, size and content hash of the file, and records the same for every file it includes (directly or through
+other included files), so that an edit to an included file invalidates every file including it.
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Generator, NamedTuple, Optional
+
+from strong_opx import __version__
+from strong_opx.config import CACHE_DIR
+from strong_opx.utils.cache import DiskCache
+from strong_opx.utils.tracking import (
+    OpxFloat,
+    OpxInteger,
+    OpxMapping,
+    OpxSequence,
+    OpxString,
+    Position,
+    get_position,
+    set_position,
+)
+from strong_opx.vault import VaultCipher
+
+logger = logging.getLogger(__name__)
+
+# Identifies the shape of serialized values in `YAML_DISK_CACHE` keys. Bump when serialization changes.
+SERIALIZATION_VERSION = 1
+
+YAML_DISK_CACHE = DiskCache(os.path.join(CACHE_DIR, "yaml"))
+
+# Files loaded while loading a file, i.e. files it includes. None when no file is being loaded using the cache.
+DEPENDENCIES: ContextVar[Optional[list[str]]] = ContextVar("DEPENDENCIES", default=None)
+
+STRING = 0
+INTEGER = 1
+FLOAT = 2
+MAPPING = 3
+SEQUENCE = 4
+VAULT = 5
+PLAIN = 6
+
+
+class FileSignature(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "FileSignature":
+        stat = os.stat(file_path)
+        with open(file_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        return cls(mtime_ns=stat.st_mtime_ns, size=stat.st_size, digest=digest)
+
+
+class Serializer:
+    """
+    Converts a parsed value into nested tuples of builtin types, which `marshal` can serialize. Each value is
+    `(kind, value, position)`, where position is None or `(file, start line, start column, end line, end column)` and
+    file is an index into `file_paths`.
+    """
+
+    def __init__(self):
+        self.file_paths: list[str] = []
+        self._file_indexes: dict[str, int] = {}
+
+    def position(self, value: Any) -> Optional[tuple]:
+        file_path, start_pos, end_pos = get_position(value)
+        if start_pos is None or end_pos is None:
+            return None
+
+        file_index = self._file_indexes.get(file_path)
+        if file_index is None:
+            file_index = self._file_indexes[file_path] = len(self.file_paths)
+            self.file_paths.append(file_path)
+
+        return file_index, start_pos.line, start_pos.column, end_pos.line, end_pos.column
+
+    def serialize(self, value: Any) -> tuple:
+        if isinstance(value, OpxString):
+            return STRING, str(value), self.position(value)
+
+        if isinstance(value, OpxInteger):
+            return INTEGER, int(value), self.position(value)
+
+        if isinstance(value, OpxFloat):
+            return FLOAT, float(value), self.position(value)
+
+        if isinstance(value, OpxMapping):
+            items = []
+            for k, v in value.items():
+                items.append(self.serialize(k))
+                items.append(self.serialize(v))
+
+            return MAPPING, tuple(items), self.position(value)
+
+        if isinstance(value, OpxSequence):
+            return SEQUENCE, tuple(self.serialize(v) for v in value), self.position(value)
+
+        if isinstance(value, VaultCipher):
+            return VAULT, (value.ciphertext, value.cipher_name, value.version), self.position(value)
+
+        if value is None or isinstance(value, bool):
+            return PLAIN, value, None
+
+        raise TypeError(f"Unable to serialize {type(value).__name__}")
+
+
+class Deserializer:
+    def __init__(self, file_paths: list[str]):
+        self.file_paths = file_paths
+
+        # Positions are immutable, so a position is shared by values starting or ending there
+        self._positions: dict[tuple[int, int], Position] = {}
+
+    def position(self, line: int, column: int) -> Position:
+        key = line, column
+        position = self._positions.get(key)
+        if position is None:
+            position = self._positions[key] = Position(line, column)
+
+        return position
+
+    def set_position(self, value: Any, position: Optional[tuple]) -> Any:
+        if position is not None:
+            file_index, start_line, start_column, end_line, end_column = position
+            set_position(
+                value,
+                self.file_paths[file_index],
+                self.position(start_line, start_column),
+                self.position(end_line, end_column),
+            )
+
+        return value
+
+    def deserialize(self, data: tuple) -> Any:
+        kind, value, position = data
+
+        if kind == STRING:
+            return self.set_position(OpxString(value), position)
+
+        if kind == INTEGER:
+            return self.set_position(OpxInteger(value), position)
+
+        if kind == FLOAT:
+            return self.set_position(OpxFloat(value), position)
+
+        if kind == MAPPING:
+            deserialize = self.deserialize
+            mapping = OpxMapping()
+            for i in range(0, len(value), 2):
+                mapping[deserialize(value[i])] = deserialize(value[i + 1])
+
+            return self.set_position(mapping, position)
+
+        if kind == SEQUENCE:
+            return self.set_position(OpxSequence(self.deserialize(v) for v in value), position)
+
+        if kind == VAULT:
+            ciphertext, cipher_name, version = value
+            return self.set_position(VaultCipher(ciphertext, cipher_name=cipher_name, version=version), position)
+
+        if kind == PLAIN:
+            return value
+
+        raise ValueError(f"Unknown kind: {kind}")
+
+
+def cache_key(file_path: str, signature: FileSignature) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{__version__}\0{SERIALIZATION_VERSION}\0{file_path}\0".encode("utf-8", errors="surrogatepass"))
+    digest.update(f"{signature.mtime_ns}\0{signature.size}\0{signature.digest}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def record_dependencies(file_paths: list[str]) -> None:
+    """
+    Record `file_paths` as files included by the file being loaded, if any.
+    """
+    dependencies = DEPENDENCIES.get()
+    if dependencies is not None:
+        dependencies.extend(file_paths)
+
+
+@contextmanager
+def collect_dependencies() -> Generator[list[str], None, None]:
+    """
+    Collect files loaded inside the block, which are then recorded as files included by the file being loaded.
+    """
+    dependencies = []
+    token = DEPENDENCIES.set(dependencies)
+    try:
+        yield dependencies
+    finally:
+        DEPENDENCIES.reset(token)
+
+    record_dependencies(dependencies)
+
+
+def _get(key: str) -> Optional[tuple[list[str], Any]]:
+    data = YAML_DISK_CACHE.get(key)
+    if data is None:
+        return None
+
+    try:
+        dependencies, file_paths, value = marshal.loads(data)
+        for dependency_path, signature in dependencies:
+            if FileSignature.from_file(dependency_path) != tuple(signature):
+                return None
+
+        return [path for path, _ in dependencies], Deserializer(file_paths).deserialize(value)
+    except (EOFError, ValueError, TypeError, OSError):
+        return None
+
+
+def _set(key: str, dependencies: list[str], value: Any) -> None:
+    try:
+        signatures = [(path, tuple(FileSignature.from_file(path))) for path in dict.fromkeys(dependencies)]
+
+        serializer = Serializer()
+        serialized_value = serializer.serialize(value)
+
+        data = marshal.dumps((signatures, serializer.file_paths, serialized_value))
+    except (TypeError, ValueError, OSError) as e:
+        logger.debug(f"Unable to cache {key}: {e}")
+        return
+
+    YAML_DISK_CACHE.set(key, data)
+
+
+def load_cached(file_path: str, load: Callable[[str], Any]) -> Any:
+    """
+    Return value of `file_path` from cache. If it is not cached, or the file or one of the files it includes has
+    changed since, `load` is called to parse the file and its value is cached.
+
+    :param file_path: Path of the file to load
+    :param load: Callable to parse the file
+    :return: Value of the file
+    """
+    record_dependencies([file_path])
+
+    try:
+        key = cache_key(file_path, FileSignature.from_file(file_path))
+    except OSError:
+        return load(file_path)  # Error, if any, is reported by `load`
+
+    cached = _get(key)
+    if cached is not None:
+        dependencies, value = cached
+        record_dependencies(dependencies)
+        return value
+
+    with collect_dependencies() as dependencies:
+        value = load(file_path)
+
+    _set(key, dependencies, value)
+    return value
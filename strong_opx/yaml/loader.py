@@ -1,19 +1,54 @@
 import os
 from contextlib import contextmanager
-from typing import Any, TextIO
+from contextvars import ContextVar
+from typing import Any, Collection, Generator, Optional, TextIO
 
 import yaml
 
 from strong_opx.exceptions import YAMLError
-from strong_opx.utils.tracking import OpxFloat, OpxInteger, OpxString, Position, set_position_from_yaml_mark
+from strong_opx.utils.tracking import OpxFloat, OpxInteger, OpxString, Position, copy_tree, set_position_from_yaml_mark
 from strong_opx.vault import VaultCipher
+from strong_opx.yaml.cache import YAML_DISK_CACHE, collect_dependencies, load_cached, record_dependencies
 from strong_opx.yaml.cython_compat import construct_yaml_map, construct_yaml_seq
 
 
+class IncludeState:
+    """
+    State of `!include` tags during a load. Files are loaded once per load, a file included again gets a copy of its
+    value. Files being loaded are tracked to detect circular includes.
+    """
+
+    def __init__(self):
+        self.included: dict[str, tuple[Any, list[str]]] = {}
+        self.stack: list[str] = []
+
+
+INCLUDE_STATE: ContextVar[Optional[IncludeState]] = ContextVar("INCLUDE_STATE", default=None)
+
+
 @contextmanager
-def _yaml_loader(file_path: str):
-    with open(file_path, "r") as f:
-        loader = OpxYAMLLoader(stream=f, file_path=file_path)
+def _include_state(file_path: str) -> Generator[IncludeState, None, None]:
+    state = INCLUDE_STATE.get()
+    token = None
+    if state is None:
+        state = IncludeState()
+        token = INCLUDE_STATE.set(state)
+
+    state.stack.append(os.path.realpath(file_path))
+    try:
+        yield state
+    finally:
+        state.stack.pop()
+        if token is not None:
+            INCLUDE_STATE.reset(token)
+
+
+@contextmanager
+def _yaml_loader(file_path: str, track_positions: bool = True):
+    loader_cls = OpxYAMLLoader if track_positions else LeanYAMLLoader
+
+    with open(file_path, "r") as f, _include_state(file_path):
+        loader = loader_cls(stream=f, file_path=file_path)
         try:
             yield loader
         except yaml.YAMLError as ex:
@@ -35,21 +70,120 @@ def _yaml_loader(file_path: str):
             loader.dispose()
 
 
-def load(file_path: str) -> Any:
-    with _yaml_loader(file_path) as loader:
+def _load(file_path: str, track_positions: bool = True) -> Any:
+    with _yaml_loader(file_path, track_positions) as loader:
         return loader.get_single_data()
 
 
-def load_all(file_path: str) -> list[Any]:
+def load(file_path: str, track_positions: bool = True) -> Any:
+    """
+    Load a YAML file.
+
+    :param file_path: Path of the file
+    :param track_positions: Attach position of each value in the file, which is used to report errors in values.
+        If False, values are plain Python types, which are faster to load and use less memory.
+    :return: Value of the file
+    """
+    if not track_positions:
+        return _load(file_path, track_positions=False)
+
+    if YAML_DISK_CACHE.enabled:
+        return load_cached(file_path, _load)
+
+    return _load(file_path)
+
+
+def load_all(file_path: str, track_positions: bool = True) -> list[Any]:
+    """
+    Load all documents of a YAML file. See `load()` for `track_positions`.
+    """
     documents = []
-    with _yaml_loader(file_path) as loader:
+    with _yaml_loader(file_path, track_positions) as loader:
         while loader.check_data():
             documents.append(loader.get_data())
 
     return documents
 
 
-class OpxYAMLLoader(yaml.SafeLoader):
+def _skip_node(loader: yaml.SafeLoader) -> None:
+    depth = 0
+    while True:
+        event = loader.get_event()
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+
+        if depth == 0:
+            return
+
+
+def _scan_node(
+    loader: yaml.SafeLoader,
+    path: tuple[str, ...],
+    fields: Collection[tuple[str, ...]],
+    prefixes: Collection[tuple[str, ...]],
+    values: dict[tuple[str, ...], Any],
+) -> None:
+    event = loader.peek_event()
+
+    if isinstance(event, yaml.ScalarEvent) and path in fields:
+        loader.get_event()
+        tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        values[path] = None if tag == "tag:yaml.org,2002:null" else event.value
+    elif isinstance(event, yaml.MappingStartEvent) and path in prefixes:
+        loader.get_event()
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.peek_event()
+            if isinstance(key, yaml.ScalarEvent) and len(values) < len(fields):
+                loader.get_event()
+                _scan_node(loader, path + (key.value,), fields, prefixes, values)
+            else:
+                # Complex key, or every field is already known
+                _skip_node(loader)
+                _skip_node(loader)
+
+        loader.get_event()
+    else:
+        _skip_node(loader)
+
+
+def load_all_fields(file_path: str, fields: Collection[tuple[str, ...]]) -> list[dict[tuple[str, ...], Any]]:
+    """
+    Read fields of every document of a YAML file without constructing the documents, so that large documents are
+    not held in memory. Only scalar fields of mappings are read. Values are strings, or None for nulls, and aliases
+    are not followed.
+
+    :param file_path: Path of the file
+    :param fields: Paths of keys to read, e.g. `("metadata", "name")`
+    :return: Values of fields found in each document, keyed by their path
+    """
+    fields = set(fields)
+    prefixes = {field[:i] for field in fields for i in range(len(field))}
+
+    documents = []
+    with _yaml_loader(file_path, track_positions=False) as loader:
+        loader.get_event()  # Stream start
+        while not loader.check_event(yaml.StreamEndEvent):
+            loader.get_event()  # Document start
+
+            values = {}
+            _scan_node(loader, (), fields, prefixes, values)
+            documents.append(values)
+
+            loader.get_event()  # Document end
+
+    return documents
+
+
+class LeanYAMLLoaderMixin:
+    """
+    Constructors of `!include` and `!vault` tags. These only depend on nodes, so are shared by the libyaml-based and
+    the pure-Python loader. Other values are constructed by `yaml.SafeConstructor` as plain Python types.
+    """
+
+    track_positions = False
+
     def __init__(self, stream: TextIO, file_path: str):
         self.file_path = file_path
         super().__init__(stream)
@@ -65,13 +199,45 @@ class OpxYAMLLoader(yaml.SafeLoader):
                 end_pos=Position.from_yaml_mark(node.end_mark),
             )
 
-        return load(abs_path)
+        state = INCLUDE_STATE.get()
+        key = os.path.realpath(abs_path)
+        if key in state.stack:
+            cycle = state.stack[state.stack.index(key) :] + [key]
+            raise YAMLError(
+                f"Circular include of {rel_path}: {' -> '.join(cycle)}",
+                file_path=self.file_path,
+                start_pos=Position.from_yaml_mark(node.start_mark),
+                end_pos=Position.from_yaml_mark(node.end_mark),
+            )
+
+        included = state.included.get(key)
+        if included is None:
+            with collect_dependencies() as dependencies:
+                value = load(abs_path, track_positions=self.track_positions)
+
+            included = state.included[key] = value, dependencies
+        else:
+            # Files included by the included file are dependencies of the file being loaded too
+            record_dependencies(included[1])
+
+        # Loaded values may be modified, so each include gets a copy
+        return copy_tree(included[0])
 
     def vault(self, node):
         value = VaultCipher.parse(self.construct_scalar(node))
-        set_position_from_yaml_mark(value, node.start_mark, node.end_mark)
+        if self.track_positions:
+            set_position_from_yaml_mark(value, node.start_mark, node.end_mark)
+
         return value
 
+
+class OpxYAMLLoaderMixin(LeanYAMLLoaderMixin):
+    """
+    Constructors of strong-opx, which attach position of each value in the file.
+    """
+
+    track_positions = True
+
     def construct_yaml_int(self, node: yaml.ScalarNode):
         value = OpxInteger(super().construct_yaml_int(node))
         set_position_from_yaml_mark(value, node.start_mark, node.end_mark)
@@ -93,14 +259,47 @@ class OpxYAMLLoader(yaml.SafeLoader):
         return value
 
 
-# YAML Tags
-OpxYAMLLoader.add_constructor("tag:yaml.org,2002:int", OpxYAMLLoader.construct_yaml_int)
-OpxYAMLLoader.add_constructor("tag:yaml.org,2002:float", OpxYAMLLoader.construct_yaml_float)
-OpxYAMLLoader.add_constructor("tag:yaml.org,2002:timestamp", OpxYAMLLoader.construct_yaml_timestamp)
-OpxYAMLLoader.add_constructor("tag:yaml.org,2002:str", OpxYAMLLoader.construct_yaml_str)
-OpxYAMLLoader.add_constructor("tag:yaml.org,2002:seq", construct_yaml_seq)
-OpxYAMLLoader.add_constructor("tag:yaml.org,2002:map", construct_yaml_map)
+class PyOpxYAMLLoader(OpxYAMLLoaderMixin, yaml.SafeLoader):
+    pass
+
+
+class PyLeanYAMLLoader(LeanYAMLLoaderMixin, yaml.SafeLoader):
+    pass
+
+
+if yaml.__with_libyaml__:
+
+    class COpxYAMLLoader(OpxYAMLLoaderMixin, yaml.CSafeLoader):
+        pass
+
+    class CLeanYAMLLoader(LeanYAMLLoaderMixin, yaml.CSafeLoader):
+        pass
+
+    # libyaml is several times faster, positions are reported by its marks the same way
+    OpxYAMLLoader = COpxYAMLLoader
+    LeanYAMLLoader = CLeanYAMLLoader
+    LOADERS = (PyOpxYAMLLoader, COpxYAMLLoader)
+    LEAN_LOADERS = (PyLeanYAMLLoader, CLeanYAMLLoader)
+else:
+    OpxYAMLLoader = PyOpxYAMLLoader
+    LeanYAMLLoader = PyLeanYAMLLoader
+    LOADERS = (PyOpxYAMLLoader,)
+    LEAN_LOADERS = (PyLeanYAMLLoader,)
+
+
+for loader_cls in LEAN_LOADERS:
+    loader_cls.add_constructor("!include", LeanYAMLLoaderMixin.include)
+    loader_cls.add_constructor("!vault", LeanYAMLLoaderMixin.vault)
+
+for loader_cls in LOADERS:
+    # YAML Tags
+    loader_cls.add_constructor("tag:yaml.org,2002:int", OpxYAMLLoaderMixin.construct_yaml_int)
+    loader_cls.add_constructor("tag:yaml.org,2002:float", OpxYAMLLoaderMixin.construct_yaml_float)
+    loader_cls.add_constructor("tag:yaml.org,2002:timestamp", OpxYAMLLoaderMixin.construct_yaml_timestamp)
+    loader_cls.add_constructor("tag:yaml.org,2002:str", OpxYAMLLoaderMixin.construct_yaml_str)
+    loader_cls.add_constructor("tag:yaml.org,2002:seq", construct_yaml_seq)
+    loader_cls.add_constructor("tag:yaml.org,2002:map", construct_yaml_map)
 
-# Additional Tags
-OpxYAMLLoader.add_constructor("!include", OpxYAMLLoader.include)
-OpxYAMLLoader.add_constructor("!vault", OpxYAMLLoader.vault)
+    # Additional Tags
+    loader_cls.add_constructor("!include", LeanYAMLLoaderMixin.include)
+    loader_cls.add_constructor("!vault", LeanYAMLLoaderMixin.vault)
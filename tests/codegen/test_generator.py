@@ -1,6 +1,6 @@
 import os.path
 import unittest
-from unittest.mock import MagicMock, Mock, call, patch
+from unittest.mock import ANY, MagicMock, Mock, call, patch
 
 from strong_opx.codegen.generator import BASE_TEMPLATE_DIR, CodeGenerator, TemplateGenerator
 from strong_opx.codegen.questions import Question
@@ -110,18 +110,25 @@ class TemplateGeneratorTests(unittest.TestCase):
         )
 
     @patch("os.mkdir", new=MagicMock())
+    @patch("os.replace")
     @patch("builtins.open")
-    def test_render_template_dir__render_file_content(self, open_mock: Mock):
+    def test_render_template_dir__render_file_content(self, open_mock: Mock, replace_mock: Mock):
         context = Context({"VAR1": "value1"})
         generator = TemplateGenerator()
         generator.template_dir = "sample_template"
         generator.iter_template_files = MagicMock(return_value=["{{ VAR1 }}.txt-tpl"])
 
         generator.render_template_dir("template1", "/path/to/output", context)
+
+        # Rendered into a temporary file which then replaces the target
+        replace_mock.assert_called_once_with(ANY, "/path/to/output/value1.txt")
+        tmp_path = replace_mock.call_args[0][0]
+        self.assertEqual(os.path.dirname(tmp_path), "/path/to/output")
+
         open_mock.assert_has_calls(
             [
                 call(os.path.join(BASE_TEMPLATE_DIR, "sample_template", "template1", "{{ VAR1 }}.txt-tpl")),
-                call("/path/to/output/value1.txt", "w"),
+                call(tmp_path, "x"),
             ],
             any_order=True,
         )
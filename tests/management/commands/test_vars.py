@@ -1,15 +1,21 @@
 import io
+import json
+import os
+import tempfile
 from contextlib import redirect_stdout
 from dataclasses import dataclass
 from unittest import TestCase, mock
-from unittest.mock import MagicMock, PropertyMock, create_autospec, patch
+from unittest.mock import ANY, MagicMock, PropertyMock, create_autospec, patch
 
 import pytest
 
+from strong_opx import yaml
 from strong_opx.exceptions import CommandError
-from strong_opx.management.commands.vars import Command
+from strong_opx.management.commands.vars import Command, reencrypt_file
 from strong_opx.project import Environment
 from strong_opx.template import Context
+from strong_opx.vault import VaultCipher
+from strong_opx.vault.ciphers import VaultAES256GCM
 from tests.mocks import create_mock_environment
 
 
@@ -76,28 +82,32 @@ class CommandTest(TestCase):
         cmd.handle(operation="decrypt")
         cmd.handle_decrypt.assert_called_once()
 
+    def test_handle_calls_handle_reencrypt_when_operation_is_reencrypt(self):
+        cmd = Command()
+        cmd.handle_reencrypt = MagicMock()
+        cmd.handle(operation="reencrypt")
+        cmd.handle_reencrypt.assert_called_once()
+
     def test_handle_encrypt_raises_error_when_no_value_or_vars_provided(self):
         with self.assertRaises(CommandError):
             Command().handle_encrypt(environment=None, vars=None, value=None)
 
     @patch("builtins.print")
     @patch("strong_opx.management.commands.vars.VaultCipher")
-    def test_handle_encrypt_calls_vault_cipher_encrypt_with_context_var(
+    def test_handle_encrypt_calls_vault_cipher_encrypt_many_with_context_vars(
         self, vault_cipher_mock: MagicMock, print_mock: MagicMock
     ):
         environment = create_mock_environment()
         environment.context = Context({"VAR1": "secret1", "VAR2": "secret2"})
         environment.vault_secret = "password"
+        environment.project = MagicMock(path="/tmp/unittest")
+        environment.project.vars_config.get_paths.return_value = []
 
-        vault_cipher_mock.encrypt.return_value = "some-encrypted-value-line-1\nsome-encrypted-value-line-2"
+        vault_cipher_mock.encrypt_many.return_value = ["some-encrypted-value-line-1\nsome-encrypted-value-line-2"] * 2
         Command().handle_encrypt(environment=environment, vars=["VAR1", "VAR2"])
 
-        vault_cipher_mock.encrypt.assert_has_calls(
-            [
-                mock.call("secret1", "password"),
-                mock.call("secret2", "password"),
-            ]
-        )
+        vault_cipher_mock.encrypt_many.assert_called_once_with(["secret1", "secret2"], "password")
+        vault_cipher_mock.reuse_master_key_salt.assert_called_once_with(ANY, "password")
 
         print_mock.assert_has_calls(
             [
@@ -125,3 +135,78 @@ class CommandTest(TestCase):
 
         vault_cipher_mock.encrypt.assert_called_once_with("secret1", "password")
         print_mock.assert_called_once_with("some-encrypted-value-line-1\nsome-encrypted-value-line-2")
+
+
+class ReencryptFileTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.file_path = os.path.join(tmp_dir.name, "vars.yml")
+        VaultAES256GCM.master_key_salts.clear()
+
+    @staticmethod
+    def encrypt(value: str, indent: str = "") -> str:
+        return str(VaultCipher.encrypt(value, "secret", cipher_name="AES256")).replace("\n", f"\n{indent}")
+
+    def test_reencrypt_file(self):
+        content = (
+            "# Comment\n"
+            "A:\n"
+            "  B: !vault |\n"
+            f"    {self.encrypt('b', '    ')}\n"
+            "\n"
+            "  C: 1\n"
+            f"D: !vault {json.dumps(self.encrypt('d'))}\n"
+            "E: !vault |\n"
+            f"  {self.encrypt('e', '  ')}"
+        )
+        with open(self.file_path, "w") as f:
+            f.write(content)
+
+        self.assertEqual(reencrypt_file(self.file_path, "secret"), 3)
+
+        with open(self.file_path) as f:
+            new_content = f.read()
+
+        self.assertTrue(new_content.startswith("# Comment\nA:\n  B: !vault |\n    $STRONG_OPX_VAULT;2.0;AES256GCM\n"))
+        self.assertIn('\n\n  C: 1\nD: !vault "$STRONG_OPX_VAULT;2.0;AES256GCM\\n', new_content)
+
+        value = yaml.load(self.file_path)
+        self.assertEqual(value["A"]["B"].decrypt("secret"), "b")
+        self.assertEqual(value["A"]["C"], 1)
+        self.assertEqual(value["D"].decrypt("secret"), "d")
+        self.assertEqual(value["E"].decrypt("secret"), "e")
+        self.assertEqual({value["A"]["B"].version, value["D"].version, value["E"].version}, {"2.0"})
+
+        self.assertEqual(reencrypt_file(self.file_path, "secret"), 0)
+
+    def test_reencrypt_file__interrupted(self):
+        content = f"A: !vault {json.dumps(self.encrypt('a'))}\n"
+        with open(self.file_path, "w") as f:
+            f.write(content)
+
+        with patch("os.replace", side_effect=KeyboardInterrupt), self.assertRaises(KeyboardInterrupt):
+            reencrypt_file(self.file_path, "secret")
+
+        with open(self.file_path) as f:
+            self.assertEqual(f.read(), content)
+
+        self.assertEqual(os.listdir(os.path.dirname(self.file_path)), ["vars.yml"])
+
+    def test_reencrypt_file__master_key_salt_of_other_values(self):
+        ciphers = []
+        for value in ("a", "b"):
+            # Encrypted by different runs
+            VaultAES256GCM.master_key_salts.clear()
+            ciphers.append(VaultCipher.encrypt(value, "secret"))
+
+        with open(self.file_path, "w") as f:
+            f.write(f"A: !vault {json.dumps(str(ciphers[0]))}\nB: !vault {json.dumps(str(ciphers[1]))}\n")
+
+        VaultAES256GCM.master_key_salts.clear()
+        self.assertEqual(reencrypt_file(self.file_path, "secret"), 1)
+
+        value = yaml.load(self.file_path)
+        self.assertEqual(value["A"].ciphertext, ciphers[0].ciphertext)
+        self.assertEqual(value["B"].decrypt("secret"), "b")
+        self.assertEqual(value["B"].ciphertext[:32], ciphers[0].ciphertext[:32])
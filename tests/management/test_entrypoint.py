@@ -12,6 +12,7 @@ from strong_opx.management.command import BaseCommand
 from tests.helper_functions import assert_has_calls_exactly
 
 
+@mock.patch.object(entrypoint, "_enable_caches", new=mock.Mock())
 class EntrypointTests(TestCase):
     @mock.patch.object(sys, "argv", ["strong-opx"])
     def test_no_command_specified(self):
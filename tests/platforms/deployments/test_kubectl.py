@@ -6,7 +6,7 @@ import pytest
 
 from strong_opx.platforms import Platform
 from strong_opx.platforms.deployments import KubeCtlDeploymentProvider
-from strong_opx.platforms.deployments.kubectl import DeploymentStatus, DeploymentSummary
+from strong_opx.platforms.deployments.kubectl import HEADER_FIELDS, DeploymentStatus, DeploymentSummary
 from strong_opx.project import Environment, Project
 
 
@@ -41,9 +41,9 @@ class TestKubeCtlDeploymentProvider:
                     call("rollout", "status", "deployment", "foo", "-n", "default"),
                 ],
                 deployment_status=DeploymentStatus("deployment", "foo", "configured"),
-                expected_load_all_calls=[call("someDirectory/someFile.yml")],
+                expected_load_all_calls=[call("someDirectory/someFile.yml", HEADER_FIELDS)],
                 configs=["someFile.yml"],
-                yaml_load_all={"metadata": {"name": "foo"}, "kind": "deployment"},
+                yaml_load_all={("metadata", "name"): "foo", ("kind",): "deployment"},
             ),
             Params(
                 expected_kubectl_calls=[
@@ -53,9 +53,9 @@ class TestKubeCtlDeploymentProvider:
                     call("rollout", "status", "deployment", "foo", "-n", "default"),
                 ],
                 deployment_status=DeploymentStatus("deployment", "foo", "unchanged"),
-                expected_load_all_calls=[call("someDirectory/someFile.yml")],
+                expected_load_all_calls=[call("someDirectory/someFile.yml", HEADER_FIELDS)],
                 configs=["someFile.yml"],
-                yaml_load_all={"metadata": {"name": "foo"}, "kind": "deployment"},
+                yaml_load_all={("metadata", "name"): "foo", ("kind",): "deployment"},
             ),
             Params(
                 expected_kubectl_calls=[
@@ -63,9 +63,9 @@ class TestKubeCtlDeploymentProvider:
                     call("rollout", "status", "deployment", "foo", "-n", "bar"),
                 ],
                 deployment_status=DeploymentStatus("deployment", "foo", "configured"),
-                expected_load_all_calls=[call("someDirectory/someFile.yml")],
+                expected_load_all_calls=[call("someDirectory/someFile.yml", HEADER_FIELDS)],
                 configs=["someFile.yml"],
-                yaml_load_all={"metadata": {"name": "foo", "namespace": "bar"}, "kind": "deployment"},
+                yaml_load_all={("metadata", "name"): "foo", ("metadata", "namespace"): "bar", ("kind",): "deployment"},
             ),
             Params(
                 expected_kubectl_calls=[
@@ -73,9 +73,9 @@ class TestKubeCtlDeploymentProvider:
                     call("rollout", "status", "statefulset", "foo", "-n", "default"),
                 ],
                 deployment_status=DeploymentStatus("statefulset", "foo", "configured"),
-                expected_load_all_calls=[call("someDirectory/someFile.yml")],
+                expected_load_all_calls=[call("someDirectory/someFile.yml", HEADER_FIELDS)],
                 configs=["someFile.yml"],
-                yaml_load_all={"metadata": {"name": "foo"}, "kind": "statefulset"},
+                yaml_load_all={("metadata", "name"): "foo", ("kind",): "statefulset"},
             ),
             Params(
                 expected_kubectl_calls=[
@@ -83,9 +83,9 @@ class TestKubeCtlDeploymentProvider:
                     call("rollout", "status", "statefulset", "foo", "-n", "default"),
                 ],
                 deployment_status=DeploymentStatus("statefulset", "foo", "unchanged"),
-                expected_load_all_calls=[call("someDirectory/someFile.yml")],
+                expected_load_all_calls=[call("someDirectory/someFile.yml", HEADER_FIELDS)],
                 configs=["someFile.yml"],
-                yaml_load_all={"metadata": {"name": "foo"}, "kind": "statefulset"},
+                yaml_load_all={("metadata", "name"): "foo", ("kind",): "statefulset"},
             ),
         ],
     )
@@ -100,7 +100,7 @@ class TestKubeCtlDeploymentProvider:
         mock_environment = Mock(spec=Environment)
         mock_platform = Mock(spec=Platform)
         mock_platform.kubectl = mock_kubectl
-        mock_yaml.load_all.return_value = [request.param.yaml_load_all]
+        mock_yaml.load_all_fields.return_value = [request.param.yaml_load_all]
 
         mock_parse_deployment_summary.return_value = DeploymentSummary()
         mock_parse_deployment_summary.return_value.lines.append(request.param.deployment_status)
@@ -119,7 +119,7 @@ class TestKubeCtlDeploymentProvider:
         )
 
     def test_yaml_load_all_called(self, setup: Fixture):
-        setup.mock_yaml.load_all.assert_has_calls(
+        setup.mock_yaml.load_all_fields.assert_has_calls(
             setup.expected_load_all_calls,
             any_order=True,
         )
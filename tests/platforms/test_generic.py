@@ -1,6 +1,14 @@
-from unittest import TestCase
+import os
+import tempfile
+from unittest import TestCase, mock
 
+from parameterized import parameterized
+
+from strong_opx import yaml
+from strong_opx.platforms import GenericPlatform
 from strong_opx.platforms.generic import GenericPlatformConfig
+from strong_opx.template import Context
+from tests.mocks import create_mock_environment, create_mock_project
 
 
 class GenericPlatformConfigTests(TestCase):
@@ -18,3 +26,48 @@ class GenericPlatformConfigTests(TestCase):
         )
 
         self.assertEqual(config.ssh_method, "bastion")
+
+
+class GenericPlatformAnsibleExtraVarsTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        self.playbook = os.path.join(tmp_dir.name, "playbooks", "deploy.yml")
+        files = {
+            self.playbook: "- hosts: all\n  roles:\n    - app\n",
+            os.path.join(tmp_dir.name, "roles", "app", "tasks", "main.yml"): "- debug:\n    msg: '{{ APP_NAME }}'\n",
+            os.path.join(tmp_dir.name, "roles", "app", "templates", "app.j2"): "token={{ APP_TOKEN }}\n",
+        }
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+
+        self.secret_resolver = mock.Mock(return_value="secret")
+        context = Context({"APP_NAME": "app", "APP_TOKEN": "token", "OTHER": "other", "SECRET": self.secret_resolver})
+        self.environment = create_mock_environment(context=context)
+        self.project = create_mock_project()
+        self.project.path = tmp_dir.name
+
+    def extra_vars(self, ansible_vars: list[str]) -> dict:
+        platform = GenericPlatform(
+            project=self.project, environment=self.environment, hosts={}, ansible_vars=ansible_vars
+        )
+        with platform.ansible_extra_vars(self.playbook) as path:
+            return dict(yaml.load(path))
+
+    @parameterized.expand(
+        [
+            ([], {"APP_NAME": "app", "APP_TOKEN": "token"}),
+            (["OTHER", "UNKNOWN"], {"APP_NAME": "app", "APP_TOKEN": "token", "OTHER": "other"}),
+        ]
+    )
+    def test_referenced_vars(self, ansible_vars: list[str], expected: dict):
+        self.assertEqual(self.extra_vars(ansible_vars), expected)
+        self.secret_resolver.assert_not_called()
+
+    def test_all_vars(self):
+        self.assertEqual(
+            self.extra_vars(["*"]), {"APP_NAME": "app", "APP_TOKEN": "token", "OTHER": "other", "SECRET": "secret"}
+        )
@@ -109,7 +109,7 @@ class TestKubernetesPlatform:
         mock_yaml.load.return_value = yaml_load
         setup.subject._post_process_kubeconfig()
 
-        mock_yaml.load.assert_called_once_with("somePath")
+        mock_yaml.load.assert_called_once_with("somePath", track_positions=False)
         mock_yaml.dump.assert_called_once_with(yaml_dump, "somePath")
 
     @mock.patch("strong_opx.platforms.kubernetes.shell", autospec=True)
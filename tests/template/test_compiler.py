@@ -49,12 +49,17 @@ class TestTemplateCompiler(TestCase):
         outcome = TemplateCompiler.str_strip(value, offset)
         self.assertEqual(outcome, expected_outcome)
 
-    @patch.object(Position, "from_offset", autospec=True)
-    def test_offset_to_position(self, position_from_offset_mock: Mock):
-        subject = FakeTemplateCompiler(value="test string", initial_line_no=5, initial_col_offset=20)
-        subject.offset_to_position(22)
-
-        position_from_offset_mock.assert_called_once_with("test string", 22, 5, 20)
+    @parameterized.expand(
+        [
+            (0, Position(5, 20)),
+            (2, Position(5, 22)),
+            (5, Position(6, 1)),
+            (8, Position(6, 4)),
+        ]
+    )
+    def test_offset_to_position(self, offset: int, expected_position: Position):
+        subject = FakeTemplateCompiler(value="test\nstring", initial_line_no=5, initial_col_offset=20)
+        self.assertEqual(subject.offset_to_position(offset), expected_position)
 
     @parameterized.expand(
         [
@@ -206,6 +211,92 @@ class TestTemplateCompiler(TestCase):
         generated_src = astunparse.unparse(node).strip()
         self.assertEqual("lines.append('username is ')", generated_src)
 
+    def test_finalize_optimize__joins_output(self):
+        compiler = TemplateCompiler("Hello {{ username }}{# comment #}!")
+        compiler.compile_constant("Hello ", 0)
+        compiler.compile_expression(" username ", 8)
+        compiler.compile_include('"other.txt"', 34, 37, 49)
+        compiler.compile_constant("!", 33)
+        compiler.compile_constant("?", 34)
+
+        node = compiler.finalize(optimize=True)
+        generated_src = astunparse.unparse(node).strip()
+        self.assertEqual(
+            "_opx_out_ = f\"Hello {_opx_ctx_['username']!s}"
+            "{_opx_include_('other.txt', context=_opx_ctx_, indent=34)}!?\"",
+            generated_src,
+        )
+
+    def test_finalize_optimize__constants_only(self):
+        compiler = TemplateCompiler("Hello {# comment #} world")
+        compiler.compile_constant("Hello ", 0)
+        compiler.compile_constant(" world", 19)
+
+        node = compiler.finalize(optimize=True)
+        generated_src = astunparse.unparse(node).strip()
+        self.assertEqual("_opx_out_ = 'Hello  world'", generated_src)
+
+    def test_finalize_optimize__folds_constants_in_blocks(self):
+        compiler = TemplateCompiler("{% for x in y %}a{# comment #}b{{ x }}{% endfor %}")
+        compiler.compile_for(" x in y ", 2)
+        compiler.compile_constant("a", 16)
+        compiler.compile_constant("b", 30)
+        compiler.compile_expression(" x ", 33)
+        compiler.close_block()
+
+        node = compiler.finalize(optimize=True)
+        generated_src = astunparse.unparse(node).strip()
+        self.assertEqual("for x in _opx_ctx_['y']:\n    lines.append('ab')\n    lines.append(str(x))", generated_src)
+
+    def test_finalize_optimize__not_as_string(self):
+        compiler = TemplateCompiler("{{ SOME_VAR }}", as_string=False)
+        compiler.compile_expression(" SOME_VAR ", 2)
+
+        node = compiler.finalize(optimize=True)
+        generated_src = astunparse.unparse(node).strip()
+        self.assertEqual("_opx_out_ = _opx_ctx_['SOME_VAR']", generated_src)
+
+    @parameterized.expand(
+        [
+            ("{{ SOME_VAR }}", False, "return _opx_ctx_['SOME_VAR']", "(yield str(_opx_ctx_['SOME_VAR']))"),
+            ("", False, "return ''", "(yield from ())"),
+            (
+                "Hello {{ SOME_VAR }}",
+                True,
+                "return f\"Hello {_opx_ctx_['SOME_VAR']!s}\"",
+                "(yield f\"Hello {_opx_ctx_['SOME_VAR']!s}\")",
+            ),
+            (
+                "{% for x in SOME_VAR %}{{ x }}{% endfor %}",
+                True,
+                "lines = []\n"
+                "    for x in _opx_ctx_['SOME_VAR']:\n"
+                "        lines.append(str(x))\n"
+                "    return ''.join(lines)",
+                "for x in _opx_ctx_['SOME_VAR']:\n        (yield str(x))",
+            ),
+        ]
+    )
+    def test_finalize_function(self, template: str, as_string: bool, expected_render: str, expected_stream: str):
+        compiler = TemplateCompiler(template, as_string=as_string)
+        if template.startswith("{%"):
+            compiler.compile_for(" x in SOME_VAR ", 2)
+            compiler.compile_expression(" x ", 25)
+            compiler.close_block()
+        elif template.startswith("Hello"):
+            compiler.compile_constant("Hello ", 0)
+            compiler.compile_expression(" SOME_VAR ", 8)
+        elif template:
+            compiler.compile_expression(" SOME_VAR ", 2)
+
+        node = compiler.finalize_function()
+        generated_src = astunparse.unparse(node).strip()
+        self.assertEqual(
+            f"def _opx_render_(_opx_ctx_, _opx_include_):\n    {expected_render}\n\n"
+            f"def _opx_stream_(_opx_ctx_, _opx_include_):\n    {expected_stream}",
+            generated_src,
+        )
+
     def test_start_else_block(self):
         compiler = TemplateCompiler("{% if 1 %}IF{% else %}ELSE{% endif %}")
         compiler.start_block(ast.If(ast.Constant("1", kind=None), body=[], orelse=[]), 0, len(compiler.value))
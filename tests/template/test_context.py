@@ -1,7 +1,16 @@
+import functools
+import os
+import random
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase, mock
 
+from parameterized import parameterized
+
 from strong_opx.exceptions import UndefinedVariableError, VariableError
-from strong_opx.template import Context
+from strong_opx.template import Context, Template
+from strong_opx.vault import VaultCipher
 
 
 class ContextTests(TestCase):
@@ -46,6 +55,102 @@ class ContextTests(TestCase):
         self.assertDictEqual(context_b.as_dict(), {"key-a": "a", "key-b": "bravo"})
         self.assertDictEqual(context_c.as_dict(), {"key-a": "a", "key-b": "b"})
 
+    def test_chain__variable_added_to_parent(self):
+        context_a = Context({"key-a": "a"})
+        context_b = context_a.chain()
+        context_a["key-b"] = "b"
+        context_a["key-b"] = "b-updated"
+
+        self.assertEqual(context_b["key-b"], "b")
+        self.assertEqual(context_a["key-b"], "b-updated")
+
+    def test_chain__repeated_updates(self):
+        context_a = Context({"key-a": "a"})
+        context_b = context_a.chain()
+        context_a["key-a"] = "a1"
+        context_c = context_a.chain()
+        context_a["key-a"] = "a2"
+        context_a["key-a"] = "a3"
+
+        self.assertEqual([c["key-a"] for c in (context_a, context_b, context_c)], ["a3", "a", "a1"])
+
+    def test_chain__snapshot(self):
+        context_a = Context({"key-a": "a"})
+        context_b = context_a.chain(snapshot=True)
+        context_c = context_b.chain()
+
+        context_a["key-a"] = "a2"
+        context_a["key-b"] = "b"
+
+        for context in (context_b, context_c):
+            self.assertEqual(context["key-a"], "a")
+            self.assertNotIn("key-b", context)
+            self.assertEqual(list(context), ["key-a"])
+
+            with self.assertRaises(UndefinedVariableError):
+                context["key-b"]
+
+        # Variables set in the snapshot itself, or added to contexts chained from it, are seen as usual
+        context_b["key-c"] = "c"
+        self.assertEqual(context_c["key-c"], "c")
+        self.assertEqual(list(context_c), ["key-a", "key-c"])
+
+    def test_chain__lazy_value_resolved_once(self):
+        resolver = mock.Mock(return_value="some-value")
+        context_a = Context({"key-a": resolver})
+        context_b = context_a.chain()
+        context_c = context_a.chain().chain()
+
+        self.assertEqual(context_c["key-a"], "some-value")
+        self.assertEqual(context_b["key-a"], "some-value")
+        self.assertEqual(context_a["key-a"], "some-value")
+        resolver.assert_called_once()
+
+    def test_chain__random_updates(self):
+        """
+        Compare lookups against contexts that copy the old value of a variable to each of the chained contexts, that
+        do not have their own value, whenever it is overridden.
+        """
+
+        class ReferenceContext:
+            def __init__(self, parent=None):
+                self.parent = parent
+                self.data = {}
+                self.children = []
+
+            def get(self, key):
+                context = self
+                while context is not None:
+                    if key in context.data:
+                        return context.data[key]
+
+                    context = context.parent
+
+            def set(self, key, value):
+                current_value = self.get(key)
+                if current_value is not None:
+                    for child in self.children:
+                        child.data.setdefault(key, current_value)
+
+                self.data[key] = value
+
+        rnd = random.Random(7)
+        contexts = [(Context(), ReferenceContext())]
+        keys = [f"key-{i}" for i in range(5)]
+
+        for i in range(2000):
+            context, reference = rnd.choice(contexts)
+            operation = rnd.random()
+            if operation < 0.2:
+                reference.children.append(ReferenceContext(reference))
+                contexts.append((context.chain(), reference.children[-1]))
+            elif operation < 0.6:
+                key = rnd.choice(keys)
+                context[key] = reference.set(key, i) or i
+            else:
+                for context, reference in contexts:
+                    self.assertEqual({k: context.get(k) for k in keys}, {k: reference.get(k) for k in keys})
+
     def test_initial_vars_after_update(self):
         """
         This test demonstrates that initial_vars are calculated and Updates to the parent/root context will
@@ -68,6 +173,14 @@ class ContextTests(TestCase):
 
         self.assertDictEqual(context.as_dict(), {"key-a": "a", "key-b": "b"})
 
+    def test_as_dict__names(self):
+        resolver = mock.Mock(return_value="b")
+        context = Context({"key-a": "a", "key-b": resolver, "key-c": "c"}).chain()
+        context["key-d"] = "d"
+
+        self.assertDictEqual(context.as_dict(names={"key-d", "key-a", "unknown"}), {"key-a": "a", "key-d": "d"})
+        resolver.assert_not_called()
+
     def test_as_dict__non_initial_vars(self):
         context_a = Context({"key-a": "a", "key-b": "b"})
         context_b = context_a.chain()
@@ -118,3 +231,210 @@ class ContextTests(TestCase):
 
         with self.assertRaises(NotImplementedError):
             context.pop("key-a")
+
+
+class LoadFromFileTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+    def write(self, content: str) -> str:
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".yml")
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+
+        return path
+
+    @parameterized.expand([(False,), (True,)])
+    def test_load_from_file(self, lazy: bool):
+        path = self.write(
+            "A: '{{ B }}-{{ BASE }}'\n" "B: '{{ C.nested[0] }}'\n" "C:\n" "  nested: ['{{ C.value }}']\n" "  value: 1\n"
+        )
+
+        context = Context({"BASE": "base"}).chain()
+        context.load_from_file(path, lazy=lazy)
+
+        self.assertEqual(
+            context.as_dict(exclude_initial=True), {"A": "1-base", "B": 1, "C": {"nested": [1], "value": 1}}
+        )
+
+    @parameterized.expand(
+        [
+            (False, "A: '{{ BASE }}'\nB: '{{ A[0] }}'\n", "b"),
+            (True, "A: '{{ BASE }}'\nB: '{{ A[0] }}'\n", "b"),
+            (False, "A: [1, 2]\nB: '{% for a in A %}{{ a }}{% endfor %}'\n", "12"),
+            (True, "A: [1, 2]\nB: '{% for a in A %}{{ a }}{% endfor %}'\n", "12"),
+        ]
+    )
+    def test_load_from_file__refer_to_value_of_file(self, lazy: bool, content: str, expected_value: str):
+        context = Context({"BASE": "base"}).chain()
+        context.load_from_file(self.write(content), lazy=lazy)
+
+        self.assertEqual(context["B"], expected_value)
+
+    def test_load_from_file__lazy_renders_on_access(self):
+        resolver = mock.Mock(return_value="expensive")
+        path = self.write("A: '{{ EXPENSIVE }}'\nB: '{{ CHEAP }}'\n")
+
+        context = Context({"EXPENSIVE": resolver, "CHEAP": "cheap"}).chain()
+        context.load_from_file(path, lazy=True)
+        self.assertEqual(context["B"], "cheap")
+        resolver.assert_not_called()
+
+        self.assertEqual(context["A"], "expensive")
+        self.assertEqual(context.chain()["A"], "expensive")
+        resolver.assert_called_once()
+
+    def test_load_from_file__lazy_ignores_later_overrides(self):
+        path = self.write("A: '{{ B }}'\n")
+
+        context = Context({"B": "initial"}).chain()
+        context.load_from_file(path, lazy=True)
+        context["B"] = "overridden"
+
+        self.assertEqual(context["A"], "initial")
+
+    @parameterized.expand([(False,), (True,)])
+    def test_load_from_file__forward_reference(self, lazy: bool):
+        path_a = self.write("A: '{{ Y }}'\n")
+        path_b = self.write("Y: from-b\n")
+
+        context = Context({"BASE": "base"}).chain()
+
+        # Values of a file see only the variables defined before it was loaded, regardless of when they are rendered
+        with self.assertRaises(UndefinedVariableError):
+            context.load_from_file(path_a, lazy=lazy)
+            context.load_from_file(path_b, lazy=lazy)
+            context["A"]
+
+    @parameterized.expand([(False,), (True,)])
+    def test_load_from_file__reference_overridden_later(self, lazy: bool):
+        path_a = self.write("A: '{{ Y }}'\n")
+        path_b = self.write("Y: from-b\n")
+
+        context = Context().chain()
+        context["Y"] = "base"
+        context.load_from_file(path_a, lazy=lazy)
+        context.load_from_file(path_b, lazy=lazy)
+
+        self.assertEqual(context["A"], "base")
+        self.assertEqual(context["Y"], "from-b")
+
+    def test_load_from_file__lazy_circular_dependency(self):
+        path = self.write("A: '{{ B }}'\nB: '{{ C }}'\nC: '{{ A }}'\n")
+
+        context = Context().chain()
+        context.load_from_file(path, lazy=True)
+
+        with self.assertRaises(VariableError) as cm:
+            context["A"]
+
+        self.assertEqual(cm.exception.errors[0].error, "Found circular dependency: A -> B -> C -> A")
+
+    @parameterized.expand(
+        [
+            (False, "'{{ A }}'", "some-secret"),
+            (True, "'{{ A }}'", "some-secret"),
+            (False, "'prefix-{{ A }}'", "prefix-some-secret"),
+            (True, "'prefix-{{ A }}'", "prefix-some-secret"),
+            (False, "['{{ A }}']", ["some-secret"]),
+            (True, "['{{ A }}']", ["some-secret"]),
+        ]
+    )
+    def test_load_from_file__encrypted_value(self, lazy: bool, value: str, expected_value):
+        cipher = str(VaultCipher.encrypt("some-secret", "vault-secret")).replace("\n", "\n  ")
+        path = self.write(f"A: !vault |\n  {cipher}\nB: {value}\n")
+
+        with mock.patch("strong_opx.project.Project.current") as current_project_mock:
+            current_project_mock.return_value.selected_environment.vault_secret = "vault-secret"
+
+            context = Context().chain()
+            context.load_from_file(path, lazy=lazy)
+            self.assertEqual((context["A"], context["B"]), ("some-secret", expected_value))
+
+    @parameterized.expand([(False,), (True,)])
+    def test_load_from_file__protected_variable(self, lazy: bool):
+        path = self.write("A: a\n")
+
+        with self.assertRaises(VariableError):
+            Context({"A": "initial"}).chain().load_from_file(path, lazy=lazy)
+
+
+class PrefetchTests(TestCase):
+    def setUp(self):
+        barrier = threading.Barrier(2)
+
+        def resolver(value: str):
+            # Fails unless both values are resolved at the same time
+            barrier.wait(timeout=5)
+            return value
+
+        self.context = Context({"X": functools.partial(resolver, "x"), "Y": functools.partial(resolver, "y")}).chain()
+
+    def test_render__resolves_values_concurrently(self):
+        self.assertEqual(Template("{{ X }}-{{ Y }}").render(self.context), "x-y")
+
+    def test_render__resolves_values_read_by_lazy_file_values(self):
+        fd, path = tempfile.mkstemp(suffix=".yml")
+        self.addCleanup(os.unlink, path)
+        with os.fdopen(fd, "w") as f:
+            f.write("A: '{{ X }}'\nB: '{{ A }}-{{ Y }}'\n")
+
+        self.context.load_from_file(path, lazy=True)
+        self.assertEqual(Template("{{ B }}").render(self.context), "x-y")
+
+    def test_prefetch__resolves_once(self):
+        resolver = mock.Mock(return_value="value")
+        context = Context({"A": resolver, "B": "b"})
+
+        context.prefetch(["A", "B", "UNDEFINED"])
+
+        self.assertEqual(context["A"], "value")
+        resolver.assert_called_once()
+
+    @mock.patch("strong_opx.template.context.selected_vault_secret", return_value="secret")
+    @mock.patch.object(VaultCipher, "decrypt_many")
+    def test_prefetch__decrypts_values_together(self, decrypt_many_mock: mock.Mock, _):
+        ciphers = [VaultCipher(ciphertext="a"), VaultCipher(ciphertext="b")]
+        context = Context({"A": ciphers[0], "B": ciphers[1]})
+
+        with mock.patch("strong_opx.template.context.prefetch_executor") as executor_mock:
+            context.prefetch(["A", "B"])
+
+        # Decrypted by the calling thread, since a pool of processes must not be started by a background thread
+        decrypt_many_mock.assert_called_once_with(ciphers, "secret")
+        executor_mock.return_value.submit.assert_not_called()
+
+    @mock.patch.object(VaultCipher, "decrypt_many")
+    def test_prefetch__secret_resolved_before_background_work(self, decrypt_many_mock: mock.Mock):
+        calls = []
+        cipher = VaultCipher(ciphertext="a")
+        context = Context({"ACCOUNT_ID": mock.Mock(return_value="123"), "A": cipher})
+
+        with (
+            mock.patch(
+                "strong_opx.template.context.selected_vault_secret",
+                side_effect=lambda: calls.append("secret") or "secret",
+            ),
+            mock.patch("strong_opx.template.context.prefetch_executor") as executor_mock,
+        ):
+            executor_mock.return_value.submit.side_effect = lambda fn: calls.append("submit") or mock.Mock()
+            context.prefetch(["ACCOUNT_ID", "A"])
+
+        # Secret may need a boto3 client, which must not be created while a background thread creates one
+        self.assertEqual(calls, ["secret", "submit"])
+        decrypt_many_mock.assert_called_once_with([cipher], "secret")
+
+    def test_prefetch__error_is_logged(self):
+        resolver = mock.Mock(side_effect=[ValueError("unavailable"), "value"])
+        context = Context({"A": resolver})
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        with mock.patch("strong_opx.template.context.prefetch_executor", return_value=executor):
+            with self.assertLogs("strong_opx.template.context", "DEBUG") as cm:
+                context.prefetch(["A"])
+                executor.shutdown(wait=True)
+
+        self.assertIn("ValueError('unavailable')", cm.output[0])
+        self.assertEqual(context["A"], "value")  # Failure isn't cached, value is resolved again when read
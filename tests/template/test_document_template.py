@@ -0,0 +1,169 @@
+import tempfile
+from typing import Any
+from unittest import TestCase
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from strong_opx import yaml
+from strong_opx.exceptions import CommandError, TemplateError, UndefinedVariableError, VariableError
+from strong_opx.template import Context
+from strong_opx.template.document_template import DOCUMENT_CACHE, DocumentTemplate
+from strong_opx.template.object_template import ObjectTemplate
+from strong_opx.template.template import TEMPLATE_DISK_CACHE
+from strong_opx.utils.tracking import OpxMapping, OpxString, Position, get_position, set_position
+
+
+def positioned(value: str, line: int, column: int) -> OpxString:
+    value = OpxString(value)
+    set_position(value, "vars.yml", Position(line, column), Position(line, column + len(value)))
+    return value
+
+
+class DocumentTemplateTests(TestCase):
+    context = Context({"VI": "i", "VSEQ": ["i", "ii", "iii", "iv"], "VNESTED": {"VINNER": "inner"}})
+
+    def setUp(self):
+        DOCUMENT_CACHE.clear()
+
+    @parameterized.expand(
+        [
+            ({"V1": "{{ VI }}"}, {"V1": "i"}),
+            ({"V1": "{{ V2 }}", "V2": "{{ VI }}"}, {"V1": "i", "V2": "i"}),
+            ({"V1": ["{{ VI }}"], "V2": ["{{ V1 }}"]}, {"V1": ["i"], "V2": [["i"]]}),
+            ({"V1": ["{{ VSEQ[3] }}", "{{ VSEQ[0] }}"]}, {"V1": ["iv", "i"]}),
+            ({"V1": {"{{ V1 }}": "{{ VI }}"}}, {"V1": {"{{ V1 }}": "i"}}),
+            ({"V1": {"V2": "{{ VI }}"}, "V3": {"V4": "{{ V1 }}"}}, {"V1": {"V2": "i"}, "V3": {"V4": {"V2": "i"}}}),
+            ({"V1": [{"V2": "{{ VI }}"}], "V3": "{{ V1[0].V2 }}"}, {"V1": [{"V2": "i"}], "V3": "i"}),
+            ({"V1": ["a", "b"], "V2": "{{ V1[1] }}", "V3": 3}, {"V1": ["a", "b"], "V2": "b", "V3": 3}),
+            (
+                {"V1": "{% for v in VSEQ %}{{ v }}{% endfor %}-{{ V2|uppercase }}", "V2": "ii"},
+                {"V1": "iiiiiiiv-II", "V2": "ii"},
+            ),
+            (
+                {"V1": "{{ VI }}", "VI": '{{ VNESTED["VINNER"] }}'},
+                {"V1": "inner", "VI": "inner"},
+            ),  # Document shadows context
+        ]
+    )
+    def test_render(self, value: dict[str, Any], expected_rendered_value: dict[str, Any]):
+        rendered_value = DocumentTemplate(value).render(self.context)
+
+        self.assertEqual(expected_rendered_value, rendered_value)
+        self.assertIsNotNone(DOCUMENT_CACHE.get_or_create(DocumentTemplate(value).digest, lambda: None))
+
+    def test_render__retains_position(self):
+        literal = positioned("us-east-1", 1, 9)
+        template = positioned("{{ REGION }}-{{ VI }}", 2, 7)
+        value = OpxMapping(REGION=literal, NAME=template)
+
+        rendered_value = DocumentTemplate(value).render(self.context)
+
+        self.assertIs(rendered_value["REGION"], literal)
+        self.assertEqual(rendered_value["NAME"], "us-east-1-i")
+        self.assertEqual(get_position(rendered_value["NAME"]), get_position(template))
+
+    def test_render__compiled_once(self):
+        value = {"V1": "{{ V2 }}", "V2": "{{ VI }}"}
+        DocumentTemplate(value).render(self.context)
+
+        with patch.object(DocumentTemplate, "compile_document") as compile_mock:
+            self.assertEqual(DocumentTemplate(value).render(Context({"VI": "j"})), {"V1": "j", "V2": "j"})
+
+        compile_mock.assert_not_called()
+
+    @parameterized.expand(
+        [
+            ({"V1": "{{ V2 }}", "V2": "{{ V1 }}"}, VariableError),
+            ({"V1": "{{ V2.missing }}", "V2": {"a": 1}}, UndefinedVariableError),
+            ({"V1": "{{ MISSING }}"}, UndefinedVariableError),
+        ]
+    )
+    def test_render__error_is_reported_by_object_template(self, value: dict[str, Any], error_cls: type[Exception]):
+        with self.assertRaises(error_cls):
+            DocumentTemplate(value).render(self.context)
+
+    def test_render__undefined_variable(self):
+        with self.assertRaises(UndefinedVariableError) as cm:
+            DocumentTemplate({"V1": "{{ V2 }}{{ MISSING }}", "V2": "{{ VI }}"}).render(self.context)
+
+        self.assertEqual(cm.exception.names, ("MISSING",))
+
+    def test_render__syntax_error(self):
+        template = positioned("{{ VI }", 3, 5)
+
+        with self.assertRaises(TemplateError) as cm:
+            DocumentTemplate(OpxMapping(V1=template)).render(self.context)
+
+        self.assertEqual(cm.exception.errors[0].start_pos, Position(3, 5))
+
+    @parameterized.expand(
+        [
+            ("k0: '{{ VI }}'\nB: '{{ k0[0] }}'\n",),
+            ("L: [1, 2]\nB: '{% for x in L %}{{ x }}{% endfor %}-{{ x }}'\n",),
+            ("B: '{{ MISSING }}-{{ VI }}'\nC: '{{ OTHER }}'\n",),
+            ("A: {a: 1}\nB: '{{ A.b }}'\n",),
+            ("B: '{{ VI.missing }}'\n",),
+            ("A: '{{ VI }}'\nB:\n  - '{{ A }}'\n  - '{{ 1 // 0 }}'\n",),
+            ("A: '{{ B }}'\nB: '{{ A }}'\n",),
+        ]
+    )
+    def test_render__same_as_object_template(self, content: str):
+        def outcome(render):
+            try:
+                return render()
+            except CommandError as e:
+                return type(e), [(d.error, d.file_path, d.start_pos, d.end_pos) for d in e.errors]
+
+        with tempfile.NamedTemporaryFile("w", suffix=".yml") as f:
+            f.write(content)
+            f.flush()
+            document = yaml.load(f.name)
+
+        self.assertEqual(
+            outcome(lambda: DocumentTemplate(document).render(self.context)),
+            outcome(lambda: ObjectTemplate(self.context).render(document)),
+        )
+
+    def test_render__error_is_not_rendered_again(self):
+        template = positioned("{{ VI.missing }}", 3, 5)
+
+        with patch.object(ObjectTemplate, "render") as render_mock, self.assertRaises(TemplateError) as cm:
+            DocumentTemplate(OpxMapping(V1=positioned("{{ VI }}", 2, 5), V2=template)).render(self.context)
+
+        render_mock.assert_not_called()
+        self.assertEqual(cm.exception.errors[0].start_pos, Position(3, None))
+
+    @parameterized.expand(
+        [
+            ({"V1": "{% include 'child.txt' %}"},),  # Included template is rendered with the context
+            ({"V1": "{{ V1 }}"},),
+            ({"V1": "{{ V2.missing }}", "V2": {"a": 1}},),
+        ]
+    )
+    def test_compile__not_compilable(self, value: dict[str, Any]):
+        self.assertIsNone(DocumentTemplate(value).compile())
+
+
+class DocumentTemplateDiskCacheTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        for name, value in (("cache_dir", tmp_dir.name), ("enabled", True)):
+            patcher = patch.object(TEMPLATE_DISK_CACHE, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        DOCUMENT_CACHE.clear()
+
+    def test_warm_run_skips_compilation(self):
+        value = {"V1": "{{ V2[0]|uppercase }}", "V2": ["{{ VI }}", "literal"]}
+        DocumentTemplate(value).render(Context({"VI": "i"}))
+        DOCUMENT_CACHE.clear()
+
+        with patch.object(DocumentTemplate, "compile_document") as compile_mock:
+            rendered_value = DocumentTemplate(value).render(Context({"VI": "j"}))
+
+        compile_mock.assert_not_called()
+        self.assertEqual(rendered_value, {"V1": "J", "V2": ["j", "literal"]})
@@ -1,8 +1,11 @@
 import contextlib
+import os
 import tempfile
 from unittest import TestCase
 from unittest.mock import MagicMock
 
+from parameterized import parameterized
+
 from strong_opx.config import opx_config
 from strong_opx.template import Context, FileTemplate
 
@@ -33,3 +36,85 @@ class FileTemplateTests(TestCase):
             template.render(self.DEFAULT_CONTEXT)
 
         renderer.assert_called_once_with(self.DEFAULT_CONTEXT)
+
+    def test_render_to_file(self):
+        for engine in ("strong_opx", "jinja2"):
+            with override_templating_engine(engine), tempfile.TemporaryDirectory() as td:
+                source_path = os.path.join(td, "source.yml")
+                target_path = os.path.join(td, "target", "target.yml")
+
+                with open(source_path, "w") as f:
+                    f.write("{% for i in range(2) %}key{{ i }}: {{ VAR_1 }}\n{% endfor %}")
+
+                template = FileTemplate(source_path)
+                template.render_to_file(target_path, self.DEFAULT_CONTEXT)
+
+                with open(target_path) as f:
+                    self.assertEqual(f.read(), "key0: some-value\nkey1: some-value\n", engine)
+
+    def test_render_to_file__no_output(self):
+        with tempfile.TemporaryDirectory() as td:
+            source_path = os.path.join(td, "source.yml")
+            target_path = os.path.join(td, "target.yml")
+
+            with open(source_path, "w") as f:
+                f.write("{% for h in HOSTS %}{% endfor %}")
+
+            FileTemplate(source_path).render_to_file(target_path, Context({"HOSTS": []}))
+
+            with open(target_path) as f:
+                self.assertEqual(f.read(), "")
+
+    def test_render_to_file__error_keeps_target(self):
+        for engine in ("strong_opx", "jinja2"):
+            with override_templating_engine(engine), tempfile.TemporaryDirectory() as td:
+                source_path = os.path.join(td, "source.yml")
+                target_path = os.path.join(td, "target.yml")
+
+                with open(source_path, "w") as f:
+                    f.write("key: {{ VAR_1 }}\n" * 100 + "{{ MISSING.key }}\n")
+
+                with open(target_path, "w") as f:
+                    f.write("previous")
+
+                with self.assertRaises(Exception):
+                    FileTemplate(source_path).render_to_file(target_path, self.DEFAULT_CONTEXT)
+
+                with open(target_path) as f:
+                    self.assertEqual(f.read(), "previous", engine)
+
+                self.assertEqual(sorted(os.listdir(td)), ["source.yml", "target.yml"], engine)
+
+    @parameterized.expand(
+        [
+            ("{{ VAR_1 }}", {}, "some-value"),
+            ("{% include 'child.txt' %}", {"child.txt": "{{ VAR_1 }}"}, "some-value"),
+            (
+                "{% extends 'base.txt' %}",
+                {"base.txt": "{% include 'child.txt' %}", "child.txt": "{{ VAR_1 }}"},
+                "some-value",
+            ),
+        ]
+    )
+    def test_jinja2_engine__resolves_referenced_vars(self, content: str, templates: dict[str, str], expected: str):
+        resolver = MagicMock(return_value="secret")
+        context = Context({"VAR_1": "some-value", "SECRET": resolver})
+
+        with override_templating_engine("jinja2"), tempfile.TemporaryDirectory() as td:
+            for name, template_content in {"source.txt": content, **templates}.items():
+                with open(os.path.join(td, name), "w") as f:
+                    f.write(template_content)
+
+            self.assertEqual(FileTemplate(os.path.join(td, "source.txt")).render(context), expected)
+
+        resolver.assert_not_called()
+
+    def test_jinja2_engine__dynamic_include_resolves_all_vars(self):
+        context = Context({"NAME": "child.txt", "SECRET": MagicMock(return_value="secret")})
+
+        with override_templating_engine("jinja2"), tempfile.TemporaryDirectory() as td:
+            for name, template_content in {"source.txt": "{% include NAME %}", "child.txt": "{{ SECRET }}"}.items():
+                with open(os.path.join(td, name), "w") as f:
+                    f.write(template_content)
+
+            self.assertEqual(FileTemplate(os.path.join(td, "source.txt")).render(context), "secret")
@@ -1,6 +1,8 @@
 from unittest import TestCase
 
-from strong_opx.template.lexer import LexerError, TemplateLexer, Token
+from parameterized import parameterized
+
+from strong_opx.template.lexer import LexerError, TemplateLexer, Token, has_delimiters
 
 
 class TemplateLexerTest(TestCase):
@@ -276,3 +278,20 @@ class TemplateLexerTest(TestCase):
                 Token("{ } % # ", 0),
             ],
         )
+
+
+class HasDelimitersTest(TestCase):
+    @parameterized.expand(
+        [
+            ("10.0.0.0/16", False),
+            ("", False),
+            ("{ not a tag }", False),
+            ("$HOME", False),
+            ("{{ name }}", True),
+            ("{% raw %}", True),
+            ("{# comment #}", True),
+            ("${name}", True),
+        ]
+    )
+    def test_has_delimiters(self, value: str, expected: bool):
+        self.assertEqual(has_delimiters(value), expected)
@@ -5,9 +5,11 @@ from unittest.mock import Mock, create_autospec, patch
 
 from parameterized import parameterized
 
-from strong_opx.exceptions import UndefinedVariableError, VariableError
+from strong_opx.exceptions import ConfigurationError, UndefinedVariableError, VariableError
 from strong_opx.template import Context
-from strong_opx.template.object_template import ObjectTemplate, Substitution, TreeNode
+from strong_opx.template.object_template import ObjectTemplate, Substitution
+from strong_opx.utils.tracking import OpxMapping, OpxString, Position, get_position, set_position
+from strong_opx.vault import VaultCipher
 from tests.helper_functions import patch_colorama
 
 
@@ -151,6 +153,50 @@ class ObjectTemplateTests(TestCase):
             },
         )
 
+    def test_literals_are_not_substituted(self):
+        literal = OpxString("us-east-1")
+        set_position(literal, "vars.yml", Position(2, 9), Position(2, 18))
+        value = OpxMapping(REGION=literal, NAME="{{ VI }}")
+
+        subject = ObjectTemplate(Context({"VI": "i"}))
+        with patch("strong_opx.template.object_template.Substitution", wraps=Substitution) as substitution_mock:
+            rendered_value = subject.render(value)
+
+        substitution_mock.assert_called_once()
+        self.assertIs(rendered_value["REGION"], literal)
+        self.assertEqual(get_position(rendered_value["REGION"]), ("vars.yml", Position(2, 9), Position(2, 18)))
+
+    @parameterized.expand(
+        [
+            ({"V1": ["a", "b"], "V2": "{{ V1[1] }}"}, {"V1": ["a", "b"], "V2": "b"}),
+            ({"V1": {"a": 1}, "V2": "{{ V1.a }}"}, {"V1": {"a": 1}, "V2": 1}),
+        ]
+    )
+    def test_refer_to_nested_literal(self, value: dict[str, Any], expected_rendered_value: dict[str, Any]):
+        rendered_value = ObjectTemplate(Context()).render(value)
+        self.assertEqual(expected_rendered_value, rendered_value)
+
+    def test_refer_to_nested_vault_value(self):
+        secret = VaultCipher("00ff", cipher_name="AES256GCM", version="2.0")
+
+        with self.assertRaises(UndefinedVariableError) as cm:
+            ObjectTemplate(Context()).render({"A": {"secret": secret}, "B": "{{ A.secret }}"})
+
+        self.assertEqual(cm.exception.names, ("A.secret",))
+
+    def test_long_dependency_chain(self):
+        value = {f"V{i}": f"{{{{ V{i + 1} }}}}" for i in range(2000)}
+        value["V2000"] = {"nested": ["{{ VI }}"]}
+
+        rendered_value = ObjectTemplate(Context({"VI": "i"})).render(value)
+        self.assertEqual(rendered_value["V0"], {"nested": ["i"]})
+
+
+def mock_substitution(ref: str, required_refs: set[str]) -> Mock:
+    substitution = create_autospec(spec=Substitution, instance=True, ref=ref, required_refs=required_refs, index=ref)
+    substitution.parent = {}  # `parent` is a reserved keyword of `create_autospec`
+    return substitution
+
 
 class ResolveSubstitutionsNoDeadlock(TestCase):
     def setUp(self):
@@ -160,9 +206,12 @@ class ResolveSubstitutionsNoDeadlock(TestCase):
         self.context = create_autospec(spec=Context, instance=True)
         self.subject = ObjectTemplate(self.context)
 
-        self.first_sub = create_autospec(spec=Substitution, instance=True)
-        self.second_sub = create_autospec(spec=Substitution, instance=True)
-        self.second_sub.can_resolve.return_value = True
+        self.first_sub = mock_substitution(ref="first", required_refs={"second"})
+        self.second_sub = mock_substitution(ref="second", required_refs=set())
+
+        self.call_order = []
+        self.first_sub.resolve.side_effect = lambda _: self.call_order.append("first")
+        self.second_sub.resolve.side_effect = lambda _: self.call_order.append("second")
 
         self.subject.substitutions = [
             self.first_sub,
@@ -177,6 +226,9 @@ class ResolveSubstitutionsNoDeadlock(TestCase):
     def test_should_call_resolve_for_second_sub(self):
         self.second_sub.resolve.assert_called_once_with(self.context)
 
+    def test_should_resolve_dependency_first(self):
+        self.assertEqual(self.call_order, ["second", "first"])
+
     def test_should_not_call_handle_deadlock(self):
         self.handle_deadlock_mock.assert_not_called()
 
@@ -196,12 +248,10 @@ class ResolveSubstitutionsWithDeadlock(TestCase):
         self.subject = ObjectTemplate(Context())
 
         # First sub can never render, so we will eventually call handle_deadlock()
-        self.first_sub = create_autospec(spec=Substitution, instance=True)
-        self.first_sub.can_resolve.return_value = False
+        self.first_sub = mock_substitution(ref="first", required_refs={"undefined"})
 
         # Can render, so will be removed from self.substitutions when handle_deadlock() is called
-        self.second_sub = create_autospec(spec=Substitution, instance=True)
-        self.second_sub.can_resolve.return_value = True
+        self.second_sub = mock_substitution(ref="second", required_refs=set())
 
         self.subject.substitutions = [
             self.first_sub,
@@ -230,39 +280,71 @@ class ResolveSubstitutionsWithDeadlock(TestCase):
 
 
 class HandleDeadlock(TestCase):
-    def test_should_raise_error_for_first_undefined_variable(self):
+    def test_should_raise_error_for_all_undefined_variables(self):
         subject = ObjectTemplate(Context())
 
-        # Four unresolved, required variables, but will only raise for the first
         subject.substitutions = [
-            create_autospec(spec=Substitution, instance=True, ref="the_root", required_refs={"one", "two"}),
-            create_autospec(spec=Substitution, instance=True, ref="the_root", required_refs={"three", "four"}),
+            mock_substitution(ref="the_root", required_refs={"one", "two"}),
+            mock_substitution(ref="the_root", required_refs={"three", "four"}),
         ]
 
         with self.assertRaises(UndefinedVariableError) as cm:
             subject.handle_deadlock(set())
 
-        # We cannot guarantee which of the undefined vars will be found first, so use a regex to check it's one of them
-        # (We could guarantee order by sorting in the source code, but it's not necessary)
-        self.assertRegex(str(cm.exception), r"(one|two|three|four) is undefined")
+        self.assertEqual(set(cm.exception.names), {"one", "two", "three", "four"})
 
     @patch_colorama
-    @patch.object(TreeNode, "check_cycle", autospec=True)
-    def test_should_raise_for_circular_dependency(self, tree_node_check_cycle_mock: Mock):
-        tree_node_check_cycle_mock.return_value = ["one", "two", "three"]
-
+    def test_should_raise_for_circular_dependency(self):
         subject = ObjectTemplate(Context())
 
-        # This gets us past the check for undefined variables
         subject.substitutions = [
-            create_autospec(spec=Substitution, instance=True, ref="first_root", required_refs={"first_root"}),
+            mock_substitution(ref="one", required_refs={"two"}),
+            mock_substitution(ref="two", required_refs={"three"}),
+            mock_substitution(ref="three", required_refs={"one", "resolved"}),
         ]
 
         with self.assertRaises(VariableError) as cm:
-            subject.handle_deadlock(set())
+            subject.handle_deadlock({"resolved"})
 
         self.assertEqual(
             "{Fore.RED}Error:{Fore.RESET} {Style.BRIGHT}Found circular dependency: "
-            "three -> two -> one{Style.RESET_ALL}",
+            "one -> two -> three -> one{Style.RESET_ALL}",
             str(cm.exception),
         )
+
+    def test_should_report_every_cycle_and_undefined_variable(self):
+        subject = ObjectTemplate(Context())
+
+        subject.substitutions = [
+            mock_substitution(ref="self", required_refs={"self"}),
+            mock_substitution(ref="one", required_refs={"two", "undefined"}),
+            mock_substitution(ref="two", required_refs={"one"}),
+            mock_substitution(ref="blocked", required_refs={"two"}),
+        ]
+
+        with self.assertRaises(ConfigurationError) as cm:
+            subject.handle_deadlock(set())
+
+        self.assertEqual(
+            [error.error for error in cm.exception.errors],
+            [
+                "undefined is undefined",
+                "Found circular dependency: self -> self",
+                "Found circular dependency: one -> two -> one",
+            ],
+        )
+
+    def test_should_report_cycle_through_container(self):
+        with self.assertRaises(VariableError) as cm:
+            ObjectTemplate(Context()).render({"V1": {"V2": ["{{ V1 }}"]}})
+
+        self.assertEqual(cm.exception.errors[0].error, "Found circular dependency: V1 -> V1.V2 -> V1.V2.0 -> V1")
+
+    def test_should_not_hit_recursion_limit_for_long_cycle(self):
+        value = {f"V{i}": f"{{{{ V{i + 1} }}}}" for i in range(5000)}
+        value["V5000"] = "{{ V0 }}"
+
+        with self.assertRaises(VariableError) as cm:
+            ObjectTemplate(Context()).render(value)
+
+        self.assertTrue(cm.exception.errors[0].error.startswith("Found circular dependency: V0 -> V1 -> V2"))
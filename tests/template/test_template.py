@@ -1,11 +1,15 @@
 import datetime
+import os
 import sys
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 
 from parameterized import parameterized
 
 from strong_opx.exceptions import TemplateError, UndefinedVariableError
 from strong_opx.template import Context, Template
+from strong_opx.template.template import INCLUDE_CACHE, MAX_CACHED_TEMPLATE_SIZE, TEMPLATE_CACHE, TEMPLATE_DISK_CACHE
 from strong_opx.utils.tracking import OpxString, Position, set_position
 
 PY3_10_PLUS = sys.version_info[:2] >= (3, 10)
@@ -144,6 +148,38 @@ class TemplateTest(TestCase):
 
         self.assertEqual(cm.exception.errors[0].error, "raw action tag does not take any argument")
 
+    def test_render_function_is_reused(self):
+        t = Template("{% for i in range(3) %}{{ username }}{{ i }} {% endfor %}")
+
+        with patch("builtins.exec") as exec_mock:
+            self.assertEqual(t.render(self.context1), "strong0 strong1 strong2 ")
+            self.assertEqual(t.function(self.context1, t.include), "strong0 strong1 strong2 ")
+
+        exec_mock.assert_not_called()
+
+    def test_stream(self):
+        t = Template("{% for i in range(3) %}{{ username }}{{ i }} {% endfor %}")
+        chunks = list(t.stream(self.context1))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), t.render(self.context1))
+
+    @parameterized.expand([("{% if username %}{% endif %}",), ("{% for i in range(3) %}{% endfor %}",)])
+    def test_stream__no_output(self, template: str):
+        self.assertEqual(list(Template(template).stream(self.context1)), [])
+
+    def test_stream__literal(self):
+        self.assertEqual(list(Template("no tags").stream(self.context1)), ["no tags"])
+
+    def test_stream__missing_key_with_position(self):
+        value = OpxString("line before\n{% for i in range(3) %}{{ VAR_5 }}{% endfor %}")
+        set_position(value, "some-file", Position(1, 11), Position(2, 11))
+
+        with self.assertRaises(UndefinedVariableError) as cm:
+            list(Template(value).stream(self.context2))
+
+        self.assertEqual(cm.exception.errors[0].start_pos, Position(2, 27))
+
     def test_missing_key(self):
         with self.assertRaises(UndefinedVariableError):
             Template("{{ VAR_5 }}").render(self.context2)
@@ -213,3 +249,176 @@ class TemplateTest(TestCase):
             Template("{% endif %}")
 
         self.assertEqual(cm.exception.errors[0].error, "Unexpected end block")
+
+
+class TemplateCacheTest(TestCase):
+    context = Context({"VAR_1": "value-1"})
+
+    def setUp(self):
+        TEMPLATE_CACHE.clear()
+
+    def test_same_value_is_compiled_once(self):
+        Template("{{ VAR_1 }}").render(self.context)
+        Template("{{ VAR_1 }}").render(self.context)
+
+        self.assertEqual(TEMPLATE_CACHE.info().misses, 1)
+        self.assertEqual(TEMPLATE_CACHE.info().hits, 1)
+
+    def test_same_value_on_different_lines_is_compiled_once(self):
+        for line in (3, 7):
+            value = OpxString("{{ VAR_5 }}")
+            set_position(value, "some-file", Position(line, 10), Position(line, 10 + len(value)))
+
+            with self.assertRaises(UndefinedVariableError) as cm:
+                Template(value).render(self.context)
+
+            self.assertEqual(cm.exception.errors[0].start_pos, Position(line, 13))
+            self.assertEqual(cm.exception.errors[0].end_pos, Position(line, 18))
+
+        self.assertEqual(TEMPLATE_CACHE.info().misses, 1)
+
+    def test_same_value_in_different_files_is_compiled_separately(self):
+        for file_path in ("file-1", "file-2"):
+            value = OpxString("{{ VAR_1 }}")
+            set_position(value, file_path, Position(1, 1), None)
+            Template(value)
+
+        self.assertEqual(TEMPLATE_CACHE.info().misses, 2)
+
+    def test_large_value_is_not_cached(self):
+        value = "{{ VAR_1 }}" + "x" * MAX_CACHED_TEMPLATE_SIZE
+
+        self.assertEqual(Template(value).render(self.context), "value-1" + "x" * MAX_CACHED_TEMPLATE_SIZE)
+        self.assertEqual(len(TEMPLATE_CACHE), 0)
+
+    def test_literal_is_not_compiled(self):
+        value = OpxString("us-east-1")
+        set_position(value, "some-file", Position(1, 10), Position(1, 19))
+
+        self.assertIs(Template(value).render(self.context), value)
+        self.assertEqual(TEMPLATE_CACHE.info().misses, 0)
+
+    def test_syntax_error_is_reported_at_file_position(self):
+        value = OpxString("{{ VAR_1 }}{% endif %}")
+        set_position(value, "some-file", Position(5, 3), None)
+
+        with self.assertRaises(TemplateError) as cm:
+            Template(value)
+
+        self.assertEqual(cm.exception.errors[0].start_pos, Position(5, 14))
+        self.assertEqual(len(TEMPLATE_CACHE), 0)
+
+
+class TemplateIncludeTest(TestCase):
+    context = Context({"VAR_1": "value-1"})
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+        INCLUDE_CACHE.clear()
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+
+        return path
+
+    def template(self, content: str) -> Template:
+        value = OpxString(content)
+        set_position(value, os.path.join(self.tmp_dir, "main.txt"), Position(1, 1), None)
+        return Template(value)
+
+    def test_include(self):
+        self.write("child.txt", "{{ VAR_1 }}\n{% include 'nested/grandchild.txt' %}")
+        os.mkdir(os.path.join(self.tmp_dir, "nested"))
+        self.write("nested/grandchild.txt", "grandchild")
+
+        t = self.template("  {% include 'child.txt' %}")
+        self.assertEqual(t.render(self.context), "  value-1\n  grandchild")
+
+    def test_include__is_loaded_once(self):
+        self.write("child.txt", "{{ VAR_1 }}")
+
+        t = self.template("{% for i in [1, 2, 3] %}{% include 'child.txt' %}{% endfor %}")
+        self.assertEqual(t.render(self.context), "value-1value-1value-1")
+        self.assertEqual(INCLUDE_CACHE.info().misses, 1)
+
+    def test_include__modified_file_is_reloaded(self):
+        path = self.write("child.txt", "{{ VAR_1 }}")
+        t = self.template("{% include 'child.txt' %}")
+        self.assertEqual(t.render(self.context), "value-1")
+
+        self.write("child.txt", "updated {{ VAR_1 }}")
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(t.render(self.context), "updated value-1")
+
+    def test_include__error_position_in_included_file(self):
+        self.write("child.txt", "\n{{ VAR_1 }}{{ VAR_2 }}")
+
+        with self.assertRaises(UndefinedVariableError) as cm:
+            self.template("{% include 'child.txt' %}").render(self.context)
+
+        self.assertEqual(cm.exception.errors[0].file_path, os.path.join(self.tmp_dir, "child.txt"))
+        self.assertEqual(cm.exception.errors[0].start_pos, Position(2, 15))
+
+    @parameterized.expand(
+        [
+            ("self", "main.txt", ["main.txt", "main.txt"]),
+            ("indirect", "child.txt", ["main.txt", "child.txt", "main.txt"]),
+        ]
+    )
+    def test_include__cycle(self, _, included, expected_cycle):
+        self.write("main.txt", "{% include '" + included + "' %}")
+        self.write("child.txt", "{% include 'main.txt' %}")
+
+        with self.assertRaises(TemplateError) as cm:
+            self.template("{% include '" + included + "' %}").render(self.context)
+
+        expected_cycle = " -> ".join(os.path.join(self.tmp_dir, name) for name in expected_cycle)
+        self.assertIn(f"Circular include: {expected_cycle}", cm.exception.errors[0].error)
+
+
+class TemplateDiskCacheTest(TestCase):
+    context = Context({"VAR_1": "value-1"})
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        for name, value in (("cache_dir", tmp_dir.name), ("enabled", True)):
+            patcher = patch.object(TEMPLATE_DISK_CACHE, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        TEMPLATE_CACHE.clear()
+
+    def test_warm_run_skips_compilation(self):
+        value = OpxString("{{ VAR_1|uppercase }}-{{ VAR_5 }}")
+        set_position(value, "some-file", Position(4, 3), None)
+        Template(value)
+
+        self.assertEqual(len(os.listdir(TEMPLATE_DISK_CACHE.cache_dir)), 1)
+        TEMPLATE_CACHE.clear()
+
+        with patch("strong_opx.template.template.TemplateLexer") as lexer_mock:
+            t = Template(value)
+
+        lexer_mock.assert_not_called()
+        with self.assertRaises(UndefinedVariableError) as cm:
+            t.render(self.context)
+
+        self.assertEqual(cm.exception.errors[0].start_pos, Position(4, 28))
+
+        t = Template(OpxString("{{ VAR_1|uppercase }}"))
+        self.assertEqual(t.render(self.context), "VALUE-1")
+
+    def test_corrupted_entry_is_ignored(self):
+        t = Template("{{ VAR_1 }}")
+        with open(os.path.join(TEMPLATE_DISK_CACHE.cache_dir, t.disk_cache_key()), "wb") as f:
+            f.write(b"corrupted")
+
+        TEMPLATE_CACHE.clear()
+        self.assertEqual(Template("{{ VAR_1 }}").render(self.context), "value-1")
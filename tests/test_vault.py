@@ -1,37 +1,115 @@
+import hashlib
 import unittest
 from unittest import mock
 
+from parameterized import parameterized
+
+from strong_opx import vault
 from strong_opx.exceptions import VaultError
-from strong_opx.vault import VaultCipher
+from strong_opx.vault import DECRYPTED, VaultCipher
+from strong_opx.vault.ciphers import VaultAES256GCM
 
 
 class VaultCipherTests(unittest.TestCase):
     secret = "some-secret"
     plain_text = "some-value"
 
-    def test_encrypt_decrypt(self):
-        cipher = VaultCipher.encrypt(self.plain_text, self.secret)
+    def setUp(self):
+        DECRYPTED.clear()
+        VaultAES256GCM.master_key_salts.clear()
+
+    @parameterized.expand([("AES256",), ("AES256GCM",)])
+    def test_encrypt_decrypt(self, cipher_name: str):
+        cipher = VaultCipher.encrypt(self.plain_text, self.secret, cipher_name=cipher_name)
         decrypted_valued = cipher.decrypt(self.secret)
         self.assertEqual(self.plain_text, decrypted_valued)
 
-    def test_parse(self):
-        cipher_envelope = str(VaultCipher.encrypt(self.plain_text, self.secret))
+    @parameterized.expand([("AES256",), ("AES256GCM",)])
+    def test_parse(self, cipher_name: str):
+        cipher_envelope = str(VaultCipher.encrypt(self.plain_text, self.secret, cipher_name=cipher_name))
         parsed_cipher = VaultCipher.parse(cipher_envelope)
 
         self.assertEqual(str(parsed_cipher), cipher_envelope)
+        self.assertEqual(parsed_cipher.decrypt(self.secret), self.plain_text)
 
-    def test_decrypt_wrong_secret(self):
-        cipher = VaultCipher.encrypt(self.plain_text, self.secret)
+    @parameterized.expand([("AES256",), ("AES256GCM",)])
+    def test_decrypt_wrong_secret(self, cipher_name: str):
+        cipher = VaultCipher.encrypt(self.plain_text, self.secret, cipher_name=cipher_name)
         with self.assertRaises(VaultError) as cm:
             cipher.decrypt("wrong-secret")
 
         self.assertEqual(str(cm.exception), "Decryption failed. Did you copied from other environment?")
 
-    def test_str(self):
+    def test_decrypt_tampered(self):
         cipher = VaultCipher.encrypt(self.plain_text, self.secret)
+        tampered_cipher = VaultCipher(ciphertext=cipher.ciphertext[:-2] + "00")
+
+        with self.assertRaises(VaultError):
+            tampered_cipher.decrypt(self.secret)
+
+    @parameterized.expand(
+        [
+            ("AES256", "$STRONG_OPX_VAULT;1.0;AES256\n"),
+            ("AES256GCM", "$STRONG_OPX_VAULT;2.0;AES256GCM\n"),
+        ]
+    )
+    def test_str(self, cipher_name: str, header: str):
+        cipher = VaultCipher.encrypt(self.plain_text, self.secret, cipher_name=cipher_name)
 
         cipher_envelope = str(cipher)
-        self.assertTrue(cipher_envelope.startswith("$STRONG_OPX_VAULT;1.0;AES256\n"))
+        self.assertTrue(cipher_envelope.startswith(header))
+
+    def test_encrypt__single_key_derivation(self):
+        ciphers = VaultCipher.encrypt_many(["value-1", "value-2"], self.secret)
+        DECRYPTED.clear()
+
+        with mock.patch("hashlib.pbkdf2_hmac", wraps=hashlib.pbkdf2_hmac) as kdf_mock:
+            VaultAES256GCM.master_key.cache_clear()
+            self.assertEqual(VaultCipher.decrypt_many(ciphers, self.secret), ["value-1", "value-2"])
+
+        kdf_mock.assert_called_once()
+
+    def test_encrypt__single_key_derivation_across_runs(self):
+        ciphers = VaultCipher.encrypt_many(["value-1"], self.secret)
+
+        # Another run encrypting a value of the same environment
+        VaultAES256GCM.master_key.cache_clear()
+        VaultAES256GCM.master_key_salts.clear()
+        VaultCipher.reuse_master_key_salt(ciphers, self.secret)
+        ciphers += VaultCipher.encrypt_many(["value-2"], self.secret)
+        DECRYPTED.clear()
+
+        with mock.patch("hashlib.pbkdf2_hmac", wraps=hashlib.pbkdf2_hmac) as kdf_mock:
+            VaultAES256GCM.master_key.cache_clear()
+            self.assertEqual(VaultCipher.decrypt_many(ciphers, self.secret), ["value-1", "value-2"])
+
+        kdf_mock.assert_called_once()
+
+    def test_encrypt__random_master_key_salt(self):
+        cipher = VaultCipher.encrypt(self.plain_text, self.secret)
+        VaultAES256GCM.master_key_salts.clear()
+
+        self.assertNotEqual(VaultCipher.encrypt(self.plain_text, self.secret).ciphertext[:32], cipher.ciphertext[:32])
+
+    def test_reuse_master_key_salt__skips_other_secrets(self):
+        other = VaultCipher.encrypt(self.plain_text, "other-secret")
+        cipher = VaultCipher.encrypt(self.plain_text, self.secret)
+        VaultAES256GCM.master_key_salts.clear()
+
+        VaultCipher.reuse_master_key_salt(
+            [VaultCipher.encrypt(self.plain_text, self.secret, "AES256"), other, cipher], self.secret
+        )
+        self.assertTrue(cipher.is_latest(self.secret))
+
+    def test_is_latest(self):
+        self.assertTrue(VaultCipher.encrypt(self.plain_text, self.secret).is_latest(self.secret))
+        self.assertFalse(VaultCipher.encrypt(self.plain_text, self.secret).is_latest("other-secret"))
+        self.assertFalse(VaultCipher.encrypt(self.plain_text, self.secret, cipher_name="AES256").is_latest(self.secret))
+
+        with mock.patch.object(VaultAES256GCM, "master_key_salt", return_value=b"\0" * VaultAES256GCM.salt_length):
+            cipher = VaultCipher.encrypt(self.plain_text, self.secret)
+
+        self.assertFalse(cipher.is_latest(self.secret))
 
     def test_str__lines_should_be_less_than_80_chars(self):
         cipher = VaultCipher.encrypt(self.plain_text, self.secret)
@@ -46,3 +124,41 @@ class VaultCipherTests(unittest.TestCase):
 
         cipher = VaultCipher.encrypt(self.plain_text, self.secret)
         self.assertEqual(cipher(), self.plain_text)
+
+    def test_decrypt_many(self):
+        ciphers = VaultCipher.encrypt_many(["value-1", "value-2"], self.secret)
+        DECRYPTED.clear()
+
+        with mock.patch.object(vault, "decrypt_ciphertext", wraps=vault.decrypt_ciphertext) as decrypt_mock:
+            plain_texts = VaultCipher.decrypt_many([ciphers[1], ciphers[0], ciphers[1]], self.secret)
+            self.assertEqual(ciphers[0].decrypt(self.secret), "value-1")
+
+        self.assertEqual(plain_texts, ["value-2", "value-1", "value-2"])
+        self.assertEqual(decrypt_mock.call_count, 2)
+
+    @mock.patch.object(vault, "PARALLEL_THRESHOLD", 2)
+    @mock.patch("os.cpu_count", return_value=2)
+    def test_decrypt_many__in_processes(self, _):
+        values = [f"value-{i}" for i in range(4)]
+
+        ciphers = VaultCipher.encrypt_many(values, self.secret)
+        DECRYPTED.clear()
+
+        self.assertEqual(VaultCipher.decrypt_many(ciphers, self.secret), values)
+
+    @mock.patch.object(vault, "PARALLEL_THRESHOLD", 2)
+    @mock.patch("os.cpu_count", return_value=2)
+    def test_run_parallel__processes_are_not_forked(self, _):
+        with mock.patch.object(vault, "ProcessPoolExecutor") as executor_mock:
+            vault.run_parallel(str, [(1,), (2,)])
+
+        self.assertNotEqual(executor_mock.call_args.kwargs["mp_context"].get_start_method(), "fork")
+
+    def test_decrypt_many__wrong_secret_is_not_cached(self):
+        ciphers = VaultCipher.encrypt_many(["value-1", "value-2"], self.secret)
+
+        with self.assertRaises(VaultError):
+            VaultCipher.decrypt_many(ciphers, "wrong-secret")
+
+        self.assertEqual(VaultCipher.decrypt_many(ciphers, self.secret), ["value-1", "value-2"])
+        self.assertEqual(len(DECRYPTED), 2)
@@ -0,0 +1,119 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import Mock
+
+from strong_opx.utils.cache import CacheInfo, DiskCache, LRUCache
+
+
+class LRUCacheTests(TestCase):
+    def test_factory_called_once_per_key(self):
+        cache = LRUCache(maxsize=2)
+        factory = Mock(return_value="value")
+
+        self.assertEqual(cache.get_or_create("a", factory), "value")
+        self.assertEqual(cache.get_or_create("a", factory), "value")
+
+        factory.assert_called_once_with()
+        self.assertEqual(cache.info(), CacheInfo(hits=1, misses=1, maxsize=2, currsize=1))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.get_or_create("a", lambda: 1)
+        cache.get_or_create("b", lambda: 2)
+        cache.get_or_create("a", lambda: 1)
+        cache.get_or_create("c", lambda: 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_factory_error_is_not_cached(self):
+        cache = LRUCache(maxsize=2)
+
+        with self.assertRaises(ValueError):
+            cache.get_or_create("a", Mock(side_effect=ValueError))
+
+        self.assertNotIn("a", cache)
+
+    def test_concurrent_access(self):
+        cache = LRUCache(maxsize=8)
+
+        def worker(offset: int) -> None:
+            for i in range(2000):
+                key = (offset + i) % 16
+                self.assertEqual(cache.get_or_create(key, lambda: key * 2), key * 2)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(worker, range(8)))
+
+        info = cache.info()
+        self.assertEqual(info.hits + info.misses, 8 * 2000)
+        self.assertEqual(info.currsize, 8)
+
+    def test_concurrent_miss_returns_first_cached_value(self):
+        cache = LRUCache(maxsize=2)
+
+        def factory():
+            # Same key is created elsewhere, e.g. by another thread, while this factory runs
+            cache.get_or_create("a", lambda: "first")
+            return "second"
+
+        self.assertEqual(cache.get_or_create("a", factory), "first")
+        self.assertEqual(cache.get_or_create("a", factory), "first")
+
+    def test_clear(self):
+        cache = LRUCache(maxsize=2)
+        cache.get_or_create("a", lambda: 1)
+        cache.clear()
+
+        self.assertEqual(cache.info(), CacheInfo(hits=0, misses=0, maxsize=2, currsize=0))
+
+
+class DiskCacheTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(os.path.join(self.tmp_dir.name, "cache"), max_entries=2)
+        self.cache.enable()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get("a"))
+
+        self.cache.set("a", b"value")
+        self.assertEqual(self.cache.get("a"), b"value")
+
+    def test_disabled(self):
+        self.cache.disable()
+        self.cache.set("a", b"value")
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertFalse(os.path.exists(self.cache.cache_dir))
+
+    def test_no_temporary_files_left(self):
+        self.cache.set("a", b"value")
+        self.assertEqual(os.listdir(self.cache.cache_dir), ["a"])
+
+    def test_evict_least_recently_used(self):
+        os.makedirs(self.cache.cache_dir)
+        for i, key in enumerate(("a", "b", "c")):
+            with open(self.cache.entry_path(key), "wb") as f:
+                f.write(b"value")
+
+            os.utime(self.cache.entry_path(key), (i, i))
+
+        self.cache.set("d", b"value")
+        self.assertSetEqual(set(os.listdir(self.cache.cache_dir)), {"c", "d"})
+
+    def test_unwritable_cache_dir(self):
+        with open(os.path.join(self.tmp_dir.name, "file"), "w"):
+            pass
+
+        cache = DiskCache(os.path.join(self.tmp_dir.name, "file", "cache"))
+        cache.enable()
+        cache.set("a", b"value")
+
+        self.assertIsNone(cache.get("a"))
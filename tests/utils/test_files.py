@@ -0,0 +1,47 @@
+import os
+import stat
+import tempfile
+from unittest import TestCase
+
+from strong_opx.utils.files import atomic_write
+
+
+class AtomicWriteTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.dir = tmp_dir.name
+        self.path = os.path.join(self.dir, "file.txt")
+
+    def test_write(self):
+        with atomic_write(self.path) as f:
+            f.write("content")
+
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "content")
+
+        self.assertEqual(os.listdir(self.dir), ["file.txt"])
+
+    def test_write__keeps_mode(self):
+        with open(self.path, "w") as f:
+            f.write("previous")
+
+        os.chmod(self.path, 0o600)
+        with atomic_write(self.path) as f:
+            f.write("content")
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_write__error_keeps_target(self):
+        with open(self.path, "w") as f:
+            f.write("previous")
+
+        with self.assertRaises(KeyboardInterrupt):
+            with atomic_write(self.path) as f:
+                f.write("partial")
+                raise KeyboardInterrupt
+
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "previous")
+
+        self.assertEqual(os.listdir(self.dir), ["file.txt"])
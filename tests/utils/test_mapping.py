@@ -1,7 +1,50 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 from unittest.mock import Mock
 
-from strong_opx.utils.mapping import CaseInsensitiveMultiTagDict, LazyDict
+from strong_opx.utils.mapping import CaseInsensitiveMultiTagDict, LazyDict, LazyValue
+
+
+class LazyValueTests(TestCase):
+    def test_resolve__once(self):
+        resolver = Mock(return_value="value")
+        value = LazyValue(resolver)
+
+        self.assertEqual(value.resolve(), "value")
+        self.assertEqual(value.resolve(), "value")
+        resolver.assert_called_once()
+
+    def test_resolve__concurrently(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def resolver():
+            started.set()
+            release.wait(5)
+            return "value"
+
+        resolver_mock = Mock(side_effect=resolver)
+        value = LazyValue(resolver_mock)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(value.resolve)]
+            started.wait(5)
+            futures += [executor.submit(value.resolve) for _ in range(3)]
+            release.set()
+
+            self.assertEqual([f.result() for f in futures], ["value"] * 4)
+
+        resolver_mock.assert_called_once()
+
+    def test_resolve__error_is_not_cached(self):
+        resolver = Mock(side_effect=[ValueError("failed"), "value"])
+        value = LazyValue(resolver)
+
+        with self.assertRaises(ValueError):
+            value.resolve()
+
+        self.assertEqual(value.resolve(), "value")
 
 
 class LazyDictTests(TestCase):
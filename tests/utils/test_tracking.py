@@ -4,7 +4,7 @@ from unittest import TestCase
 from parameterized import parameterized
 from yaml import Mark
 
-from strong_opx.utils.tracking import OpxString, Position, get_position, set_position_from_yaml_mark
+from strong_opx.utils.tracking import LineIndex, OpxString, Position, get_position, set_position_from_yaml_mark
 
 
 def test_position_from_mark():
@@ -69,3 +69,23 @@ class TestPositionFromOffset(TestCase):
             initial_col=test_case.initial_col,
         )
         self.assertEqual(outcome, test_case.expected_outcome)
+
+
+class TestLineIndex(TestCase):
+    @parameterized.expand(
+        [
+            ("hello", 1, 1),
+            ("hello\nworld", 1, 1),
+            ("hello\nworld", 2, 10),
+            ("\n\nhello\n\nworld\n", 3, 5),
+        ]
+    )
+    def test_same_as_position_from_offset(self, value: str, initial_line: int, initial_col: int):
+        index = LineIndex(value, initial_line, initial_col)
+
+        for offset in range(len(value) + 1):
+            self.assertEqual(
+                index.position(offset),
+                Position.from_offset(value, offset, initial_line, initial_col),
+                f"offset={offset}",
+            )
@@ -0,0 +1,50 @@
+import unittest
+
+from ansible.parsing.vault import VaultAES256 as AnsibleVaultAES256
+from ansible.parsing.vault import VaultSecret
+from parameterized import parameterized
+
+from strong_opx.exceptions import VaultError
+from strong_opx.vault.ciphers import VaultAES256, VaultAES256GCM
+
+
+class VaultAES256Tests(unittest.TestCase):
+    secret = b"some-secret"
+    plain_text = b"some-value"
+
+    def test_decrypt__encrypted_by_ansible(self):
+        ciphertext = AnsibleVaultAES256.encrypt(self.plain_text, VaultSecret(self.secret))
+        self.assertEqual(VaultAES256.decrypt(ciphertext, self.secret), self.plain_text)
+
+    def test_encrypt__decrypted_by_ansible(self):
+        ciphertext = VaultAES256.encrypt(self.plain_text, self.secret)
+        self.assertEqual(AnsibleVaultAES256.decrypt(ciphertext, VaultSecret(self.secret)), self.plain_text)
+
+
+class CipherTests(unittest.TestCase):
+    secret = b"some-secret"
+    plain_text = b"some-value"
+
+    @parameterized.expand([(VaultAES256,), (VaultAES256GCM,)])
+    def test_encrypt_decrypt(self, cipher: type):
+        ciphertext = cipher.encrypt(self.plain_text, self.secret)
+        self.assertEqual(cipher.decrypt(ciphertext, self.secret), self.plain_text)
+
+    @parameterized.expand([(VaultAES256,), (VaultAES256GCM,)])
+    def test_decrypt__wrong_secret(self, cipher: type):
+        ciphertext = cipher.encrypt(self.plain_text, self.secret)
+
+        with self.assertRaises(VaultError):
+            cipher.decrypt(ciphertext, b"wrong-secret")
+
+    @parameterized.expand(
+        [
+            (VaultAES256, b"not-hex"),
+            (VaultAES256, b"0123456789abcdef"),
+            (VaultAES256GCM, b"not-hex"),
+            (VaultAES256GCM, b"0123456789abcdef"),
+        ]
+    )
+    def test_decrypt__malformed(self, cipher: type, ciphertext: bytes):
+        with self.assertRaises(VaultError):
+            cipher.decrypt(ciphertext, self.secret)
@@ -0,0 +1,94 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from strong_opx.utils.tracking import Position, get_position
+from strong_opx.vault import VaultCipher
+from strong_opx.yaml import load
+from strong_opx.yaml.cache import YAML_DISK_CACHE
+
+
+class YAMLDiskCacheTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+        for name, value in (("cache_dir", os.path.join(tmp_dir.name, "cache")), ("enabled", True)):
+            patcher = patch.object(YAML_DISK_CACHE, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+
+        return path
+
+    def test_warm_load_skips_parsing(self):
+        path = self.write(
+            "vars.yml",
+            "A: value\nB: [1, 2.5, true, null]\nC: !include included.yml\nD: !vault |\n  $STRONG_OPX_VAULT;2.0;AES256GCM\n  00ff\n",
+        )
+        self.write("included.yml", "E: {F: included}\n")
+        value = load(path)
+
+        with patch("strong_opx.yaml.loader._yaml_loader") as loader_mock:
+            cached_value = load(path)
+
+        loader_mock.assert_not_called()
+        self.assertEqual(
+            {k: v for k, v in cached_value.items() if k != "D"}, {k: v for k, v in value.items() if k != "D"}
+        )
+        self.assertIsInstance(cached_value["D"], VaultCipher)
+        self.assertEqual(str(cached_value["D"]), str(value["D"]))
+
+        for get_value in (
+            lambda v: v["A"],
+            lambda v: v["B"],
+            lambda v: v["B"][1],
+            lambda v: v["C"]["E"]["F"],
+            lambda v: v["D"],
+        ):
+            self.assertEqual(get_position(get_value(cached_value)), get_position(get_value(value)))
+
+        self.assertEqual(
+            get_position(cached_value["C"]["E"]["F"]),
+            (os.path.join(self.tmp_dir, "included.yml"), Position(1, 8), Position(1, 16)),
+        )
+
+    def test_modified_file_is_parsed(self):
+        path = self.write("vars.yml", "A: 1\n")
+        load(path)
+
+        self.write("vars.yml", "A: 2\n")
+        self.assertEqual(load(path), {"A": 2})
+
+    def test_modified_included_file_invalidates_including_files(self):
+        path = self.write("vars.yml", "A: !include included.yml\n")
+        self.write("included.yml", "B: !include nested.yml\n")
+        self.write("nested.yml", "C: 1\n")
+        self.assertEqual(load(path), {"A": {"B": {"C": 1}}})
+
+        self.write("nested.yml", "C: 2\n")
+        self.assertEqual(load(path), {"A": {"B": {"C": 2}}})
+
+    def test_disabled(self):
+        path = self.write("vars.yml", "A: 1\n")
+
+        with patch.object(YAML_DISK_CACHE, "enabled", False):
+            load(path)
+
+        self.assertFalse(os.path.exists(YAML_DISK_CACHE.cache_dir))
+
+    def test_file_included_again_is_dependency_of_including_file(self):
+        path = self.write("vars.yml", "A: !include a.yml\nB: !include b.yml\n")
+        self.write("a.yml", "C: !include shared.yml\n")
+        b_path = self.write("b.yml", "C: !include shared.yml\n")
+        self.write("shared.yml", "D: 1\n")
+        load(path)
+
+        self.write("shared.yml", "D: 2\n")
+        self.assertEqual(load(b_path), {"C": {"D": 2}})
@@ -1,12 +1,27 @@
 import os.path
+import subprocess
+import sys
 import tempfile
+import unittest
 from unittest import TestCase
+from unittest.mock import patch
 
+import yaml
 from parameterized import parameterized
 
-from strong_opx.exceptions import ConfigurationError
-from strong_opx.utils.tracking import OpxFloat, OpxInteger, OpxMapping, OpxObjectBase, OpxSequence, OpxString, Position
-from strong_opx.yaml import load
+from strong_opx.exceptions import ConfigurationError, YAMLError
+from strong_opx.utils.tracking import (
+    OpxFloat,
+    OpxInteger,
+    OpxMapping,
+    OpxObjectBase,
+    OpxSequence,
+    OpxString,
+    Position,
+    get_position,
+)
+from strong_opx.yaml import load, load_all_fields, loader
+from strong_opx.yaml.loader import LOADERS, OpxYAMLLoader, PyOpxYAMLLoader
 
 
 class OpxYAMLLoaderTest(TestCase):
@@ -33,6 +48,59 @@ class OpxYAMLLoaderTest(TestCase):
         self.assertEqual(expected_value, loaded_yaml["key"])
         self.assertIsInstance(loaded_yaml["key"], OpxObjectBase)
 
+    @unittest.skipUnless(yaml.__with_libyaml__, "libyaml is not available")
+    def test_libyaml_is_used(self):
+        self.assertTrue(issubclass(OpxYAMLLoader, yaml.CSafeLoader))
+
+    def test_loaders_report_same_positions(self):
+        content = (
+            "# Comment\n"
+            "key: string value\n"
+            "nested:\n"
+            "  - 1\n"
+            "  - {a: 1.5, b: true}\n"
+            "  - |\n"
+            "    multi line\n"
+            "    string\n"
+            "secret: !vault |\n"
+            "  $STRONG_OPX_VAULT;1.0;AES256\n"
+            "  0123456789abcdef\n"
+            "---\n"
+            "second: document\n"
+        )
+
+        def positions(value, path=()):
+            yield path, type(value), get_position(value)
+            if isinstance(value, dict):
+                for k, v in value.items():
+                    yield from positions(k, path + ("key", k))
+                    yield from positions(v, path + (k,))
+            elif isinstance(value, list):
+                for i, v in enumerate(value):
+                    yield from positions(v, path + (i,))
+
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".yml") as f:
+            f.write(content)
+            f.flush()
+
+            loaded = {}
+            for loader_cls in LOADERS:
+                with open(f.name) as stream:
+                    loader = loader_cls(stream=stream, file_path=f.name)
+                    try:
+                        documents = []
+                        while loader.check_data():
+                            documents.append(loader.get_data())
+                    finally:
+                        loader.dispose()
+
+                loaded[loader_cls] = list(positions(documents))
+
+        expected = loaded[PyOpxYAMLLoader]
+        self.assertEqual(expected[3][2], (f.name, Position(2, 6), Position(2, 18)))
+        for loader_cls, value_positions in loaded.items():
+            self.assertEqual(value_positions, expected, loader_cls.__name__)
+
     def test_include(self):
         with tempfile.TemporaryDirectory() as td:
             with open(os.path.join(td, "f1.yml"), "w") as f:
@@ -45,6 +113,118 @@ class OpxYAMLLoaderTest(TestCase):
 
         self.assertDictEqual({"key1": {"key2": "value2"}}, loaded_yaml)
 
+    def test_include__loaded_once(self):
+        with tempfile.TemporaryDirectory() as td:
+            with open(os.path.join(td, "f1.yml"), "w") as f:
+                f.write("key1: !include shared.yml\nkey2: [!include shared.yml, !include f2.yml]\n")
+
+            with open(os.path.join(td, "f2.yml"), "w") as f:
+                f.write("key3: !include shared.yml\n")
+
+            with open(os.path.join(td, "shared.yml"), "w") as f:
+                f.write("key4: [value4]\n")
+
+            with patch.object(loader, "_yaml_loader", wraps=loader._yaml_loader) as loader_mock:
+                loaded_yaml = load(os.path.join(td, "f1.yml"))
+
+        self.assertEqual(loader_mock.call_count, 3)
+        self.assertEqual(
+            loaded_yaml,
+            {"key1": {"key4": ["value4"]}, "key2": [{"key4": ["value4"]}, {"key3": {"key4": ["value4"]}}]},
+        )
+        self.assertEqual(get_position(loaded_yaml["key2"][0]["key4"]), get_position(loaded_yaml["key1"]["key4"]))
+        self.assertEqual(get_position(loaded_yaml["key1"]["key4"])[1:], (Position(1, 7), Position(1, 15)))
+
+        # Each include is a copy
+        loaded_yaml["key1"]["key4"].append("value5")
+        self.assertEqual(loaded_yaml["key2"][0], {"key4": ["value4"]})
+
+    @parameterized.expand(
+        [
+            ({"f1.yml": "key: !include f1.yml"}, "f1.yml", Position(1, 6)),
+            ({"f1.yml": "key: !include f2.yml", "f2.yml": "a: 1\nb: !include f1.yml"}, "f2.yml", Position(2, 4)),
+        ]
+    )
+    def test_include__circular(self, files: dict[str, str], error_file_name: str, error_pos: Position):
+        with tempfile.TemporaryDirectory() as td:
+            for name, content in files.items():
+                with open(os.path.join(td, name), "w") as f:
+                    f.write(content)
+
+            with self.assertRaises(YAMLError) as cm:
+                load(os.path.join(td, "f1.yml"))
+
+            error = cm.exception.errors[0]
+            self.assertIn("Circular include of f1.yml", error.error)
+            self.assertEqual(error.file_path, os.path.join(td, error_file_name))
+            self.assertEqual(error.start_pos, error_pos)
+
+    def test_load__without_positions(self):
+        with tempfile.TemporaryDirectory() as td:
+            with open(os.path.join(td, "f1.yml"), "w") as f:
+                f.write(
+                    "key1: [value, 1, 1.5]\n"
+                    "key2: !include f2.yml\n"
+                    "key3: !vault |\n  $STRONG_OPX_VAULT;2.0;AES256GCM\n  00ff\n"
+                )
+
+            with open(os.path.join(td, "f2.yml"), "w") as f:
+                f.write("key4: value4")
+
+            loaded_yaml = load(os.path.join(td, "f1.yml"), track_positions=False)
+
+        self.assertEqual(loaded_yaml["key1"], ["value", 1, 1.5])
+        self.assertEqual(loaded_yaml["key2"], {"key4": "value4"})
+        self.assertEqual(loaded_yaml["key3"].ciphertext, "00ff")
+
+        for value in (loaded_yaml, *loaded_yaml, *loaded_yaml["key1"], loaded_yaml["key2"], loaded_yaml["key3"]):
+            self.assertNotIsInstance(value, OpxObjectBase)
+            self.assertEqual(get_position(value), (None, None, None))
+
+    def test_load__without_positions__syntax_error(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"key: [value\nother: 1")
+            f.flush()
+
+            with self.assertRaises(YAMLError) as cm:
+                load(f.name, track_positions=False)
+
+        self.assertIsNotNone(cm.exception.errors[0].start_pos)
+
+    def test_load_all_fields(self):
+        with tempfile.NamedTemporaryFile(suffix=".yml") as f:
+            f.write(
+                b"kind: ConfigMap\n"
+                b"data:\n  metadata: {name: nested}\n  large: |\n    content\n"
+                b"metadata:\n  labels: {app: web}\n  name: config\n  namespace: ~\n"
+                b"---\n"
+                b"- not a mapping\n"
+                b"---\n"
+                b"kind: Deployment\nmetadata: {name: web, annotations: [1, {a: b}]}\nspec: {replicas: 1}\n"
+            )
+            f.flush()
+
+            documents = load_all_fields(f.name, [("kind",), ("metadata", "name"), ("metadata", "namespace")])
+
+        self.assertEqual(
+            documents,
+            [
+                {("kind",): "ConfigMap", ("metadata", "name"): "config", ("metadata", "namespace"): None},
+                {},
+                {("kind",): "Deployment", ("metadata", "name"): "web"},
+            ],
+        )
+
+    def test_load_all_fields__syntax_error(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"kind: Deployment\n---\nkey: [value\nother: 1")
+            f.flush()
+
+            with self.assertRaises(YAMLError) as cm:
+                load_all_fields(f.name, [("kind",)])
+
+        self.assertIsNotNone(cm.exception.errors[0].start_pos)
+
     def test_include__unknown_file(self):
         with tempfile.NamedTemporaryFile() as f:
             f.write(b"!include hello.yml")
@@ -54,3 +234,19 @@ class OpxYAMLLoaderTest(TestCase):
                 load(f.name)
 
         self.assertIsInstance(cm.exception, ConfigurationError)
+
+    def test_load__vault_value_does_not_import_ciphers(self):
+        # Loading a file must not pay for importing Ansible or cryptography, these are imported once a value is decrypted
+        with tempfile.NamedTemporaryFile(suffix=".yml") as f:
+            f.write(b"key: !vault |\n  $STRONG_OPX_VAULT;1.0;AES256\n  0123456789abcdef\n")
+            f.flush()
+
+            code = (
+                "import sys\n"
+                "from strong_opx.yaml import load\n"
+                f"load({f.name!r})\n"
+                "print(sorted({m.split('.')[0] for m in sys.modules} & {'ansible', 'cryptography'}))\n"
+            )
+            result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+        self.assertEqual(result.stdout.strip(), "[]")